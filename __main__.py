@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Permite executar a linha de comando com ``python -m conversor_arquivos``
+"""
+
+import os
+import sys
+
+# Os módulos do projeto são importados a partir da raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from interface.cli import main
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,682 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark reprodutível das conversões e compressões
+
+Gera localmente um corpus determinístico (imagens desenhadas com o Pillow em
+vários tamanhos e áudio/vídeo das fontes de teste ``lavfi`` do FFmpeg), mede
+cada rota de ``Conversor.formatos_conversao`` e cada nível de
+``Compressor.niveis_compressao`` e emite um relatório JSON com tempo de
+parede, tempo de CPU (incluindo os processos do FFmpeg), vazão e razão entre
+os tamanhos de saída e de entrada.
+
+Uma foto grande (``--megapixels-reducao``) é reduzida com e sem a redução
+rápida; o caso rápido informa o PSNR da sua saída e a diferença de tempo de
+parede em relação ao caso de referência (LANCZOS sobre a imagem inteira na
+conversão e a margem do thumbnail() na compressão).
+
+Com ``--arquivos-arvore``, o corpus inclui uma árvore de diretórios com
+muitos arquivos pequenos, usada para medir a enumeração (os.scandir em uma
+passagem e, como referência, as duas passagens de os.walk) e a compressão do
+diretório em ZIP.
+
+Uso (a partir da raiz do projeto)::
+
+    python benchmarks/desempenho.py --saida resultado.json
+    python benchmarks/desempenho.py --filtro imagem --megapixels 1,4 --repeticoes 5
+    python benchmarks/desempenho.py --filtro arvore --arquivos-arvore 1000000 --repeticoes 1
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import zipfile
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+
+# Os módulos do projeto são importados a partir da raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PIL
+from PIL import Image, ImageChops, ImageDraw, ImageStat
+
+from utils.agendador import Tarefa
+from utils.compressor import Compressor
+from utils.conversor import Conversor
+from utils.ffmpeg import obter_capacidades
+from utils.zip_paralelo import EnumeracaoMembros
+
+# Versão do corpus (mudar ao alterar a geração invalida os corpora existentes)
+VERSAO_CORPUS = 2
+
+# Parâmetros padrão do corpus e das medições
+MEGAPIXELS_PADRAO = (1, 4, 16)
+DURACAO_PADRAO = 10
+REPETICOES_PADRAO = 3
+SEMENTE_PADRAO = 0
+ARQUIVOS_ARVORE_PADRAO = 0
+
+# Tamanho da foto usada nos casos de redução: grande o bastante para o JPEG
+# ser decodificado em 1/4 ou 1/8 da escala tanto em TAMANHO_REDUCAO quanto no
+# limite de tamanho da compressão
+MEGAPIXELS_REDUCAO = 48
+
+# Arquivos por diretório da árvore e tamanho máximo de cada um
+ARQUIVOS_POR_DIRETORIO = 1000
+TAMANHO_MAXIMO_ARVORE = 512
+
+# Nome do manifesto gravado no diretório do corpus
+NOME_MANIFESTO = "corpus.json"
+
+# Tamanho usado ao comparar a redução rápida com a exata na conversão
+TAMANHO_REDUCAO = "640x480"
+
+# Palavras usadas no documento de texto do corpus
+_PALAVRAS = (
+    "arquivo conversão compressão vídeo áudio imagem documento formato qualidade "
+    "taxa quadro resolução contêiner codec saída entrada lote tarefa fila núcleo"
+).split()
+
+
+def _gerar_imagem(caminho, megapixels, semente):
+    """
+    Desenha uma imagem determinística com gradientes, formas e textura
+
+    Args:
+        caminho (str): Arquivo de saída (o formato vem da extensão)
+        megapixels (float): Tamanho da imagem em megapixels (proporção 4:3)
+        semente (int): Semente do gerador pseudoaleatório
+    """
+    largura = int(round(math.sqrt(megapixels * 1e6 * 4 / 3)))
+    altura = int(round(largura * 3 / 4))
+    aleatorio = random.Random(semente)
+
+    # Fundo com gradientes diferentes em cada canal
+    gradiente = Image.linear_gradient("L")
+    imagem = Image.merge("RGB", (
+        gradiente.resize((largura, altura)),
+        gradiente.rotate(90).resize((largura, altura)),
+        Image.radial_gradient("L").resize((largura, altura))
+    ))
+
+    # Formas com bordas nítidas, como em fotos e capturas de tela
+    desenho = ImageDraw.Draw(imagem)
+    for _ in range(200):
+        x0, y0 = aleatorio.randrange(largura), aleatorio.randrange(altura)
+        x1 = x0 + aleatorio.randrange(1, max(2, largura // 4))
+        y1 = y0 + aleatorio.randrange(1, max(2, altura // 4))
+        cor = tuple(aleatorio.randrange(256) for _ in range(3))
+        if aleatorio.random() < 0.5:
+            desenho.ellipse((x0, y0, x1, y1), fill=cor)
+        else:
+            desenho.rectangle((x0, y0, x1, y1), fill=cor)
+
+    # Textura de ruído (determinístico) para os codificadores terem trabalho
+    pequena = (max(1, largura // 4), max(1, altura // 4))
+    ruido = Image.frombytes("RGB", pequena, aleatorio.randbytes(pequena[0] * pequena[1] * 3))
+    imagem = Image.blend(imagem, ruido.resize((largura, altura), Image.BILINEAR), 0.2)
+
+    imagem.save(caminho, quality=90)
+
+
+def _gerar_texto(caminho, semente, tamanho=256 * 1024):
+    """
+    Escreve um documento de texto determinístico
+
+    Args:
+        caminho (str): Arquivo de saída
+        semente (int): Semente do gerador pseudoaleatório
+        tamanho (int): Tamanho aproximado em bytes
+    """
+    aleatorio = random.Random(semente)
+    linhas = []
+    escritos = 0
+    while escritos < tamanho:
+        linha = " ".join(aleatorio.choice(_PALAVRAS) for _ in range(12)) + "\n"
+        linhas.append(linha)
+        escritos += len(linha.encode("utf-8"))
+
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.writelines(linhas)
+
+
+def _gerar_arvore(diretorio, arquivos, semente):
+    """
+    Cria uma árvore de diretórios com muitos arquivos de texto pequenos
+
+    Args:
+        diretorio (str): Diretório raiz da árvore (recriado)
+        arquivos (int): Quantidade de arquivos
+        semente (int): Semente do gerador pseudoaleatório
+
+    Returns:
+        int: Soma dos tamanhos dos arquivos em bytes
+    """
+    shutil.rmtree(diretorio, ignore_errors=True)
+    aleatorio = random.Random(semente)
+    total = 0
+    for indice in range(arquivos):
+        # Dois níveis de subdiretórios, como em projetos e backups reais
+        grupo, posicao = divmod(indice, ARQUIVOS_POR_DIRETORIO)
+        subdiretorio = os.path.join(diretorio, f"{grupo // 100:03d}", f"{grupo % 100:02d}")
+        if posicao == 0:
+            os.makedirs(subdiretorio, exist_ok=True)
+
+        palavras = aleatorio.randrange(TAMANHO_MAXIMO_ARVORE // 8)
+        conteudo = " ".join(aleatorio.choice(_PALAVRAS) for _ in range(palavras)).encode("utf-8")
+        with open(os.path.join(subdiretorio, f"arquivo_{posicao:04d}.txt"), "wb") as f:
+            total += f.write(conteudo)
+
+    return total
+
+
+def _executar_ffmpeg(argumentos):
+    """
+    Executa o FFmpeg para gerar um arquivo do corpus
+
+    Args:
+        argumentos (list): Argumentos após "ffmpeg"
+
+    Raises:
+        RuntimeError: Se o FFmpeg falhar
+    """
+    processo = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-nostdin", "-y", *argumentos],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+    if processo.returncode != 0:
+        raise RuntimeError(f"Erro ao gerar o corpus com o FFmpeg: {processo.stderr[-500:]}")
+
+
+def _gerar_video(caminho, duracao):
+    """
+    Gera um vídeo 720p com as fontes de teste testsrc2 e sine
+
+    Args:
+        caminho (str): Arquivo de saída (.mp4)
+        duracao (float): Duração em segundos
+    """
+    capacidades = obter_capacidades()
+    _executar_ffmpeg([
+        "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=30:duration={duracao}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={duracao}",
+        "-c:v", capacidades.escolher_encoder("libx264"), "-pix_fmt", "yuv420p",
+        "-c:a", capacidades.escolher_encoder("aac"), "-b:a", "128k",
+        "-map_metadata", "-1", "-fflags", "+bitexact", "-shortest",
+        caminho
+    ])
+
+
+def _gerar_audio(caminho, duracao):
+    """
+    Gera um áudio estéreo sem compressão com a fonte de teste sine
+
+    Args:
+        caminho (str): Arquivo de saída (.wav)
+        duracao (float): Duração em segundos
+    """
+    _executar_ffmpeg([
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=44100:duration={duracao}",
+        "-ac", "2", "-c:a", "pcm_s16le", "-map_metadata", "-1", "-fflags", "+bitexact",
+        caminho
+    ])
+
+
+def gerar_corpus(diretorio, megapixels=MEGAPIXELS_PADRAO, duracao=DURACAO_PADRAO, semente=SEMENTE_PADRAO,
+                 arquivos_arvore=ARQUIVOS_ARVORE_PADRAO, megapixels_reducao=MEGAPIXELS_REDUCAO):
+    """
+    Gera (ou reaproveita) o corpus de arquivos do benchmark
+
+    O corpus só é recriado se os parâmetros forem diferentes dos registrados
+    no manifesto do diretório.
+
+    Args:
+        diretorio (str): Diretório do corpus
+        megapixels (tuple): Tamanhos das imagens em megapixels
+        duracao (float): Duração do áudio e do vídeo em segundos
+        semente (int): Semente do gerador pseudoaleatório
+        arquivos_arvore (int): Arquivos da árvore de diretórios (0 não a cria)
+        megapixels_reducao (float): Tamanho da foto dos casos de redução (0
+            não a cria)
+
+    Returns:
+        list: Dicionários com "arquivo", "tipo" e "descricao" de cada item
+    """
+    parametros = {
+        "versao": VERSAO_CORPUS, "megapixels": list(megapixels), "duracao": duracao,
+        "semente": semente, "arquivos_arvore": arquivos_arvore,
+        "megapixels_reducao": megapixels_reducao, "pillow": PIL.__version__,
+        "ffmpeg": obter_capacidades().versao_ffmpeg
+    }
+    manifesto = os.path.join(diretorio, NOME_MANIFESTO)
+
+    try:
+        with open(manifesto, "r", encoding="utf-8") as f:
+            existente = json.load(f)
+        if existente["parametros"] == parametros and all(
+            os.path.exists(item["arquivo"]) for item in existente["itens"]
+        ):
+            return existente["itens"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    os.makedirs(diretorio, exist_ok=True)
+    itens = []
+
+    for indice, tamanho in enumerate(megapixels):
+        caminho = os.path.join(diretorio, f"imagem_{tamanho}mp.jpg")
+        _gerar_imagem(caminho, tamanho, semente + indice)
+        itens.append({"arquivo": caminho, "tipo": "imagem", "descricao": f"{tamanho} MP"})
+
+    if megapixels_reducao:
+        caminho = os.path.join(diretorio, f"reducao_{megapixels_reducao:g}mp.jpg")
+        _gerar_imagem(caminho, megapixels_reducao, semente + len(megapixels))
+        itens.append({
+            "arquivo": caminho, "tipo": "imagem", "descricao": f"{megapixels_reducao:g} MP",
+            "reducao": True
+        })
+
+    texto = os.path.join(diretorio, "documento.txt")
+    _gerar_texto(texto, semente)
+    itens.append({"arquivo": texto, "tipo": "documento", "descricao": "texto"})
+
+    # ZIP sem compressão com o texto e a menor imagem
+    pacote = os.path.join(diretorio, "pacote.zip")
+    with zipfile.ZipFile(pacote, "w", zipfile.ZIP_STORED) as zf:
+        zf.write(texto, os.path.basename(texto))
+        zf.write(itens[0]["arquivo"], os.path.basename(itens[0]["arquivo"]))
+    itens.append({"arquivo": pacote, "tipo": "zip", "descricao": "texto e imagem"})
+
+    if arquivos_arvore:
+        arvore = os.path.join(diretorio, f"arvore_{arquivos_arvore}")
+        tamanho = _gerar_arvore(arvore, arquivos_arvore, semente)
+        itens.append({
+            "arquivo": arvore, "tipo": "arvore", "descricao": f"{arquivos_arvore} arquivos",
+            "arquivos": arquivos_arvore, "tamanho": tamanho
+        })
+
+    if parametros["ffmpeg"]:
+        video = os.path.join(diretorio, "video_720p.mp4")
+        _gerar_video(video, duracao)
+        itens.append({"arquivo": video, "tipo": "vídeo", "descricao": f"720p {duracao}s"})
+
+        audio = os.path.join(diretorio, "audio.wav")
+        _gerar_audio(audio, duracao)
+        itens.append({"arquivo": audio, "tipo": "áudio", "descricao": f"wav {duracao}s"})
+
+    with open(manifesto, "w", encoding="utf-8") as f:
+        json.dump({"parametros": parametros, "itens": itens}, f, ensure_ascii=False, indent=2)
+
+    return itens
+
+
+def _medir(funcao):
+    """
+    Executa uma função medindo o tempo de parede e o tempo de CPU
+
+    O tempo de CPU inclui o processo atual e os processos filhos que
+    terminaram durante a execução (o FFmpeg).
+
+    Args:
+        funcao (function): Função sem argumentos
+
+    Returns:
+        tuple: (tempo de parede, tempo de CPU) em segundos
+    """
+    antes = os.times()
+    cpu_antes = time.process_time()
+    inicio = time.perf_counter()
+
+    funcao()
+
+    parede = time.perf_counter() - inicio
+    depois = os.times()
+    cpu = (
+        time.process_time() - cpu_antes
+        + (depois.children_user - antes.children_user)
+        + (depois.children_system - antes.children_system)
+    )
+    return parede, cpu
+
+
+def _casos(itens, conversor, compressor):
+    """
+    Lista os casos medidos: cada rota de conversão e cada nível de compressão
+    para cada item do corpus
+
+    Args:
+        itens (list): Itens do corpus
+        conversor (Conversor): Motor de conversão
+        compressor (Compressor): Motor de compressão
+
+    Returns:
+        list: Dicionários que descrevem os casos
+    """
+    casos = []
+    for item in itens:
+        base, extensao = os.path.splitext(os.path.basename(item["arquivo"]))
+
+        # Árvores: enumeração (atual e com os.walk) e compressão em ZIP
+        if item["tipo"] == "arvore":
+            for modo in ("enumerar", "enumerar_oswalk"):
+                casos.append({
+                    "nome": f"arvore/{base}/{modo}", "operacao": modo, "item": item,
+                    "saida": f"{base}_{modo}"
+                })
+            for nivel in compressor.niveis_compressao:
+                casos.append({
+                    "nome": f"arvore/{base}/zip/{nivel}", "operacao": "zip", "item": item,
+                    "nivel": nivel, "saida": f"{base}_{nivel}.zip"
+                })
+            continue
+
+        # Foto grande: redução de referência e rápida; a conversão para BMP
+        # não tem perdas, de modo que só o redimensionamento difere
+        if item.get("reducao"):
+            for operacao, parametro, opcoes, modo_referencia in (
+                ("converter", {"formato": "bmp"}, {"redimensionar": TAMANHO_REDUCAO}, "exata"),
+                ("comprimir", {"nivel": "médio"}, {}, "padrao")
+            ):
+                referencia = f"{operacao}/reducao/{base}/{modo_referencia}"
+                for modo, rapida in ((modo_referencia, False), ("rapida", True)):
+                    extensao_saida = ".bmp" if operacao == "converter" else extensao
+                    casos.append({
+                        "nome": f"{operacao}/reducao/{base}/{modo}",
+                        "operacao": operacao, "item": item, **parametro,
+                        "opcoes": {**opcoes, "reducao_rapida": rapida},
+                        "saida": f"{base}_{operacao}_{modo}{extensao_saida}",
+                        "guardar_referencia": not rapida,
+                        "referencia": referencia if rapida else None
+                    })
+            continue
+
+        for formato in conversor.formatos_conversao.get(item["tipo"], []):
+            casos.append({
+                "nome": f"converter/{item['tipo']}/{base}/{formato}",
+                "operacao": "converter", "item": item, "formato": formato,
+                "saida": f"{base}.{formato}"
+            })
+
+        if extensao.lower() in compressor.extensao_para_tipo:
+            for nivel in compressor.niveis_compressao:
+                casos.append({
+                    "nome": f"comprimir/{item['tipo']}/{base}/{nivel}",
+                    "operacao": "comprimir", "item": item, "nivel": nivel,
+                    "saida": f"{base}_{nivel}{extensao}"
+                })
+
+    return casos
+
+
+def _psnr(arquivo, referencia):
+    """
+    Calcula o PSNR (em dB) de uma imagem em relação a uma referência
+
+    Args:
+        arquivo (str): Imagem avaliada
+        referencia (str): Imagem de referência
+
+    Returns:
+        float: PSNR (None se as imagens forem idênticas)
+    """
+    with Image.open(arquivo) as a, Image.open(referencia) as b:
+        a = a.convert("RGB")
+        b = b.convert("RGB")
+        if a.size != b.size:
+            a = a.resize(b.size, Image.LANCZOS)
+        estatisticas = ImageStat.Stat(ImageChops.difference(a, b))
+
+    pixels = b.size[0] * b.size[1]
+    mse = sum(estatisticas.sum2) / (pixels * len(estatisticas.sum2))
+    if mse == 0:
+        return None
+    return round(10 * math.log10(255 ** 2 / mse), 3)
+
+
+def executar_caso(caso, conversor, compressor, diretorio_saida, repeticoes, referencias=None):
+    """
+    Mede um caso, repetindo-o e resumindo os tempos pela mediana
+
+    Args:
+        caso (dict): Caso retornado por _casos
+        conversor (Conversor): Motor de conversão
+        compressor (Compressor): Motor de compressão
+        diretorio_saida (str): Diretório temporário das saídas
+        repeticoes (int): Número de repetições
+        referencias (dict): Casos de referência já medidos (nome -> saída
+            guardada e tempo de parede), usados no PSNR e na diferença de tempo
+
+    Returns:
+        dict: Resultado do caso
+    """
+    item = caso["item"]
+    entrada = item["arquivo"]
+    saida = os.path.join(diretorio_saida, caso["saida"])
+    tamanho_entrada = item.get("tamanho", os.path.getsize(entrada))
+    arquivos = item.get("arquivos", 1)
+
+    resultado = {
+        "nome": caso["nome"], "operacao": caso["operacao"], "tipo": item["tipo"],
+        "entrada": os.path.basename(entrada), "descricao": item["descricao"],
+        "tamanho_entrada": tamanho_entrada
+    }
+    opcoes = caso.get("opcoes") or {}
+    if opcoes:
+        resultado["opcoes"] = opcoes
+    if referencias is None:
+        referencias = {}
+
+    if caso["operacao"] == "converter":
+        resultado["formato"] = caso["formato"]
+
+        def executar():
+            return conversor.converter_arquivo(entrada, saida, caso["formato"], dict(opcoes))
+    elif caso["operacao"] == "enumerar":
+        def executar():
+            # Uma passagem com os.scandir; a saída registra o total descoberto
+            enumeracao = EnumeracaoMembros(entrada)
+            for _ in enumeracao:
+                pass
+            with open(saida, "w", encoding="utf-8") as f:
+                f.write(f"{enumeracao.arquivos} {enumeracao.bytes}\n")
+    elif caso["operacao"] == "enumerar_oswalk":
+        def executar():
+            # Referência: contagem e percurso com os.walk, como antes
+            total = sum(len(nomes) for _, _, nomes in os.walk(entrada))
+            tamanho = 0
+            for raiz, _, nomes in os.walk(entrada):
+                for nome in nomes:
+                    tamanho += os.path.getsize(os.path.join(raiz, nome))
+            with open(saida, "w", encoding="utf-8") as f:
+                f.write(f"{total} {tamanho}\n")
+    elif caso["operacao"] == "zip":
+        resultado["nivel"] = caso["nivel"]
+        metodo = compressor.niveis_compressao[caso["nivel"]]["zip"]
+
+        def executar():
+            return compressor._comprimir_zip(entrada, saida, metodo, Tarefa())
+    else:
+        resultado["nivel"] = caso["nivel"]
+
+        def executar():
+            return compressor.comprimir_arquivo(entrada, saida, caso["nivel"], opcoes=dict(opcoes))
+
+    paredes = []
+    cpus = []
+    try:
+        for _ in range(repeticoes):
+            if os.path.exists(saida):
+                os.remove(saida)
+            parede, cpu = _medir(executar)
+            paredes.append(parede)
+            cpus.append(cpu)
+        tamanho_saida = os.path.getsize(saida)
+        parede = statistics.median(paredes)
+
+        # Guarda a saída de referência ou compara com ela
+        if caso.get("guardar_referencia"):
+            guardada = os.path.join(diretorio_saida, "referencia_" + caso["saida"])
+            shutil.copyfile(saida, guardada)
+            referencias[caso["nome"]] = {"arquivo": guardada, "tempo_parede": parede}
+        elif caso.get("referencia") in referencias:
+            referencia = referencias[caso["referencia"]]
+            resultado.update({
+                "psnr_referencia": _psnr(saida, referencia["arquivo"]),
+                "tempo_parede_referencia": round(referencia["tempo_parede"], 6),
+                "diferenca_tempo_parede": round(parede - referencia["tempo_parede"], 6),
+                "aceleracao": round(referencia["tempo_parede"] / parede, 3) if parede > 0 else None
+            })
+    except Exception as e:
+        resultado["status"] = "erro"
+        resultado["erro"] = str(e)
+        return resultado
+    finally:
+        if os.path.exists(saida):
+            os.remove(saida)
+
+    resultado.update({
+        "status": "concluido",
+        "repeticoes": repeticoes,
+        "tempo_parede": round(parede, 6),
+        "tempo_parede_min": round(min(paredes), 6),
+        "tempo_cpu": round(statistics.median(cpus), 6),
+        "mb_s": round(tamanho_entrada / 1e6 / parede, 3) if parede > 0 else None,
+        "arquivos_s": round(arquivos / parede, 3) if parede > 0 else None,
+        "tamanho_saida": tamanho_saida,
+        "razao_saida": round(tamanho_saida / tamanho_entrada, 4) if tamanho_entrada else None
+    })
+    return resultado
+
+
+def _ambiente():
+    """
+    Descreve a máquina e as versões usadas nas medições
+
+    Returns:
+        dict: Informações do ambiente
+    """
+    capacidades = obter_capacidades()
+    return {
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "processador": platform.processor() or platform.machine(),
+        "nucleos": os.cpu_count(),
+        "pillow": PIL.__version__,
+        "ffmpeg": capacidades.versao_ffmpeg
+    }
+
+
+def _criar_parser():
+    """
+    Cria o analisador de argumentos do benchmark
+
+    Returns:
+        argparse.ArgumentParser: Analisador configurado
+    """
+    parser = argparse.ArgumentParser(
+        description="Mede as rotas de conversão e os níveis de compressão em um corpus sintético."
+    )
+    parser.add_argument("--corpus", help="Diretório do corpus (reaproveitado entre execuções)")
+    parser.add_argument("-o", "--saida", help="Arquivo do relatório JSON (padrão: saída padrão)")
+    parser.add_argument(
+        "--megapixels", default=",".join(str(mp) for mp in MEGAPIXELS_PADRAO),
+        help="Tamanhos das imagens em megapixels, separados por vírgula (padrão: %(default)s)"
+    )
+    parser.add_argument(
+        "--duracao", type=float, default=DURACAO_PADRAO, metavar="SEG",
+        help="Duração do áudio e do vídeo em segundos (padrão: %(default)g)"
+    )
+    parser.add_argument(
+        "--repeticoes", type=int, default=REPETICOES_PADRAO, metavar="N",
+        help="Repetições de cada caso (padrão: %(default)s)"
+    )
+    parser.add_argument("--semente", type=int, default=SEMENTE_PADRAO, help="Semente do corpus")
+    parser.add_argument(
+        "--arquivos-arvore", type=int, default=ARQUIVOS_ARVORE_PADRAO, metavar="N",
+        help="Inclui no corpus uma árvore com N arquivos pequenos (padrão: %(default)s, sem árvore)"
+    )
+    parser.add_argument(
+        "--megapixels-reducao", type=float, default=MEGAPIXELS_REDUCAO, metavar="MP",
+        help="Tamanho da foto dos casos de redução em megapixels (padrão: %(default)g, 0 não a cria)"
+    )
+    parser.add_argument(
+        "--filtro", action="append", default=[],
+        help="Mede apenas os casos cujo nome contém o texto (pode ser repetido)"
+    )
+    return parser
+
+
+def main(argv=None):
+    """
+    Executa o benchmark
+
+    Args:
+        argv (list): Argumentos (usa sys.argv se não informado)
+
+    Returns:
+        int: Código de saída (1 se algum caso falhou)
+    """
+    args = _criar_parser().parse_args(argv)
+    megapixels = tuple(float(mp) if "." in mp else int(mp) for mp in args.megapixels.split(","))
+    corpus = args.corpus or os.path.join(tempfile.gettempdir(), "conversor_arquivos_corpus")
+
+    # Mensagens dos motores (print) não devem se misturar ao relatório
+    saida_json = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        itens = gerar_corpus(
+            corpus, megapixels, args.duracao, args.semente, args.arquivos_arvore, args.megapixels_reducao
+        )
+        conversor = Conversor()
+        compressor = Compressor()
+
+        casos = _casos(itens, conversor, compressor)
+        if args.filtro:
+            casos = [caso for caso in casos if any(filtro in caso["nome"] for filtro in args.filtro)]
+
+        diretorio_saida = tempfile.mkdtemp(prefix="conversor_benchmark_")
+        try:
+            resultados = []
+            referencias = {}
+            for caso in casos:
+                print(f"Medindo {caso['nome']}...", file=sys.stderr)
+                resultados.append(executar_caso(
+                    caso, conversor, compressor, diretorio_saida, args.repeticoes, referencias
+                ))
+        finally:
+            shutil.rmtree(diretorio_saida, ignore_errors=True)
+    finally:
+        sys.stdout = saida_json
+
+    relatorio = {
+        "ambiente": _ambiente(),
+        "parametros": {
+            "corpus": corpus, "megapixels": list(megapixels), "duracao": args.duracao,
+            "repeticoes": args.repeticoes, "semente": args.semente,
+            "arquivos_arvore": args.arquivos_arvore, "megapixels_reducao": args.megapixels_reducao
+        },
+        "resultados": resultados
+    }
+
+    texto = json.dumps(relatorio, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+    return 1 if any(resultado["status"] != "concluido" for resultado in resultados) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
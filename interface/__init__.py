@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 
 """
-Pacote que contém os módulos de interface gráfica da aplicação
+Pacote que contém os módulos de interface da aplicação (gráfica e linha de comando)
 """
 
-__all__ = ['app', 'tela_comprimir', 'tela_converter']
\ No newline at end of file
+__all__ = ['app', 'cli', 'tela_comprimir', 'tela_converter']
\ No newline at end of file
@@ -0,0 +1,744 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Módulo que contém a interface de linha de comando para conversão e
+compressão em lote, sem necessidade de ambiente gráfico
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import queue
+import signal
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.agendador import (
+    Agendador, FILA_CPU, FILA_IMAGEM, FILA_IO, POLITICA_JUSTA, POLITICAS_THREADS, tarefa_atual
+)
+from utils.cache_saida import LIMITE_PADRAO, CacheSaida
+from utils.compressor import Compressor
+from utils.conversor import Conversor
+from utils.diario import (
+    ESTADO_CANCELADO, ESTADO_CONCLUIDO, ESTADO_ERRO, ESTADO_EXECUTANDO, DiarioLote
+)
+from utils.imagem import OrcamentoMemoria
+from utils.metadados import obter_metadados
+from utils.metricas import ColetorMetricas, registrar_gancho, remover_gancho
+from utils.processos_imagem import ExecutorImagens
+from utils.segmentos import DURACAO_SEGMENTO_PADRAO, METRICA_PADRAO, METRICAS_QUALIDADE
+from utils.vigia import (
+    ESTABILIDADE_PADRAO, INTERVALO_PADRAO, MAX_FILA_PADRAO, OPERACAO_COMPRIMIR,
+    OPERACAO_CONVERTER, RegraPasta, Vigia, carregar_regras
+)
+
+
+# Intervalo padrão (em segundos) entre as gravações do arquivo de métricas
+INTERVALO_METRICAS = 15.0
+
+# Os eventos chegam das threads do agendador; cada linha sai inteira
+_lock_emissao = threading.Lock()
+
+
+def expandir_entradas(entradas, extensoes_validas):
+    """
+    Expande arquivos, padrões glob e diretórios (recursivamente)
+
+    Args:
+        entradas (list): Caminhos informados na linha de comando
+        extensoes_validas (set): Extensões aceitas ao percorrer diretórios
+
+    Returns:
+        list: Tuplas (arquivo, caminho relativo usado na saída)
+    """
+    arquivos = []
+    vistos = set()
+
+    def adicionar(arquivo, relativo):
+        caminho = os.path.abspath(arquivo)
+        if caminho not in vistos:
+            vistos.add(caminho)
+            arquivos.append((caminho, relativo))
+
+    for entrada in entradas:
+        # Padrões glob (úteis quando o shell não os expande)
+        if glob.has_magic(entrada):
+            caminhos = sorted(glob.glob(entrada, recursive=True))
+        else:
+            caminhos = [entrada]
+
+        for caminho in caminhos:
+            if os.path.isdir(caminho):
+                # Percorre o diretório mantendo a estrutura relativa
+                for raiz, _, nomes in os.walk(caminho):
+                    for nome in sorted(nomes):
+                        if os.path.splitext(nome)[1].lower() not in extensoes_validas:
+                            continue
+                        arquivo = os.path.join(raiz, nome)
+                        adicionar(arquivo, os.path.relpath(arquivo, caminho))
+            else:
+                # Arquivos informados diretamente são sempre incluídos
+                adicionar(caminho, os.path.basename(caminho))
+
+    return arquivos
+
+
+def _opcoes_conversao(args):
+    """
+    Monta o dicionário de opções do Conversor a partir dos argumentos
+
+    Args:
+        args (argparse.Namespace): Argumentos da linha de comando
+
+    Returns:
+        dict: Opções de conversão
+    """
+    opcoes = {}
+    if args.qualidade is not None:
+        opcoes["qualidade"] = args.qualidade
+    if args.redimensionar:
+        opcoes["redimensionar"] = args.redimensionar
+    if args.resolucao:
+        opcoes["resolucao"] = args.resolucao
+    if args.fps:
+        opcoes["fps"] = args.fps
+    if args.bitrate:
+        opcoes["bitrate"] = args.bitrate
+    if args.canais:
+        opcoes["canais"] = args.canais
+    if args.extrair_audio:
+        opcoes["extracao_audio"] = True
+    if args.recodificar:
+        opcoes["recodificar"] = True
+    if args.reducao_rapida is not None:
+        opcoes["reducao_rapida"] = args.reducao_rapida
+    return opcoes
+
+
+def _criar_parser():
+    """
+    Cria o analisador de argumentos da linha de comando
+
+    Returns:
+        argparse.ArgumentParser: Analisador configurado
+    """
+    parser = argparse.ArgumentParser(
+        prog="conversor_arquivos",
+        description="Conversão e compressão de arquivos em lote (sem interface gráfica)."
+    )
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    # Argumentos comuns a todos os comandos
+    comum = argparse.ArgumentParser(add_help=False)
+    comum.add_argument(
+        "-j", "--jobs", type=int, default=None,
+        help="Número máximo de tarefas simultâneas por fila (padrão: núcleos da máquina)"
+    )
+    comum.add_argument(
+        "--threads", type=int, default=None, metavar="N",
+        help="Total de threads divididas entre as codificações simultâneas do FFmpeg"
+    )
+    comum.add_argument(
+        "--politica-threads", choices=list(POLITICAS_THREADS), default=POLITICA_JUSTA,
+        help="Divisão das threads: partes iguais (justo) ou priorizando as tarefas mais antigas"
+    )
+    comum.add_argument(
+        "--processos-imagem", type=int, default=0, metavar="N",
+        help="Processa as imagens em N processos separados (0 usa threads)"
+    )
+    comum.add_argument(
+        "--memoria-imagem", type=float, default=None, metavar="MB",
+        help="Memória por trabalhador para decodificar imagens, em MB (padrão: metade da RAM "
+             "dividida entre os trabalhadores); as maiores esperam ou são lidas em faixas"
+    )
+    comum.add_argument(
+        "--cache", action="store_true",
+        help="Reaproveita resultados de entradas e opções idênticas já processadas"
+    )
+    comum.add_argument("--cache-dir", help="Diretório do cache de resultados (ativa o cache)")
+    comum.add_argument(
+        "--cache-limite", type=float, default=LIMITE_PADRAO / 1024 ** 3, metavar="GB",
+        help="Tamanho máximo do cache em GB (padrão: %(default)g)"
+    )
+    comum.add_argument(
+        "--progresso", action="store_true",
+        help="Emite eventos de progresso em JSON na saída de erro"
+    )
+    comum.add_argument(
+        "--etapas", action="store_true",
+        help="Emite em JSON na saída de erro a duração de cada etapa (sondar, decodificar, codificar...)"
+    )
+    comum.add_argument(
+        "--metricas", metavar="ARQUIVO",
+        help="Grava histogramas da duração das etapas (JSON se terminar em .json, senão formato do Prometheus)"
+    )
+    comum.add_argument(
+        "--metricas-intervalo", type=float, default=INTERVALO_METRICAS, metavar="SEG",
+        help="Intervalo entre as gravações do arquivo de métricas (padrão: %(default)g)"
+    )
+
+    # Argumentos dos comandos que processam um lote de entradas
+    lote = argparse.ArgumentParser(add_help=False)
+    lote.add_argument(
+        "entradas", nargs="+",
+        help="Arquivos, padrões glob ou diretórios (percorridos recursivamente)"
+    )
+    lote.add_argument("-o", "--saida", help="Diretório de saída")
+    lote.add_argument(
+        "--retomar", action="store_true",
+        help="Ignora os arquivos já concluídos por uma execução anterior no mesmo diretório de saída"
+    )
+
+    # Comando de conversão
+    convert = subparsers.add_parser("convert", parents=[lote, comum], help="Converte arquivos")
+    convert.add_argument("-f", "--formato", required=True, help="Formato de saída (ex.: mp4, mp3, webp; auto na extração de áudio)")
+    convert.add_argument("--qualidade", type=int, help="Qualidade da imagem (1-100)")
+    convert.add_argument("--redimensionar", help="Novo tamanho da imagem, ex.: 1280x720")
+    convert.add_argument("--resolucao", choices=["original", "360p", "480p", "720p", "1080p"], help="Resolução do vídeo")
+    convert.add_argument("--fps", help="Taxa de quadros do vídeo")
+    convert.add_argument("--bitrate", help="Taxa de bits do áudio, ex.: 192k")
+    convert.add_argument("--canais", choices=["1", "2"], help="Número de canais de áudio")
+    convert.add_argument("--extrair-audio", action="store_true", help="Extrai o áudio dos vídeos")
+    convert.add_argument(
+        "--recodificar", action="store_true",
+        help="Recodifica sempre, mesmo quando os streams poderiam ser copiados"
+    )
+    convert.add_argument(
+        "--reducao-rapida", action=argparse.BooleanOptionalAction, default=None,
+        help="Ao redimensionar, decodifica JPEGs em escala reduzida e reduz por fatores inteiros "
+             "até o tamanho final antes do filtro final"
+    )
+
+    # Comando de compressão
+    compress = subparsers.add_parser("compress", parents=[lote, comum], help="Comprime arquivos")
+    compress.add_argument(
+        "-n", "--nivel", default="médio",
+        choices=["baixo", "médio", "alto", "máximo"],
+        help="Nível de compressão"
+    )
+    compress.add_argument(
+        "--segmentar", action="store_true",
+        help="Divide vídeos longos em segmentos codificados em paralelo"
+    )
+    compress.add_argument(
+        "--duracao-segmento", type=float, default=DURACAO_SEGMENTO_PADRAO, metavar="SEG",
+        help=f"Duração aproximada de cada segmento em segundos (padrão: {DURACAO_SEGMENTO_PADRAO})"
+    )
+    compress.add_argument(
+        "--reducao-rapida", action=argparse.BooleanOptionalAction, default=None,
+        help="Reduz imagens grandes por fatores inteiros até o tamanho final antes do filtro "
+             "final (padrão: mantém o dobro do tamanho final, como o thumbnail() do Pillow)"
+    )
+    compress.add_argument(
+        "--max-kb", type=float, default=None, metavar="KB",
+        help="Tamanho máximo das imagens comprimidas; a qualidade (até a do nível) é ajustada para caber"
+    )
+    compress.add_argument(
+        "--reduzir-dimensoes", action="store_true",
+        help="Com --max-kb, reduz também as dimensões quando nem a menor qualidade couber"
+    )
+    compress.add_argument(
+        "--tamanho-alvo-mb", type=float, default=None, metavar="MB",
+        help="Tamanho máximo dos vídeos comprimidos; a taxa de bits é calculada pela duração "
+             "e o vídeo é codificado em duas passagens (ignora o nível e --segmentar)"
+    )
+    compress.add_argument(
+        "--qualidade-auto", action="store_true",
+        help="Escolhe o CRF de cada vídeo codificando trechos amostrados com vários CRFs e "
+             "medindo a qualidade (substitui o CRF do nível)"
+    )
+    compress.add_argument(
+        "--metrica-qualidade", choices=sorted(METRICAS_QUALIDADE), default=METRICA_PADRAO,
+        help=f"Métrica usada por --qualidade-auto (padrão: {METRICA_PADRAO})"
+    )
+    compress.add_argument(
+        "--qualidade-alvo", type=float, default=None, metavar="VALOR",
+        help="Pontuação mínima dos trechos com --qualidade-auto (padrão: "
+             + ", ".join(f"{metrica} {valor}" for metrica, valor in sorted(METRICAS_QUALIDADE.items())) + ")"
+    )
+
+    # Vigia de pastas (processo de longa duração)
+    watch = subparsers.add_parser(
+        "watch", parents=[comum],
+        help="Vigia pastas e processa os arquivos que chegam a elas"
+    )
+    watch.add_argument(
+        "pastas", nargs="*",
+        help="Pastas vigiadas com a mesma regra (converte com -f ou comprime com -n)"
+    )
+    watch.add_argument("--regras", metavar="ARQUIVO", help="Arquivo JSON com uma regra por pasta")
+    watch.add_argument("-o", "--saida", help="Diretório de saída das regras que não informam um")
+    watch.add_argument("-f", "--formato", help="Converte os arquivos das pastas para este formato")
+    watch.add_argument(
+        "-n", "--nivel", default="médio",
+        choices=["baixo", "médio", "alto", "máximo"],
+        help="Nível de compressão (quando -f não é informado)"
+    )
+    watch.add_argument(
+        "--estabilidade", type=float, default=ESTABILIDADE_PADRAO, metavar="SEG",
+        help="Segundos sem mudança de tamanho para um arquivo ser processado (padrão: %(default)g)"
+    )
+    watch.add_argument(
+        "--intervalo", type=float, default=INTERVALO_PADRAO, metavar="SEG",
+        help="Intervalo entre as varreduras quando não há inotify (padrão: %(default)g)"
+    )
+    watch.add_argument(
+        "--max-fila", type=int, default=MAX_FILA_PADRAO, metavar="N",
+        help="Máximo de arquivos prontos aguardando ou em processamento (padrão: %(default)s)"
+    )
+    watch.add_argument(
+        "--polling", action="store_true",
+        help="Varre as pastas periodicamente em vez de usar o inotify"
+    )
+
+    return parser
+
+
+def _duracao_estimada(arquivo):
+    """
+    Retorna a duração de uma mídia em segundos para ordenar a fila
+
+    Args:
+        arquivo (str): Caminho do arquivo
+
+    Returns:
+        int: Duração em segundos (0 se não puder ser determinada)
+    """
+    try:
+        return int(obter_metadados(arquivo)["duracao"] or 0)
+    except Exception:
+        # O erro real será informado quando o arquivo for processado
+        return 0
+
+
+def _emitir(evento, fluxo):
+    """
+    Escreve um evento como uma linha JSON
+
+    Pode ser chamada de qualquer thread: a escrita e o flush são feitos sob
+    um lock, para que as linhas não se misturem.
+
+    Args:
+        evento (dict): Evento a ser emitido
+        fluxo: Arquivo de destino
+    """
+    linha = json.dumps(evento, ensure_ascii=False) + "\n"
+    with _lock_emissao:
+        fluxo.write(linha)
+        fluxo.flush()
+
+
+def main(argv=None):
+    """
+    Executa a linha de comando
+
+    Args:
+        argv (list): Argumentos (usa sys.argv se não informado)
+
+    Returns:
+        int: Código de saída (0 se todos os arquivos foram processados)
+    """
+    args = _criar_parser().parse_args(argv)
+
+    # A saída padrão fica reservada para as linhas JSON; mensagens dos
+    # motores (que usam print) vão para a saída de erro
+    saida_json = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        return _executar(args, saida_json)
+    finally:
+        sys.stdout = saida_json
+
+
+def _executar(args, saida_json):
+    """
+    Prepara os recursos compartilhados e processa os arquivos
+
+    Args:
+        args (argparse.Namespace): Argumentos da linha de comando
+        saida_json: Arquivo onde os resultados são emitidos
+
+    Returns:
+        int: Código de saída
+    """
+    # Pool de processos opcional para as imagens
+    executor_imagens = None
+    if args.processos_imagem:
+        executor_imagens = ExecutorImagens(args.processos_imagem)
+
+    # Cache opcional de resultados
+    cache = None
+    if args.cache or args.cache_dir:
+        cache = CacheSaida(args.cache_dir, int(args.cache_limite * 1024 ** 3))
+
+    # Eventos de etapa e métricas opcionais
+    ganchos = []
+    if args.etapas:
+        ganchos.append(lambda evento: _emitir(evento, sys.stderr))
+    coletor = None
+    parar_metricas = threading.Event()
+    if args.metricas:
+        coletor = ColetorMetricas()
+        ganchos.append(coletor)
+        threading.Thread(
+            target=_gravar_metricas_periodicamente,
+            args=(coletor, args.metricas, args.metricas_intervalo, parar_metricas),
+            name="metricas", daemon=True
+        ).start()
+    for gancho in ganchos:
+        registrar_gancho(gancho)
+
+    try:
+        if args.comando == "watch":
+            return _vigiar(args, saida_json, executor_imagens, cache)
+        return _processar_lote(args, saida_json, executor_imagens, cache)
+    finally:
+        if executor_imagens is not None:
+            executor_imagens.encerrar()
+        if cache is not None:
+            _emitir({"evento": "cache", **cache.estatisticas()}, sys.stderr)
+        for gancho in ganchos:
+            remover_gancho(gancho)
+        if coletor is not None:
+            parar_metricas.set()
+            coletor.gravar(args.metricas)
+
+
+def _gravar_metricas_periodicamente(coletor, caminho, intervalo, parar):
+    """
+    Regrava o arquivo de métricas a cada intervalo (útil no comando watch e
+    em lotes longos)
+
+    Args:
+        coletor (ColetorMetricas): Coletor das durações das etapas
+        caminho (str): Arquivo de métricas
+        intervalo (float): Intervalo entre as gravações em segundos
+        parar (threading.Event): Sinal de término
+    """
+    while not parar.wait(max(1.0, intervalo)):
+        try:
+            coletor.gravar(caminho)
+        except OSError as e:
+            print(f"Erro ao gravar métricas: {str(e)}", file=sys.stderr)
+
+
+def _criar_agendador(args, executor_imagens):
+    """
+    Cria o agendador com os limites informados na linha de comando
+
+    Args:
+        args (argparse.Namespace): Argumentos da linha de comando
+        executor_imagens (ExecutorImagens): Executor de imagens em processos
+
+    Returns:
+        Agendador: Agendador configurado
+    """
+    # O mesmo limite vale para todas as filas quando --jobs é informado
+    limites = {}
+    if args.jobs:
+        limites = {FILA_CPU: args.jobs, FILA_IMAGEM: args.jobs, FILA_IO: args.jobs}
+    if executor_imagens is not None:
+        # Com processos, as threads da fila de imagem apenas aguardam os
+        # resultados; precisam ser suficientes para encher os lotes
+        limites[FILA_IMAGEM] = executor_imagens.max_processos * executor_imagens.tamanho_lote
+    return Agendador(limites, args.threads, args.politica_threads)
+
+
+def _criar_orcamento(args, executor_imagens, agendador):
+    """
+    Cria o orçamento de memória das imagens para o número de trabalhadores
+
+    Args:
+        args (argparse.Namespace): Argumentos da linha de comando
+        executor_imagens (ExecutorImagens): Executor de imagens em processos
+        agendador (Agendador): Agendador do lote
+
+    Returns:
+        OrcamentoMemoria: Orçamento configurado
+    """
+    # Com processos, só eles decodificam imagens ao mesmo tempo
+    if executor_imagens is not None:
+        trabalhadores = executor_imagens.max_processos
+    else:
+        trabalhadores = agendador.limites[FILA_IMAGEM]
+
+    limite = None
+    if args.memoria_imagem:
+        limite = int(args.memoria_imagem * 1024 ** 2)
+    return OrcamentoMemoria(limite, trabalhadores)
+
+
+def _vigiar(args, saida_json, executor_imagens, cache=None):
+    """
+    Vigia as pastas até receber Ctrl+C ou SIGTERM, emitindo um resultado
+    por arquivo processado
+
+    Args:
+        args (argparse.Namespace): Argumentos da linha de comando
+        saida_json: Arquivo onde os resultados são emitidos
+        executor_imagens (ExecutorImagens): Executor de imagens em processos
+        cache (CacheSaida): Cache de resultados (None desativa)
+
+    Returns:
+        int: Código de saída
+    """
+    saida_padrao = args.saida or os.path.join(os.path.expanduser("~"), "Downloads", "vigiados")
+    try:
+        regras = carregar_regras(args.regras, saida_padrao) if args.regras else []
+        for pasta in args.pastas:
+            if args.formato:
+                regras.append(RegraPasta(pasta, OPERACAO_CONVERTER, saida_padrao, formato=args.formato))
+            else:
+                regras.append(RegraPasta(pasta, OPERACAO_COMPRIMIR, saida_padrao, nivel=args.nivel))
+    except (OSError, ValueError) as e:
+        print(f"Regras inválidas: {e}", file=sys.stderr)
+        return 2
+    if not regras:
+        print("Informe as pastas a vigiar ou um arquivo de regras (--regras).", file=sys.stderr)
+        return 2
+
+    agendador = _criar_agendador(args, executor_imagens)
+    orcamento = _criar_orcamento(args, executor_imagens, agendador)
+
+    try:
+        vigia = Vigia(
+            regras,
+            Conversor(executor_imagens, cache, orcamento),
+            Compressor(executor_imagens, agendador, cache, orcamento),
+            agendador,
+            estabilidade=args.estabilidade,
+            intervalo=args.intervalo,
+            max_fila=args.max_fila,
+            usar_inotify=not args.polling,
+            ao_resultado=lambda evento: _emitir(evento, saida_json),
+            ao_progresso=(lambda evento: _emitir(evento, sys.stderr)) if args.progresso else None
+        )
+    except (OSError, ValueError) as e:
+        print(f"Não foi possível iniciar o vigia: {e}", file=sys.stderr)
+        return 2
+
+    # SIGTERM encerra como Ctrl+C (os arquivos interrompidos são refeitos
+    # na próxima execução)
+    signal.signal(signal.SIGTERM, lambda *_: vigia.parar(cancelar=True))
+
+    _emitir({
+        "evento": "vigia", "pastas": [regra.entrada for regra in regras],
+        "inotify": vigia.usa_inotify
+    }, sys.stderr)
+    try:
+        vigia.executar()
+    except KeyboardInterrupt:
+        vigia.parar(cancelar=True)
+        return 130
+    finally:
+        vigia.aguardar_tarefas()
+    return 0
+
+
+def _processar_lote(args, saida_json, executor_imagens, cache=None):
+    """
+    Submete os arquivos ao agendador e emite os resultados
+
+    Args:
+        args (argparse.Namespace): Argumentos da linha de comando
+        saida_json: Arquivo onde os resultados são emitidos
+        executor_imagens (ExecutorImagens): Executor de imagens em processos
+        cache (CacheSaida): Cache de resultados (None desativa)
+
+    Returns:
+        int: Código de saída
+    """
+    agendador = _criar_agendador(args, executor_imagens)
+    orcamento = _criar_orcamento(args, executor_imagens, agendador)
+
+    # Prepara o motor e a regra de nomes de saída de cada comando
+    if args.comando == "convert":
+        motor = Conversor(executor_imagens, cache, orcamento)
+        formato = args.formato.lower()
+        opcoes = _opcoes_conversao(args)
+        diretorio_saida = args.saida or os.path.join(os.path.expanduser("~"), "Downloads", "convertidos")
+        operacao = "converter"
+        parametros = {"formato": formato, "opcoes": opcoes}
+
+        def nome_saida(arquivo, relativo):
+            # Na extração de áudio, "auto" escolhe o contêiner pelo codec
+            formato_arquivo = formato
+            if formato == "auto":
+                try:
+                    formato_arquivo = motor.formato_extracao_audio(arquivo, opcoes)
+                except Exception:
+                    # O erro real será informado quando o arquivo for processado
+                    formato_arquivo = "mp3"
+            return f"{os.path.splitext(relativo)[0]}.{formato_arquivo}"
+
+        def processar(arquivo, arquivo_saida, callback):
+            formato_arquivo = os.path.splitext(arquivo_saida)[1][1:] if formato == "auto" else formato
+            return motor.converter_arquivo(
+                arquivo, arquivo_saida, formato_arquivo, opcoes, callback, tarefa=tarefa_atual()
+            )
+
+        # Ao percorrer diretórios, considera apenas tipos que aceitam o formato
+        tipos = {tipo for tipo, formatos in motor.formatos_conversao.items() if formato in formatos}
+        if args.extrair_audio:
+            tipos.add("vídeo")
+    else:
+        motor = Compressor(executor_imagens, agendador, cache, orcamento)
+        opcoes = {"segmentar": args.segmentar, "duracao_segmento": args.duracao_segmento}
+        if args.reducao_rapida is not None:
+            opcoes["reducao_rapida"] = args.reducao_rapida
+        if args.max_kb:
+            opcoes["max_bytes"] = int(args.max_kb * 1024)
+            opcoes["reduzir_dimensoes"] = args.reduzir_dimensoes
+        if args.tamanho_alvo_mb:
+            opcoes["tamanho_alvo"] = int(args.tamanho_alvo_mb * 1024 ** 2)
+        if args.qualidade_auto:
+            opcoes["qualidade_auto"] = True
+            opcoes["metrica_qualidade"] = args.metrica_qualidade
+            if args.qualidade_alvo is not None:
+                opcoes["qualidade_alvo"] = args.qualidade_alvo
+        diretorio_saida = args.saida or os.path.join(os.path.expanduser("~"), "Downloads", "comprimidos")
+        operacao = "comprimir"
+        parametros = {"nivel": args.nivel, "opcoes": opcoes}
+
+        def nome_saida(arquivo, relativo):
+            base, extensao = os.path.splitext(relativo)
+            return f"{base}_comprimido{extensao}"
+
+        def processar(arquivo, arquivo_saida, callback):
+            return motor.comprimir_arquivo(
+                arquivo, arquivo_saida, args.nivel, callback, tarefa=tarefa_atual(), opcoes=opcoes
+            )
+
+        tipos = set(motor.extensao_para_tipo.values())
+
+    extensoes = {ext for ext, tipo in motor.extensao_para_tipo.items() if tipo in tipos}
+    arquivos = expandir_entradas(args.entradas, extensoes)
+    if not arquivos:
+        print("Nenhum arquivo encontrado nas entradas informadas.", file=sys.stderr)
+        return 2
+
+    # Diário do lote no diretório de saída (permite retomar com --retomar)
+    diario = DiarioLote(diretorio_saida)
+    try:
+        return _executar_lote(
+            args, saida_json, agendador, motor, arquivos, diretorio_saida,
+            nome_saida, processar, diario, operacao, parametros
+        )
+    finally:
+        diario.fechar()
+
+
+def _executar_lote(args, saida_json, agendador, motor, arquivos, diretorio_saida,
+                   nome_saida, processar, diario, operacao, parametros):
+    """
+    Submete os arquivos ao agendador, registra o estado de cada um no diário
+    e emite os resultados
+
+    Args:
+        args (argparse.Namespace): Argumentos da linha de comando
+        saida_json: Arquivo onde os resultados são emitidos
+        agendador (Agendador): Agendador do lote
+        motor (Conversor ou Compressor): Motor que processa os arquivos
+        arquivos (list): Tuplas (arquivo, caminho relativo)
+        diretorio_saida (str): Diretório de saída
+        nome_saida (function): Regra de nome da saída de cada arquivo
+        processar (function): Processa um arquivo
+        diario (DiarioLote): Diário do lote
+        operacao (str): "converter" ou "comprimir"
+        parametros (dict): Formato, nível e opções registrados no diário
+
+    Returns:
+        int: Código de saída
+    """
+    resultados = queue.Queue()
+
+    def executar(arquivo, arquivo_saida):
+        inicio = time.monotonic()
+        evento = {"evento": "resultado", "entrada": arquivo, "saida": arquivo_saida}
+
+        def atualizar_progresso(progresso):
+            if args.progresso:
+                evento_progresso = {"evento": "progresso", "entrada": arquivo, "progresso": progresso}
+
+                # Tempo processado, fps e velocidade informados pelo FFmpeg
+                tarefa = tarefa_atual()
+                if tarefa is not None and tarefa.estatisticas:
+                    evento_progresso.update(tarefa.estatisticas)
+                _emitir(evento_progresso, sys.stderr)
+
+        diario.marcar(arquivo_saida, ESTADO_EXECUTANDO)
+        try:
+            os.makedirs(os.path.dirname(arquivo_saida), exist_ok=True)
+            if processar(arquivo, arquivo_saida, atualizar_progresso):
+                evento["status"] = ESTADO_CONCLUIDO
+
+                # Resultado informado pelo motor (ex.: tamanho obtido x alvo)
+                tarefa = tarefa_atual()
+                if tarefa is not None and tarefa.relatorio:
+                    evento.update(tarefa.relatorio)
+            else:
+                evento["status"] = ESTADO_CANCELADO
+        except Exception as e:
+            evento["status"] = ESTADO_ERRO
+            evento["erro"] = str(e)
+        evento["duracao"] = round(time.monotonic() - inicio, 3)
+        diario.marcar(arquivo_saida, evento["status"], evento.get("erro"))
+        resultados.put(evento)
+
+    # Mídias mais longas entram primeiro na fila de CPU, o que reduz o tempo
+    # total do lote (a sondagem fica em cache e é reaproveitada pelos motores)
+    filas = [motor.fila_execucao(arquivo) for arquivo, _ in arquivos]
+    midias = [arquivo for (arquivo, _), fila in zip(arquivos, filas) if fila == FILA_CPU]
+    with ThreadPoolExecutor(max_workers=8) as sondagens:
+        duracoes = dict(zip(midias, sondagens.map(_duracao_estimada, midias)))
+
+    pendentes = []
+    for (arquivo, relativo), fila in zip(arquivos, filas):
+        arquivo_saida = os.path.join(diretorio_saida, nome_saida(arquivo, relativo))
+
+        # Arquivos concluídos em uma execução anterior (mesma entrada e
+        # parâmetros) são ignorados ao retomar
+        if args.retomar and diario.concluido(arquivo, arquivo_saida, operacao, parametros):
+            _emitir({
+                "evento": "resultado", "entrada": arquivo, "saida": arquivo_saida,
+                "status": "ignorado", "duracao": 0
+            }, saida_json)
+            continue
+
+        pendentes.append((arquivo, arquivo_saida, fila))
+
+    # Registra o lote inteiro no diário de uma vez, antes de submeter
+    diario.registrar_varios(
+        [(arquivo, arquivo_saida) for arquivo, arquivo_saida, _ in pendentes], operacao, parametros
+    )
+
+    # Submete todos os arquivos; o agendador limita a concorrência
+    tarefas = []
+    for arquivo, arquivo_saida, fila in pendentes:
+        tarefas.append(agendador.submeter(
+            fila, executar, arquivo, arquivo_saida,
+            prioridade=duracoes.get(arquivo, 0)
+        ))
+
+    # Emite os resultados conforme as tarefas terminam
+    falhas = 0
+    try:
+        for _ in tarefas:
+            evento = resultados.get()
+            if evento["status"] != ESTADO_CONCLUIDO:
+                falhas += 1
+            _emitir(evento, saida_json)
+    except KeyboardInterrupt:
+        for tarefa in tarefas:
+            tarefa.cancelar()
+        return 130
+
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,10 +8,17 @@ Módulo que contém a interface de compressão de arquivos
 import os
 import queue
 import tkinter as tk
-from threading import Thread
 from tkinter import filedialog, messagebox, ttk
 
+from utils.agendador import obter_agendador, tarefa_atual
 from utils.compressor import Compressor
+from utils.diario import (
+    ESTADO_CANCELADO,
+    ESTADO_CONCLUIDO,
+    ESTADO_ERRO,
+    ESTADO_EXECUTANDO,
+    DiarioLote,
+)
 
 
 class TelaComprimir(ttk.Frame):
@@ -33,6 +40,9 @@ class TelaComprimir(ttk.Frame):
         # Inicializa o compressor
         self.compressor = Compressor()
 
+        # Agendador compartilhado que limita as compressões simultâneas
+        self.agendador = obter_agendador()
+
         # Fila para comunicação com threads
         self.queue = queue.Queue()
 
@@ -42,6 +52,9 @@ class TelaComprimir(ttk.Frame):
         # Dicionário para armazenar as tarefas de compressão
         self.tarefas_compressao = {}
 
+        # Diários de lote abertos, por diretório de saída
+        self.diarios = {}
+
         # Variáveis de controle
         self.compressao_em_andamento = False
         self.diretorio_saida = os.path.join(
@@ -118,6 +131,58 @@ class TelaComprimir(ttk.Frame):
             frame_nivel_controles, text="(quanto maior o nível, mais tempo demora)"
         ).pack(side="left", padx=5)
 
+        # Codificação de vídeos longos em segmentos paralelos
+        self.var_segmentar = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            frame_nivel,
+            text="Dividir vídeos longos em segmentos comprimidos em paralelo",
+            variable=self.var_segmentar,
+        ).pack(fill="x", padx=15, pady=(0, 5))
+
+        # Redução rápida das imagens maiores que o limite
+        self.var_reducao_rapida = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            frame_nivel,
+            text="Redução rápida de imagens grandes (um pouco menos nítida)",
+            variable=self.var_reducao_rapida,
+        ).pack(fill="x", padx=15, pady=(0, 5))
+
+        # Tamanho máximo das imagens comprimidas (0 mantém a qualidade do nível)
+        frame_max_kb = ttk.Frame(frame_nivel)
+        frame_max_kb.pack(fill="x", padx=15, pady=(0, 5))
+        ttk.Label(frame_max_kb, text="Tamanho máximo das imagens (KB, 0 = sem limite):").pack(side="left")
+        self.var_max_kb = tk.IntVar(value=0)
+        ttk.Spinbox(
+            frame_max_kb, from_=0, to=1000000, increment=50,
+            textvariable=self.var_max_kb, width=10
+        ).pack(side="left", padx=5)
+        self.var_reduzir_dimensoes = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            frame_max_kb,
+            text="Reduzir as dimensões se necessário",
+            variable=self.var_reduzir_dimensoes,
+        ).pack(side="left", padx=5)
+
+        # Escolha do CRF dos vídeos pela qualidade medida em trechos amostrados
+        self.var_qualidade_auto = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            frame_nivel,
+            text="Escolher a qualidade dos vídeos medindo trechos amostrados (SSIM)",
+            variable=self.var_qualidade_auto,
+        ).pack(fill="x", padx=15, pady=(0, 5))
+
+        # Tamanho alvo dos vídeos comprimidos (0 usa a qualidade do nível)
+        frame_alvo_video = ttk.Frame(frame_nivel)
+        frame_alvo_video.pack(fill="x", padx=15, pady=(0, 5))
+        ttk.Label(
+            frame_alvo_video, text="Tamanho alvo dos vídeos (MB, 0 = usar o nível):"
+        ).pack(side="left")
+        self.var_tamanho_alvo_mb = tk.IntVar(value=0)
+        ttk.Spinbox(
+            frame_alvo_video, from_=0, to=100000, increment=5,
+            textvariable=self.var_tamanho_alvo_mb, width=10
+        ).pack(side="left", padx=5)
+
         # --- Seção 3: Diretório de saída ---
         frame_saida = ttk.LabelFrame(frame_controles, text="Saída")
         frame_saida.pack(fill="x", pady=5)
@@ -323,6 +388,28 @@ class TelaComprimir(ttk.Frame):
             )
             return
 
+        # Verifica o tamanho máximo das imagens
+        try:
+            max_kb = self.var_max_kb.get()
+        except tk.TclError:
+            max_kb = -1
+        if max_kb < 0:
+            messagebox.showwarning(
+                "Atenção", "Informe o tamanho máximo das imagens em KB (0 = sem limite)."
+            )
+            return
+
+        # Verifica o tamanho alvo dos vídeos
+        try:
+            tamanho_alvo_mb = self.var_tamanho_alvo_mb.get()
+        except tk.TclError:
+            tamanho_alvo_mb = -1
+        if tamanho_alvo_mb < 0:
+            messagebox.showwarning(
+                "Atenção", "Informe o tamanho alvo dos vídeos em MB (0 = usar o nível)."
+            )
+            return
+
         # Verifica se o diretório de saída existe
         if not os.path.exists(self.diretorio_saida):
             try:
@@ -345,59 +432,153 @@ class TelaComprimir(ttk.Frame):
             tarefa["botao_cancelar"].config(state="normal")
             tarefa["status"].config(text="Na fila")
 
-        # Obtém o nível de compressão selecionado
+        # Obtém o nível de compressão e as opções selecionadas
         nivel = self.nivel_compressao.get()
+        opcoes = {
+            "segmentar": self.var_segmentar.get(),
+            "reducao_rapida": self.var_reducao_rapida.get(),
+            "qualidade_auto": self.var_qualidade_auto.get()
+        }
+        if max_kb:
+            opcoes["max_bytes"] = max_kb * 1024
+            opcoes["reduzir_dimensoes"] = self.var_reduzir_dimensoes.get()
+        if tamanho_alvo_mb:
+            opcoes["tamanho_alvo"] = tamanho_alvo_mb * 1024 ** 2
+
+        # Oferece ignorar os arquivos já comprimidos com as mesmas opções
+        diario = self.obter_diario()
+        parametros = {"nivel": nivel, "opcoes": opcoes}
+        indices = [
+            idx
+            for idx, tarefa in self.tarefas_compressao.items()
+            if not tarefa["cancelado"]
+        ]
+        ignorados = self.ignorar_concluidos(diario, indices, parametros)
+
+        # Submete as compressões ao agendador (apenas as que couberem nos
+        # limites de cada fila são executadas ao mesmo tempo)
+        for idx in indices:
+            if idx in ignorados:
+                continue
+            arquivo = self.tarefas_compressao[idx]["arquivo"]
+            diario.registrar(
+                arquivo, self.caminho_saida(arquivo), "comprimir", parametros
+            )
+            self.tarefas_compressao[idx]["execucao"] = self.agendador.submeter(
+                self.compressor.fila_execucao(arquivo),
+                self.executar_compressao,
+                idx,
+                arquivo,
+                nivel,
+                opcoes,
+                diario,
+            )
 
-        # Inicia as threads de compressão
-        for idx, tarefa in self.tarefas_compressao.items():
-            if not tarefa["cancelado"]:
-                thread = Thread(
-                    target=self.executar_compressao,
-                    args=(idx, tarefa["arquivo"], nivel),
-                    daemon=True,
-                )
-                thread.start()
+    def obter_diario(self):
+        """
+        Retorna o diário de lote do diretório de saída atual
+
+        Returns:
+            DiarioLote: Diário que registra o estado de cada arquivo
+        """
+        if self.diretorio_saida not in self.diarios:
+            self.diarios[self.diretorio_saida] = DiarioLote(self.diretorio_saida)
+        return self.diarios[self.diretorio_saida]
+
+    def caminho_saida(self, arquivo):
+        """
+        Retorna o caminho do arquivo comprimido
+
+        Args:
+            arquivo (str): Caminho completo do arquivo
+
+        Returns:
+            str: Caminho do arquivo de saída
+        """
+        nome_base, extensao = os.path.splitext(os.path.basename(arquivo))
+        return os.path.join(self.diretorio_saida, f"{nome_base}_comprimido{extensao}")
+
+    def ignorar_concluidos(self, diario, indices, parametros):
+        """
+        Pergunta se os arquivos já concluídos em uma execução anterior
+        (mesma entrada e opções) devem ser ignorados
+
+        Args:
+            diario (DiarioLote): Diário do diretório de saída
+            indices (list): Índices dos arquivos que serão comprimidos
+            parametros (dict): Nível e opções da compressão
+
+        Returns:
+            set: Índices dos arquivos ignorados
+        """
+        concluidos = {
+            idx
+            for idx in indices
+            if diario.concluido(
+                self.tarefas_compressao[idx]["arquivo"],
+                self.caminho_saida(self.tarefas_compressao[idx]["arquivo"]),
+                "comprimir",
+                parametros,
+            )
+        }
 
-    def executar_compressao(self, idx, arquivo, nivel):
+        if not concluidos or not messagebox.askyesno(
+            "Retomar Compressão",
+            f"{len(concluidos)} arquivo(s) já foram comprimidos com as mesmas opções "
+            "neste diretório de saída.\n\nDeseja ignorá-los?",
+        ):
+            return set()
+
+        # Marca os arquivos ignorados como concluídos
+        for idx in concluidos:
+            self.tarefas_compressao[idx]["status"].config(text="Concluído")
+            self.tarefas_compressao[idx]["progresso"]["value"] = 100
+            self.tarefas_compressao[idx]["botao_cancelar"].config(state="disabled")
+
+        return concluidos
+
+    def executar_compressao(self, idx, arquivo, nivel, opcoes, diario):
         """
-        Executa a compressão de um arquivo em uma thread separada
+        Executa a compressão de um arquivo em um trabalhador do agendador
 
         Args:
             idx (int): Índice do arquivo na lista
             arquivo (str): Caminho completo do arquivo
             nivel (str): Nível de compressão selecionado
+            opcoes (dict): Opções adicionais da compressão
+            diario (DiarioLote): Diário do lote
         """
+        arquivo_saida = self.caminho_saida(arquivo)
         try:
             # Atualiza o status
             self.queue.put(("status", idx, "Comprimindo"))
-
-            # Nome do arquivo de saída
-            nome_arquivo = os.path.basename(arquivo)
-            nome_base, extensao = os.path.splitext(nome_arquivo)
-            arquivo_saida = os.path.join(
-                self.diretorio_saida, f"{nome_base}_comprimido{extensao}"
-            )
+            diario.marcar(arquivo_saida, ESTADO_EXECUTANDO)
 
             # Callback para atualização do progresso
             def atualizar_progresso(progresso):
                 self.queue.put(("progresso", idx, progresso))
 
-            # Executa a compressão
+            # Executa a compressão (a saída só aparece quando estiver completa)
             resultado = self.compressor.comprimir_arquivo(
-                arquivo, arquivo_saida, nivel, atualizar_progresso
+                arquivo,
+                arquivo_saida,
+                nivel,
+                atualizar_progresso,
+                tarefa=tarefa_atual(),
+                opcoes=opcoes,
             )
 
             # Verifica se foi cancelado durante a execução
-            if self.tarefas_compressao[idx]["cancelado"]:
+            if self.tarefas_compressao[idx]["cancelado"] or not resultado:
+                diario.marcar(arquivo_saida, ESTADO_CANCELADO)
                 self.queue.put(("status", idx, "Cancelado"))
-                # Remove o arquivo parcialmente comprimido
-                if os.path.exists(arquivo_saida):
-                    os.remove(arquivo_saida)
             else:
+                diario.marcar(arquivo_saida, ESTADO_CONCLUIDO)
                 self.queue.put(("status", idx, "Concluído"))
                 self.queue.put(("progresso", idx, 100))
 
         except Exception as e:
+            diario.marcar(arquivo_saida, ESTADO_ERRO, str(e))
             self.queue.put(("status", idx, "Erro"))
             self.queue.put(("erro", idx, str(e)))
 
@@ -413,6 +594,21 @@ class TelaComprimir(ttk.Frame):
         self.tarefas_compressao[idx]["status"].config(text="Cancelando...")
         self.tarefas_compressao[idx]["botao_cancelar"].config(state="disabled")
 
+        # Retira a tarefa da fila ou encerra o processo em execução
+        self._cancelar_execucao(idx)
+
+    def _cancelar_execucao(self, idx):
+        """
+        Cancela a tarefa do agendador associada a um arquivo
+
+        Args:
+            idx (int): Índice do arquivo na lista
+        """
+        execucao = self.tarefas_compressao[idx].get("execucao")
+        if execucao is not None and execucao.cancelar():
+            # A tarefa ainda estava na fila e não chegará a ser executada
+            self.queue.put(("status", idx, "Cancelado"))
+
     def parar_compressao(self):
         """
         Para todos os processos de compressão em andamento
@@ -423,6 +619,7 @@ class TelaComprimir(ttk.Frame):
                 tarefa["cancelado"] = True
                 tarefa["status"].config(text="Cancelando...")
                 tarefa["botao_cancelar"].config(state="disabled")
+                self._cancelar_execucao(idx)
 
         # Restaura o botão para o estado inicial
         self.btn_comprimir.config(text="Comprimir", command=self.iniciar_compressao)
@@ -8,9 +8,12 @@ Módulo que contém a interface de conversão de arquivos
 import os
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from threading import Thread
 import queue
+from utils.agendador import obter_agendador, tarefa_atual
 from utils.conversor import Conversor
+from utils.diario import (
+    ESTADO_CANCELADO, ESTADO_CONCLUIDO, ESTADO_ERRO, ESTADO_EXECUTANDO, DiarioLote
+)
 
 class TelaConverter(ttk.Frame):
     """
@@ -31,6 +34,9 @@ class TelaConverter(ttk.Frame):
         # Inicializa o conversor
         self.conversor = Conversor()
         
+        # Agendador compartilhado que limita as conversões simultâneas
+        self.agendador = obter_agendador()
+        
         # Fila para comunicação com threads
         self.queue = queue.Queue()
         
@@ -40,6 +46,9 @@ class TelaConverter(ttk.Frame):
         # Dicionário para armazenar as tarefas de conversão
         self.tarefas_conversao = {}
         
+        # Diários de lote abertos, por diretório de saída
+        self.diarios = {}
+        
         # Variáveis de controle
         self.conversao_em_andamento = False
         self.diretorio_saida = os.path.join(os.path.expanduser("~"), "Downloads", "convertidos")
@@ -214,6 +223,14 @@ class TelaConverter(ttk.Frame):
         )
         self.combo_fps_video.pack(side="left", padx=5)
         
+        # Recodificação forçada (por padrão, streams compatíveis são copiados)
+        self.recodificar_video = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            self.frame_opcoes_video,
+            text="Sempre recodificar (não copiar streams compatíveis)",
+            variable=self.recodificar_video
+        ).pack(fill="x", padx=15, pady=5)
+        
         # Para imagem
         self.frame_opcoes_imagem = ttk.LabelFrame(self.frame_opcoes_avancadas, text="Opções de Imagem")
         
@@ -247,6 +264,14 @@ class TelaConverter(ttk.Frame):
         )
         self.combo_redimensionar_imagem.pack(side="left", padx=5)
         
+        # Redução rápida (decodificação de JPEGs em escala reduzida)
+        self.reducao_rapida_imagem = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            self.frame_opcoes_imagem,
+            text="Redução rápida ao redimensionar (fotos grandes)",
+            variable=self.reducao_rapida_imagem
+        ).pack(fill="x", padx=15, pady=5)
+        
         # --- Seção 4: Diretório de saída ---
         frame_saida = ttk.LabelFrame(frame_controles, text="Saída")
         frame_saida.pack(fill="x", pady=5)
@@ -637,66 +662,162 @@ class TelaConverter(ttk.Frame):
             elif tipo == "vídeo":
                 opcoes["resolucao"] = self.resolucao_video.get()
                 opcoes["fps"] = self.fps_video.get()
+                opcoes["recodificar"] = self.recodificar_video.get()
             elif tipo == "imagem":
                 opcoes["qualidade"] = self.qualidade_imagem.get()
                 opcoes["redimensionar"] = self.redimensionar_imagem.get()
+                opcoes["reducao_rapida"] = self.reducao_rapida_imagem.get()
+        
+        # Oferece ignorar os arquivos já convertidos com as mesmas opções
+        diario = self.obter_diario()
+        indices = [idx for idx, tarefa in self.tarefas_conversao.items() if not tarefa["cancelado"]]
+        ignorados = self.ignorar_concluidos(diario, indices, formato, opcoes)
+        
+        # Submete as conversões ao agendador (apenas as que couberem nos
+        # limites de cada fila são executadas ao mesmo tempo)
+        for idx in indices:
+            if idx in ignorados:
+                continue
+            arquivo = self.tarefas_conversao[idx]["arquivo"]
+            diario.registrar(
+                arquivo,
+                self.caminho_saida(arquivo, formato),
+                "converter",
+                {"formato": formato, "opcoes": opcoes}
+            )
+            self.tarefas_conversao[idx]["execucao"] = self.agendador.submeter(
+                self.conversor.fila_execucao(arquivo),
+                self.executar_conversao,
+                idx,
+                arquivo,
+                formato,
+                opcoes,
+                diario
+            )
+    
+    def obter_diario(self):
+        """
+        Retorna o diário de lote do diretório de saída atual
         
-        # Inicia as threads de conversão
-        for idx, tarefa in self.tarefas_conversao.items():
-            if not tarefa["cancelado"]:
-                thread = Thread(
-                    target=self.executar_conversao,
-                    args=(idx, tarefa["arquivo"], formato, opcoes),
-                    daemon=True
-                )
-                thread.start()
+        Returns:
+            DiarioLote: Diário que registra o estado de cada arquivo
+        """
+        if self.diretorio_saida not in self.diarios:
+            self.diarios[self.diretorio_saida] = DiarioLote(self.diretorio_saida)
+        return self.diarios[self.diretorio_saida]
     
-    def executar_conversao(self, idx, arquivo, formato, opcoes):
+    def caminho_saida(self, arquivo, formato):
         """
-        Executa a conversão de um arquivo em uma thread separada
+        Retorna o caminho do arquivo convertido
+        
+        Args:
+            arquivo (str): Caminho completo do arquivo
+            formato (str): Formato de saída
+            
+        Returns:
+            str: Caminho do arquivo de saída
+        """
+        nome_base, _ = os.path.splitext(os.path.basename(arquivo))
+        return os.path.join(self.diretorio_saida, f"{nome_base}.{formato}")
+    
+    def ignorar_concluidos(self, diario, indices, formato, opcoes):
+        """
+        Pergunta se os arquivos já concluídos em uma execução anterior
+        (mesma entrada e opções) devem ser ignorados
+        
+        Args:
+            diario (DiarioLote): Diário do diretório de saída
+            indices (list): Índices dos arquivos que serão convertidos
+            formato (str): Formato de saída
+            opcoes (dict): Opções de conversão
+            
+        Returns:
+            set: Índices dos arquivos ignorados
+        """
+        # Na extração o contêiner é escolhido por arquivo, então qualquer
+        # formato de áudio pode ter sido usado
+        if formato == "auto":
+            formatos = self.conversor.formatos_extracao_audio[1:]
+        else:
+            formatos = [formato]
+        
+        parametros = {"formato": formato, "opcoes": opcoes}
+        concluidos = set()
+        for idx in indices:
+            arquivo = self.tarefas_conversao[idx]["arquivo"]
+            for formato_saida in formatos:
+                if diario.concluido(arquivo, self.caminho_saida(arquivo, formato_saida), "converter", parametros):
+                    concluidos.add(idx)
+                    break
+        
+        if not concluidos or not messagebox.askyesno(
+            "Retomar Conversão",
+            f"{len(concluidos)} arquivo(s) já foram convertidos com as mesmas opções "
+            "neste diretório de saída.\n\nDeseja ignorá-los?"
+        ):
+            return set()
+        
+        # Marca os arquivos ignorados como concluídos
+        for idx in concluidos:
+            self.tarefas_conversao[idx]["status"].config(text="Concluído")
+            self.tarefas_conversao[idx]["progresso"]["value"] = 100
+            self.tarefas_conversao[idx]["botao_cancelar"].config(state="disabled")
+        
+        return concluidos
+    
+    def executar_conversao(self, idx, arquivo, formato, opcoes, diario):
+        """
+        Executa a conversão de um arquivo em um trabalhador do agendador
         
         Args:
             idx (int): Índice do arquivo na lista
             arquivo (str): Caminho completo do arquivo
             formato (str): Formato de saída
             opcoes (dict): Opções avançadas de conversão
+            diario (DiarioLote): Diário do lote
         """
+        arquivo_saida = None
         try:
             # Atualiza o status
             self.queue.put(("status", idx, "Convertendo"))
             
-            # Nome do arquivo de saída
-            nome_arquivo = os.path.basename(arquivo)
-            nome_base, _ = os.path.splitext(nome_arquivo)
-            arquivo_saida = os.path.join(
-                self.diretorio_saida, 
-                f"{nome_base}.{formato}"
-            )
+            # Formato do áudio extraído escolhido a partir do codec original
+            # (só agora se conhece o nome da saída registrada no diário)
+            if formato == "auto":
+                formato_arquivo = self.conversor.formato_extracao_audio(arquivo, opcoes)
+                arquivo_saida = self.caminho_saida(arquivo, formato_arquivo)
+                diario.registrar(arquivo, arquivo_saida, "converter", {"formato": formato, "opcoes": opcoes})
+                formato = formato_arquivo
+            else:
+                arquivo_saida = self.caminho_saida(arquivo, formato)
+            diario.marcar(arquivo_saida, ESTADO_EXECUTANDO)
             
             # Callback para atualização do progresso
             def atualizar_progresso(progresso):
                 self.queue.put(("progresso", idx, progresso))
             
-            # Executa a conversão
+            # Executa a conversão (a saída só aparece quando estiver completa)
             resultado = self.conversor.converter_arquivo(
                 arquivo, 
                 arquivo_saida, 
                 formato,
                 opcoes,
-                atualizar_progresso
+                atualizar_progresso,
+                tarefa=tarefa_atual()
             )
             
             # Verifica se foi cancelado durante a execução
-            if self.tarefas_conversao[idx]["cancelado"]:
+            if self.tarefas_conversao[idx]["cancelado"] or not resultado:
+                diario.marcar(arquivo_saida, ESTADO_CANCELADO)
                 self.queue.put(("status", idx, "Cancelado"))
-                # Remove o arquivo parcialmente convertido
-                if os.path.exists(arquivo_saida):
-                    os.remove(arquivo_saida)
             else:
+                diario.marcar(arquivo_saida, ESTADO_CONCLUIDO)
                 self.queue.put(("status", idx, "Concluído"))
                 self.queue.put(("progresso", idx, 100))
         
         except Exception as e:
+            if arquivo_saida is not None:
+                diario.marcar(arquivo_saida, ESTADO_ERRO, str(e))
             self.queue.put(("status", idx, "Erro"))
             self.queue.put(("erro", idx, str(e)))
     
@@ -745,28 +866,41 @@ class TelaConverter(ttk.Frame):
             else:
                 tarefa["status"].config(text="Ignorado")
         
-        # Formato de áudio padrão para extração
-        formato = "mp3"
-        
-        # Opções de áudio
-        opcoes = {
-            "bitrate": self.bitrate_audio.get() if self.var_opcoes_avancadas.get() else "192k",
-            "canais": self.canais_audio.get() if self.var_opcoes_avancadas.get() else "2",
-            "extracao_audio": True
-        }
+        # O formato é escolhido por arquivo: o áudio é copiado para um
+        # contêiner compatível sempre que possível
+        formato = "auto"
         
-        # Inicia as threads de extração
-        for idx, tarefa in self.tarefas_conversao.items():
-            arquivo = tarefa["arquivo"]
-            _, extensao = os.path.splitext(arquivo)
-            
-            if self.extensao_para_tipo.get(extensao.lower()) == "vídeo" and not tarefa["cancelado"]:
-                thread = Thread(
-                    target=self.executar_conversao,
-                    args=(idx, arquivo, formato, opcoes),
-                    daemon=True
-                )
-                thread.start()
+        # Opções de áudio (taxa de bits e canais apenas se pedidos, pois
+        # obrigam a recodificar o áudio)
+        opcoes = {"extracao_audio": True}
+        if self.var_opcoes_avancadas.get():
+            opcoes["bitrate"] = self.bitrate_audio.get()
+            opcoes["canais"] = self.canais_audio.get()
+        
+        # Oferece ignorar os áudios já extraídos com as mesmas opções
+        diario = self.obter_diario()
+        indices = [
+            idx for idx, tarefa in self.tarefas_conversao.items()
+            if self.extensao_para_tipo.get(os.path.splitext(tarefa["arquivo"])[1].lower()) == "vídeo"
+            and not tarefa["cancelado"]
+        ]
+        ignorados = self.ignorar_concluidos(diario, indices, formato, opcoes)
+        
+        # Submete as extrações ao agendador (o registro no diário é feito
+        # quando o formato de cada arquivo é escolhido)
+        for idx in indices:
+            if idx in ignorados:
+                continue
+            arquivo = self.tarefas_conversao[idx]["arquivo"]
+            self.tarefas_conversao[idx]["execucao"] = self.agendador.submeter(
+                self.conversor.fila_execucao(arquivo),
+                self.executar_conversao,
+                idx,
+                arquivo,
+                formato,
+                opcoes,
+                diario
+            )
     
     def cancelar_conversao(self, idx):
         """
@@ -779,6 +913,21 @@ class TelaConverter(ttk.Frame):
         self.tarefas_conversao[idx]["cancelado"] = True
         self.tarefas_conversao[idx]["status"].config(text="Cancelando...")
         self.tarefas_conversao[idx]["botao_cancelar"].config(state="disabled")
+        
+        # Retira a tarefa da fila ou encerra o processo em execução
+        self._cancelar_execucao(idx)
+    
+    def _cancelar_execucao(self, idx):
+        """
+        Cancela a tarefa do agendador associada a um arquivo
+        
+        Args:
+            idx (int): Índice do arquivo na lista
+        """
+        execucao = self.tarefas_conversao[idx].get("execucao")
+        if execucao is not None and execucao.cancelar():
+            # A tarefa ainda estava na fila e não chegará a ser executada
+            self.queue.put(("status", idx, "Cancelado"))
     
     def parar_conversao(self):
         """
@@ -790,6 +939,7 @@ class TelaConverter(ttk.Frame):
                 tarefa["cancelado"] = True
                 tarefa["status"].config(text="Cancelando...")
                 tarefa["botao_cancelar"].config(state="disabled")
+                self._cancelar_execucao(idx)
         
         # Restaura os botões para o estado inicial
         self.btn_converter.config(text="Converter", command=self.iniciar_conversao)
@@ -3,18 +3,26 @@
 
 """
 Arquivo principal que inicia a aplicação de conversão e compressão de arquivos
+
+Sem argumentos, abre a interface gráfica. Com argumentos (por exemplo
+``python main.py convert -f mp4 videos/``), executa a linha de comando.
 """
 
 import os
 import sys
 
-from interface.app import Application
-
 
 def main():
     """
     Função principal que inicializa a aplicação
     """
+    # Modo de linha de comando (não depende do Tkinter nem de X11)
+    if len(sys.argv) > 1:
+        from interface.cli import main as main_cli
+        sys.exit(main_cli())
+
+    from interface.app import Application
+
     app = Application()
     app.mainloop()
 
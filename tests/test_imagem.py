@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Testes dos auxiliares de imagem (utils/imagem.py)
+
+Execute a partir da raiz do projeto com ``python -m unittest discover tests``.
+"""
+
+import os
+import random
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from utils.imagem import OrcamentoMemoria, _buscar_qualidade, _codificar_em_memoria
+
+# Limite padrão da Pillow, guardado antes de qualquer teste alterá-lo
+LIMITE_PIXELS_PILLOW = Image.MAX_IMAGE_PIXELS
+
+
+def _imagem_ruidosa(largura=2000, altura=1500, semente=0):
+    """
+    Cria uma imagem com ruído, cujo tamanho em JPEG varia bem com a qualidade
+
+    Args:
+        largura (int): Largura da imagem
+        altura (int): Altura da imagem
+        semente (int): Semente do gerador pseudoaleatório
+
+    Returns:
+        PIL.Image.Image: Imagem RGB
+    """
+    aleatorio = random.Random(semente)
+    pequena = (largura // 4, altura // 4)
+    ruido = Image.frombytes("RGB", pequena, aleatorio.randbytes(pequena[0] * pequena[1] * 3))
+    return ruido.resize((largura, altura), Image.BILINEAR)
+
+
+class TestCodificacaoParalela(unittest.TestCase):
+    """
+    As codificações simultâneas da mesma imagem não podem interferir entre si
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.imagem = _imagem_ruidosa()
+
+    def test_codificacoes_simultaneas_respeitam_a_qualidade(self):
+        qualidades = list(range(10, 95, 5))
+        esperados = {
+            qualidade: _codificar_em_memoria(self.imagem, "JPEG", qualidade, {})[1]
+            for qualidade in qualidades
+        }
+
+        with ThreadPoolExecutor(8) as executor:
+            resultados = list(executor.map(
+                lambda qualidade: _codificar_em_memoria(self.imagem, "JPEG", qualidade, {}),
+                qualidades * 4
+            ))
+
+        for qualidade, dados in resultados:
+            self.assertEqual(dados, esperados[qualidade], f"qualidade {qualidade}")
+
+    def test_busca_paralela_igual_a_serial(self):
+        max_bytes = len(_codificar_em_memoria(self.imagem, "JPEG", 60, {})[1]) + 1
+
+        with ThreadPoolExecutor(1) as executor:
+            serial = _buscar_qualidade(self.imagem, "JPEG", max_bytes, 95, {}, executor, None)
+        with ThreadPoolExecutor(4) as executor:
+            paralela = _buscar_qualidade(self.imagem, "JPEG", max_bytes, 95, {}, executor, None)
+
+        self.assertIsNotNone(serial[0])
+        self.assertLessEqual(len(serial[0]), max_bytes)
+        self.assertEqual(paralela[0], serial[0])
+        self.assertEqual(paralela[1], serial[1])
+
+
+class TestLimitePixels(unittest.TestCase):
+    """
+    O limite de pixels da Pillow continua valendo para as imagens orçadas
+    """
+
+    def test_importacao_mantem_o_limite(self):
+        self.assertIsNotNone(LIMITE_PIXELS_PILLOW)
+        self.assertEqual(Image.MAX_IMAGE_PIXELS, LIMITE_PIXELS_PILLOW)
+
+    def test_planejar_recusa_imagem_acima_do_limite(self):
+        with tempfile.TemporaryDirectory() as diretorio:
+            arquivo = os.path.join(diretorio, "grande.png")
+            Image.new("RGB", (400, 300)).save(arquivo)
+
+            limite = Image.MAX_IMAGE_PIXELS
+            self.addCleanup(setattr, Image, "MAX_IMAGE_PIXELS", limite)
+            Image.MAX_IMAGE_PIXELS = 400 * 300 // 4
+
+            with self.assertRaises(MemoryError):
+                OrcamentoMemoria(trabalhadores=1).planejar(arquivo)
+
+
+if __name__ == "__main__":
+    unittest.main()
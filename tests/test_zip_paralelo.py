@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Testes da compressão de membros de ZIP em processos paralelos (utils/zip_paralelo.py)
+
+Execute a partir da raiz do projeto com ``python -m unittest discover tests``.
+"""
+
+import os
+import random
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+from utils import zip_paralelo
+from utils.zip_paralelo import EnumeracaoMembros, comprimir_membros, gravacao_paralela_suportada
+
+
+def _criar_arvore(diretorio):
+    """
+    Cria uma árvore com membros compressíveis, aleatórios e vazios
+
+    Args:
+        diretorio (str): Diretório que recebe os arquivos
+
+    Returns:
+        dict: Conteúdo de cada arquivo, pelo nome relativo
+    """
+    aleatorio = random.Random(0)
+    conteudos = {
+        "texto.txt": b"linha repetida do arquivo de texto\n" * 20000,
+        "vazio.txt": b"",
+        os.path.join("sub", "foto.jpg"): aleatorio.randbytes(200 * 1024),
+        os.path.join("sub", "dados.bin"): bytes(range(256)) * 4096,
+    }
+    for nome, conteudo in conteudos.items():
+        caminho = os.path.join(diretorio, nome)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, "wb") as arquivo:
+            arquivo.write(conteudo)
+    return conteudos
+
+
+class TestComprimirMembros(unittest.TestCase):
+    """
+    O ZIP gravado com os membros comprimidos em paralelo deve ser válido
+    """
+
+    def setUp(self):
+        temporario = tempfile.TemporaryDirectory()
+        self.addCleanup(temporario.cleanup)
+        self.raiz = temporario.name
+        self.origem = os.path.join(self.raiz, "origem")
+        self.conteudos = _criar_arvore(self.origem)
+        self.saida = os.path.join(self.raiz, "saida.zip")
+
+    def test_zip_reaberto_passa_no_testzip(self):
+        # Um limite baixo manda os membros maiores para arquivos temporários
+        with mock.patch.object(zip_paralelo, "LIMITE_MEMBRO_MEMORIA", 64 * 1024):
+            with zipfile.ZipFile(self.saida, "w", zipfile.ZIP_DEFLATED) as zipf:
+                if not gravacao_paralela_suportada(zipf):
+                    self.skipTest("gravação direta não conferida nesta versão do Python")
+
+                enumeracao = EnumeracaoMembros(self.origem, prefixo="")
+                try:
+                    self.assertTrue(comprimir_membros(
+                        zipf, enumeracao, self.raiz, processos=2, extensoes_amostradas={".jpg"}
+                    ))
+                finally:
+                    enumeracao.fechar()
+
+        with zipfile.ZipFile(self.saida) as zipf:
+            self.assertIsNone(zipf.testzip())
+            self.assertEqual(
+                sorted(zipf.namelist()),
+                sorted(nome.replace(os.sep, "/") for nome in self.conteudos)
+            )
+            for nome, conteudo in self.conteudos.items():
+                self.assertEqual(zipf.read(nome.replace(os.sep, "/")), conteudo)
+
+            metodos = {info.filename: info.compress_type for info in zipf.infolist()}
+            self.assertEqual(metodos["sub/foto.jpg"], zipfile.ZIP_STORED)
+            self.assertEqual(metodos["texto.txt"], zipfile.ZIP_DEFLATED)
+
+        self.assertEqual(
+            sorted(os.listdir(self.raiz)), ["origem", "saida.zip"],
+            "arquivos temporários dos membros não foram removidos"
+        )
+
+    def test_versao_nao_conferida_desativa_a_gravacao_direta(self):
+        with zipfile.ZipFile(self.saida, "w", zipfile.ZIP_DEFLATED) as zipf:
+            with mock.patch.object(zip_paralelo, "VERSOES_GRAVACAO_DIRETA", ((3, 0), (3, 0))):
+                self.assertFalse(gravacao_paralela_suportada(zipf))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,4 +5,8 @@
 Pacote que contém as classes e funções utilitárias da aplicação
 """
 
-__all__ = ['compressor', 'conversor']
\ No newline at end of file
+__all__ = [
+    'agendador', 'cache_saida', 'compressor', 'conversor', 'diario',
+    'ffmpeg', 'imagem', 'metadados', 'metricas', 'processos_imagem', 'segmentos', 'vigia',
+    'zip_paralelo'
+]
\ No newline at end of file
@@ -0,0 +1,534 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Módulo que contém o agendador de tarefas compartilhado pelas telas e pela
+linha de comando
+"""
+
+import os
+import heapq
+import itertools
+import threading
+import subprocess
+from contextlib import contextmanager
+
+# Filas (lanes) de execução disponíveis
+FILA_CPU = "cpu"          # Codificações pesadas do FFmpeg
+FILA_IMAGEM = "imagem"    # Tarefas de imagem com PIL
+FILA_IO = "io"            # Cópias e arquivos ZIP
+
+# Tempo (em segundos) que um processo tem para encerrar antes de ser morto
+TEMPO_ENCERRAMENTO = 5
+
+# Estados possíveis de uma tarefa
+ESTADO_NA_FILA = "na_fila"
+ESTADO_EXECUTANDO = "executando"
+ESTADO_CONCLUIDO = "concluido"
+ESTADO_ERRO = "erro"
+ESTADO_CANCELADO = "cancelado"
+
+# Políticas de divisão das threads entre as codificações simultâneas
+POLITICA_JUSTA = "justo"              # Partes iguais para as tarefas esperadas
+POLITICA_MAIS_ANTIGA = "mais_antigo"  # As mais antigas ficam com a maior parte
+POLITICAS_THREADS = (POLITICA_JUSTA, POLITICA_MAIS_ANTIGA)
+
+
+class Tarefa:
+    """
+    Representa uma submissão feita ao agendador
+
+    Cada tarefa tem seu próprio sinal de cancelamento e guarda uma referência
+    ao subprocesso que estiver executando, de modo que cancelar uma tarefa
+    não interfere nas demais. Também pode ser criada avulsa (sem função)
+    para servir apenas como sinal de cancelamento de uma chamada direta ao
+    Conversor ou ao Compressor.
+    """
+
+    def __init__(self, fila=None, funcao=None, args=(), kwargs=None):
+        """
+        Inicializa a tarefa
+
+        Args:
+            fila (str): Fila onde a tarefa será executada
+            funcao (function): Função executada pela tarefa
+            args (tuple): Argumentos posicionais da função
+            kwargs (dict): Argumentos nomeados da função
+        """
+        self.fila = fila
+        self.funcao = funcao
+        self.args = args
+        self.kwargs = kwargs or {}
+
+        # Tarefas avulsas já nascem em execução
+        self.estado = ESTADO_NA_FILA if funcao is not None else ESTADO_EXECUTANDO
+        self.resultado = None
+        self.erro = None
+
+        # Sinal de cancelamento exclusivo desta tarefa
+        self.cancelado = threading.Event()
+
+        # Subprocesso (FFmpeg) em execução pela tarefa
+        self.processo = None
+
+        # Últimas estatísticas informadas pelo FFmpeg (tempo, fps, velocidade)
+        self.estatisticas = {}
+
+        # Resultado informado pelo motor ao final (ex.: tamanho obtido x alvo)
+        self.relatorio = {}
+
+        # Threads que o FFmpeg pode usar (None deixa o FFmpeg decidir)
+        self.threads = None
+
+        # Tarefas criadas por esta (ex.: segmentos de um vídeo), canceladas
+        # junto com ela
+        self._subtarefas = []
+
+        # Protege as transições de estado entre a fila e o cancelamento
+        self._lock = threading.Lock()
+
+        # Sinaliza o término da tarefa (com sucesso, erro ou cancelamento)
+        self._terminada = threading.Event()
+
+    def cancelar(self):
+        """
+        Cancela a tarefa
+
+        Se a tarefa ainda está na fila, ela é retirada sem ser executada. Se
+        já está em execução, o sinal de cancelamento é ativado e o subprocesso
+        associado é encerrado imediatamente (e morto caso não termine). As
+        subtarefas vinculadas também são canceladas.
+
+        Returns:
+            bool: True se a tarefa não chegará a ser executada
+        """
+        with self._lock:
+            self.cancelado.set()
+            subtarefas = list(self._subtarefas)
+            if self.estado == ESTADO_NA_FILA:
+                self.estado = ESTADO_CANCELADO
+                self._terminada.set()
+                processo = None
+            else:
+                processo = self.processo
+
+        for subtarefa in subtarefas:
+            subtarefa.cancelar()
+
+        if processo is not None:
+            # Encerra em segundo plano para não bloquear quem cancelou
+            threading.Thread(
+                target=encerrar_processo,
+                args=(processo,),
+                daemon=True
+            ).start()
+
+        return self.estado == ESTADO_CANCELADO
+
+    def vincular(self, subtarefa):
+        """
+        Vincula uma subtarefa, que passa a ser cancelada junto com esta
+
+        Args:
+            subtarefa (Tarefa): Tarefa criada durante a execução desta
+        """
+        with self._lock:
+            self._subtarefas.append(subtarefa)
+            cancelada = self.cancelado.is_set()
+
+        if cancelada:
+            subtarefa.cancelar()
+
+    def registrar_processo(self, processo):
+        """
+        Associa um subprocesso à tarefa
+
+        Se a tarefa já tiver sido cancelada, o processo é encerrado na hora.
+
+        Args:
+            processo (subprocess.Popen): Processo iniciado pela tarefa
+        """
+        with self._lock:
+            self.processo = processo
+            cancelada = self.cancelado.is_set()
+
+        if cancelada:
+            encerrar_processo(processo)
+
+    def liberar_processo(self):
+        """
+        Remove a associação com o subprocesso após o seu término
+        """
+        with self._lock:
+            self.processo = None
+
+    def concluida(self):
+        """
+        Indica se a tarefa já terminou
+
+        Returns:
+            bool: True se a tarefa terminou
+        """
+        return self._terminada.is_set()
+
+    def aguardar(self, timeout=None):
+        """
+        Aguarda o término da tarefa
+
+        Args:
+            timeout (float): Tempo máximo de espera em segundos
+
+        Returns:
+            bool: True se a tarefa terminou dentro do tempo
+        """
+        return self._terminada.wait(timeout)
+
+    def _iniciar(self):
+        """
+        Marca a tarefa como em execução, se ela não tiver sido cancelada
+
+        Returns:
+            bool: True se a tarefa deve ser executada
+        """
+        with self._lock:
+            if self.estado != ESTADO_NA_FILA:
+                return False
+            self.estado = ESTADO_EXECUTANDO
+            return True
+
+    def _executar(self):
+        """
+        Executa a função da tarefa, registrando o resultado ou o erro
+        """
+        try:
+            self.resultado = self.funcao(*self.args, **self.kwargs)
+            self.estado = ESTADO_CONCLUIDO
+        except Exception as e:
+            self.erro = e
+            self.estado = ESTADO_ERRO
+        finally:
+            if self.cancelado.is_set():
+                self.estado = ESTADO_CANCELADO
+            self._terminada.set()
+
+
+def encerrar_processo(processo, timeout=TEMPO_ENCERRAMENTO):
+    """
+    Encerra um subprocesso, matando-o se ele não terminar a tempo
+
+    Args:
+        processo (subprocess.Popen): Processo a ser encerrado
+        timeout (float): Tempo de espera após o pedido de término
+    """
+    if processo.poll() is not None:
+        return
+
+    try:
+        processo.terminate()
+        processo.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        processo.kill()
+        processo.wait()
+    except OSError:
+        # O processo terminou entre a verificação e o sinal
+        pass
+
+
+class RegistroTarefas:
+    """
+    Conjunto das tarefas em andamento em um Conversor ou Compressor
+    """
+
+    def __init__(self):
+        """
+        Inicializa o registro vazio
+        """
+        self._tarefas = set()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acompanhar(self, tarefa):
+        """
+        Mantém a tarefa no registro enquanto o bloco estiver em execução
+
+        Args:
+            tarefa (Tarefa): Tarefa acompanhada
+        """
+        with self._lock:
+            self._tarefas.add(tarefa)
+        try:
+            yield tarefa
+        finally:
+            with self._lock:
+                self._tarefas.discard(tarefa)
+
+    def cancelar_todas(self):
+        """
+        Cancela todas as tarefas registradas
+        """
+        with self._lock:
+            tarefas = list(self._tarefas)
+        for tarefa in tarefas:
+            tarefa.cancelar()
+
+
+class Agendador:
+    """
+    Agendador com limite de concorrência por fila
+
+    Cada fila possui um número máximo de tarefas simultâneas. As tarefas
+    excedentes aguardam na fila e só começam quando um espaço é liberado.
+
+    As tarefas da fila de CPU recebem uma parte do orçamento de threads
+    (``Tarefa.threads``) ao começar, evitando que várias codificações
+    simultâneas usem cada uma todos os núcleos. Como o FFmpeg não altera o
+    número de threads de um processo em andamento, a divisão é refeita a cada
+    tarefa que começa, considerando as que estão em execução e na fila.
+    """
+
+    def __init__(self, limites=None, threads_cpu=None, politica_threads=POLITICA_JUSTA):
+        """
+        Inicializa o agendador
+
+        Args:
+            limites (dict): Número máximo de tarefas simultâneas por fila.
+                Filas não informadas usam a quantidade de núcleos da máquina.
+            threads_cpu (int): Total de threads divididas entre as tarefas da
+                fila de CPU (padrão: núcleos da máquina)
+            politica_threads (str): POLITICA_JUSTA ou POLITICA_MAIS_ANTIGA
+        """
+        nucleos = os.cpu_count() or 1
+
+        if politica_threads not in POLITICAS_THREADS:
+            raise ValueError(f"Política de threads desconhecida: {politica_threads}")
+        self.threads_cpu = max(1, int(threads_cpu or nucleos))
+        self.politica_threads = politica_threads
+
+        self.limites = {
+            FILA_CPU: nucleos,
+            FILA_IMAGEM: nucleos,
+            FILA_IO: nucleos
+        }
+        if limites:
+            for fila, limite in limites.items():
+                self.limites[fila] = max(1, int(limite))
+
+        self._condicao = threading.Condition()
+        self._pendentes = {fila: [] for fila in self.limites}
+        self._executando = {fila: 0 for fila in self.limites}
+        self._trabalhadores = {fila: 0 for fila in self.limites}
+        self._sequencia = itertools.count()
+
+        # Threads reservadas por tarefa em execução na fila de CPU (em ordem
+        # de início, da mais antiga para a mais nova)
+        self._threads_reservadas = {}
+
+    def submeter(self, fila, funcao, *args, prioridade=0, **kwargs):
+        """
+        Submete uma função para execução em uma fila
+
+        Args:
+            fila (str): Fila de execução (FILA_CPU, FILA_IMAGEM ou FILA_IO)
+            funcao (function): Função a ser executada
+            *args: Argumentos posicionais da função
+            prioridade (int): Tarefas com prioridade maior saem da fila antes
+            **kwargs: Argumentos nomeados da função
+
+        Returns:
+            Tarefa: Objeto que representa a submissão
+        """
+        if fila not in self.limites:
+            raise ValueError(f"Fila de execução desconhecida: {fila}")
+
+        tarefa = Tarefa(fila, funcao, args, kwargs)
+
+        with self._condicao:
+            heapq.heappush(
+                self._pendentes[fila],
+                (-prioridade, next(self._sequencia), tarefa)
+            )
+
+            # Cria um novo trabalhador se a fila ainda não atingiu o limite
+            if self._trabalhadores[fila] < self.limites[fila]:
+                self._trabalhadores[fila] += 1
+                threading.Thread(
+                    target=self._trabalhador,
+                    args=(fila,),
+                    name=f"agendador-{fila}",
+                    daemon=True
+                ).start()
+
+        return tarefa
+
+    def _proxima_tarefa(self, fila):
+        """
+        Retira a próxima tarefa não cancelada da fila
+
+        Args:
+            fila (str): Fila de execução
+
+        Returns:
+            Tarefa: Próxima tarefa (já marcada como em execução) ou None se a
+                fila estiver vazia
+        """
+        pendentes = self._pendentes[fila]
+        while pendentes:
+            _, _, tarefa = heapq.heappop(pendentes)
+            if tarefa._iniciar():
+                return tarefa
+        return None
+
+    def _trabalhador(self, fila):
+        """
+        Laço de um trabalhador: executa tarefas da fila enquanto houver
+
+        Args:
+            fila (str): Fila atendida pelo trabalhador
+        """
+        while True:
+            with self._condicao:
+                tarefa = self._proxima_tarefa(fila)
+                if tarefa is None:
+                    # Sem trabalho pendente: encerra o trabalhador
+                    self._trabalhadores[fila] -= 1
+                    return
+                self._executando[fila] += 1
+
+                # Reserva a parte do orçamento de threads da tarefa
+                if fila == FILA_CPU:
+                    tarefa.threads = self._reservar_threads(tarefa)
+
+            _contexto.tarefa = tarefa
+            try:
+                tarefa._executar()
+            finally:
+                _contexto.tarefa = None
+                with self._condicao:
+                    self._executando[fila] -= 1
+                    self._threads_reservadas.pop(tarefa, None)
+                    self._condicao.notify_all()
+
+    def _reservar_threads(self, tarefa):
+        """
+        Calcula e reserva as threads de uma tarefa da fila de CPU
+
+        Deve ser chamado com a condição do agendador adquirida.
+
+        Args:
+            tarefa (Tarefa): Tarefa que está começando
+
+        Returns:
+            int: Número de threads da tarefa (ao menos 1)
+        """
+        ativas = len(self._threads_reservadas)
+        na_fila = sum(
+            1 for _, _, pendente in self._pendentes[FILA_CPU]
+            if pendente.estado == ESTADO_NA_FILA
+        )
+
+        # Tarefas que devem rodar ao mesmo tempo (incluindo a nova)
+        esperadas = min(self.limites[FILA_CPU], ativas + 1 + na_fila)
+
+        if self.politica_threads == POLITICA_MAIS_ANTIGA:
+            # Fica com as threads livres, deixando uma para cada tarefa que
+            # ainda deve começar
+            livres = self.threads_cpu - sum(self._threads_reservadas.values())
+            threads = livres - (esperadas - ativas - 1)
+        else:
+            threads = self.threads_cpu // esperadas
+
+        threads = max(1, threads)
+        self._threads_reservadas[tarefa] = threads
+        return threads
+
+    def executar_ou_aguardar(self, tarefa):
+        """
+        Executa na thread atual uma tarefa que ainda está na fila, ou aguarda
+        o seu término se um trabalhador já a iniciou
+
+        Permite que uma tarefa espere subtarefas da mesma fila sem risco de
+        travar o agendador quando todos os trabalhadores estão ocupados.
+
+        Args:
+            tarefa (Tarefa): Tarefa submetida a este agendador
+        """
+        if not tarefa._iniciar():
+            tarefa.aguardar()
+            return
+
+        # Executa como se fosse um trabalhador, com as threads de quem espera
+        anterior = tarefa_atual()
+        if tarefa.threads is None and anterior is not None:
+            tarefa.threads = anterior.threads
+        _contexto.tarefa = tarefa
+        try:
+            tarefa._executar()
+        finally:
+            _contexto.tarefa = anterior
+
+    def em_execucao(self, fila=None):
+        """
+        Retorna o número de tarefas em execução
+
+        Args:
+            fila (str): Fila consultada (todas se não informada)
+
+        Returns:
+            int: Quantidade de tarefas em execução
+        """
+        with self._condicao:
+            if fila is not None:
+                return self._executando[fila]
+            return sum(self._executando.values())
+
+    def pendentes(self, fila=None):
+        """
+        Retorna o número de tarefas aguardando na fila
+
+        Args:
+            fila (str): Fila consultada (todas se não informada)
+
+        Returns:
+            int: Quantidade de tarefas aguardando
+        """
+        with self._condicao:
+            filas = [fila] if fila is not None else list(self._pendentes)
+            return sum(
+                1
+                for nome in filas
+                for _, _, tarefa in self._pendentes[nome]
+                if tarefa.estado == ESTADO_NA_FILA
+            )
+
+
+# Tarefa em execução em cada trabalhador
+_contexto = threading.local()
+
+
+def tarefa_atual():
+    """
+    Retorna a tarefa que está sendo executada pela thread atual
+
+    Returns:
+        Tarefa: Tarefa em execução ou None fora de um trabalhador do agendador
+    """
+    return getattr(_contexto, "tarefa", None)
+
+
+# Instância compartilhada entre as telas da aplicação
+_agendador_padrao = None
+_agendador_lock = threading.Lock()
+
+
+def obter_agendador():
+    """
+    Retorna o agendador compartilhado da aplicação, criando-o se necessário
+
+    Returns:
+        Agendador: Agendador compartilhado
+    """
+    global _agendador_padrao
+    with _agendador_lock:
+        if _agendador_padrao is None:
+            _agendador_padrao = Agendador()
+        return _agendador_padrao
@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Módulo que contém o cache de resultados de conversão e compressão
+
+Os resultados são identificados pelo conteúdo do arquivo de entrada (SHA-256)
+e por uma forma canônica da operação, do formato, das opções e das versões do
+FFmpeg e do Pillow. Reenviar o mesmo arquivo com as mesmas opções reaproveita
+o resultado anterior por reflink ou, sem suporte do sistema de arquivos,
+por cópia. Links físicos não são usados: a saída e o objeto guardado
+compartilhariam o conteúdo, e editar uma corromperia a outra.
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import hashlib
+import threading
+
+import PIL
+
+from utils.ffmpeg import obter_capacidades
+
+try:
+    import fcntl
+except ImportError:
+    # Sem fcntl (Windows) não há reflink
+    fcntl = None
+
+# Limite padrão do cache em bytes (10 GiB)
+LIMITE_PADRAO = 10 * 1024 ** 3
+
+# Tamanho dos blocos lidos ao calcular o hash dos arquivos
+TAMANHO_BLOCO = 1024 * 1024
+
+# ioctl do Linux que clona um arquivo compartilhando os blocos (Btrfs, XFS)
+FICLONE = 0x40049409
+
+
+def diretorio_cache_padrao():
+    """
+    Retorna o diretório padrão do cache de resultados
+
+    Returns:
+        str: Caminho do diretório
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "conversor_arquivos", "saidas")
+
+
+def _clonar(origem, destino):
+    """
+    Cria ``destino`` com o conteúdo de ``origem`` sem copiar os dados
+
+    Usa um reflink (cópia sob demanda): os blocos só são duplicados quando um
+    dos arquivos é alterado, então um não afeta o outro.
+
+    Args:
+        origem (str): Arquivo existente
+        destino (str): Novo arquivo (não pode existir)
+
+    Returns:
+        bool: True se foi possível evitar a cópia
+    """
+    if fcntl is None:
+        return False
+
+    try:
+        with open(origem, "rb") as f_origem, open(destino, "wb") as f_destino:
+            fcntl.ioctl(f_destino.fileno(), FICLONE, f_origem.fileno())
+        return True
+    except OSError:
+        # Sistema de arquivos sem suporte: remove o arquivo vazio
+        try:
+            os.remove(destino)
+        except OSError:
+            pass
+        return False
+
+
+def materializar(origem, destino):
+    """
+    Coloca uma cópia independente de ``origem`` em ``destino`` de forma atômica
+
+    Args:
+        origem (str): Arquivo existente
+        destino (str): Caminho final (substituído se existir)
+    """
+    temporario = f"{destino}.{uuid.uuid4().hex}.tmp"
+    try:
+        if not _clonar(origem, temporario):
+            shutil.copyfile(origem, temporario)
+        os.replace(temporario, destino)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+
+class CacheSaida:
+    """
+    Cache de resultados endereçado pelo conteúdo, com descarte LRU
+
+    Os arquivos ficam em ``diretorio/objetos`` e o índice (tamanho e último
+    acesso de cada resultado, além dos hashes já calculados) em um banco
+    SQLite no mesmo diretório. Quando o total passa de ``limite_bytes``, os
+    resultados usados há mais tempo são descartados.
+    """
+
+    def __init__(self, diretorio=None, limite_bytes=LIMITE_PADRAO):
+        """
+        Abre (ou cria) o cache
+
+        Args:
+            diretorio (str): Diretório do cache (padrão em ~/.cache)
+            limite_bytes (int): Tamanho máximo do cache em bytes
+        """
+        self.diretorio = diretorio or diretorio_cache_padrao()
+        self.limite_bytes = int(limite_bytes)
+
+        # Contadores de acertos e falhas desde a criação do objeto
+        self.acertos = 0
+        self.falhas = 0
+
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(self.diretorio, "objetos"), exist_ok=True)
+        self._conexao = sqlite3.connect(
+            os.path.join(self.diretorio, "indice.sqlite3"), timeout=30, check_same_thread=False
+        )
+        self._conexao.executescript(
+            "CREATE TABLE IF NOT EXISTS saidas ("
+            " chave TEXT PRIMARY KEY,"
+            " tamanho INTEGER NOT NULL,"
+            " ultimo_acesso REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS saidas_acesso ON saidas (ultimo_acesso);"
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            " caminho TEXT PRIMARY KEY,"
+            " tamanho INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " sha256 TEXT NOT NULL);"
+        )
+        self._conexao.commit()
+
+    def _caminho_objeto(self, chave):
+        """
+        Retorna o caminho do arquivo guardado para uma chave
+
+        Args:
+            chave (str): Chave do resultado
+
+        Returns:
+            str: Caminho do arquivo no cache
+        """
+        return os.path.join(self.diretorio, "objetos", chave[:2], chave)
+
+    def hash_arquivo(self, arquivo):
+        """
+        Calcula o SHA-256 do conteúdo de um arquivo
+
+        O hash fica guardado por (caminho, tamanho, mtime_ns), de modo que um
+        arquivo inalterado não é lido de novo.
+
+        Args:
+            arquivo (str): Caminho do arquivo
+
+        Returns:
+            str: Hash em hexadecimal
+        """
+        caminho = os.path.abspath(arquivo)
+        info = os.stat(caminho)
+
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT sha256 FROM hashes WHERE caminho = ? AND tamanho = ? AND mtime_ns = ?",
+                (caminho, info.st_size, info.st_mtime_ns)
+            ).fetchone()
+        if linha:
+            return linha[0]
+
+        sha256 = hashlib.sha256()
+        with open(caminho, "rb") as f:
+            for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b""):
+                sha256.update(bloco)
+        resultado = sha256.hexdigest()
+
+        with self._lock:
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO hashes (caminho, tamanho, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (caminho, info.st_size, info.st_mtime_ns, resultado)
+            )
+            self._conexao.commit()
+        return resultado
+
+    def chave(self, arquivo_entrada, operacao, formato, opcoes=None):
+        """
+        Calcula a chave de um resultado
+
+        Args:
+            arquivo_entrada (str): Arquivo de entrada
+            operacao (str): Operação ("converter" ou "comprimir")
+            formato (str): Formato de saída ou nível de compressão
+            opcoes (dict): Opções da operação
+
+        Returns:
+            str: Chave (SHA-256 em hexadecimal)
+        """
+        capacidades = obter_capacidades()
+        descricao = {
+            "entrada": self.hash_arquivo(arquivo_entrada),
+            "extensao": os.path.splitext(arquivo_entrada)[1].lower(),
+            "operacao": operacao,
+            "formato": formato,
+            "opcoes": opcoes or {},
+            "ffmpeg": capacidades.versao_ffmpeg,
+            "pillow": PIL.__version__
+        }
+        canonico = json.dumps(descricao, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonico.encode("utf-8")).hexdigest()
+
+    def obter(self, chave, arquivo_saida):
+        """
+        Copia o resultado guardado para o arquivo de saída, se existir
+
+        Args:
+            chave (str): Chave do resultado
+            arquivo_saida (str): Caminho onde o resultado deve ser colocado
+
+        Returns:
+            bool: True se o resultado estava no cache
+        """
+        objeto = self._caminho_objeto(chave)
+
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT tamanho FROM saidas WHERE chave = ?", (chave,)
+            ).fetchone()
+
+        # Um objeto com outro tamanho foi alterado fora do cache: descarta
+        if linha is not None and (not os.path.exists(objeto) or os.path.getsize(objeto) != linha[0]):
+            with self._lock:
+                self._conexao.execute("DELETE FROM saidas WHERE chave = ?", (chave,))
+                self._conexao.commit()
+            linha = None
+
+        if linha is None:
+            with self._lock:
+                self.falhas += 1
+            return False
+
+        materializar(objeto, arquivo_saida)
+
+        with self._lock:
+            self.acertos += 1
+            self._conexao.execute(
+                "UPDATE saidas SET ultimo_acesso = ? WHERE chave = ?", (time.time(), chave)
+            )
+            self._conexao.commit()
+        return True
+
+    def guardar(self, chave, arquivo_saida):
+        """
+        Guarda um resultado no cache e descarta os mais antigos se necessário
+
+        Args:
+            chave (str): Chave do resultado
+            arquivo_saida (str): Arquivo produzido pela operação
+        """
+        tamanho = os.path.getsize(arquivo_saida)
+        if tamanho > self.limite_bytes:
+            return
+
+        objeto = self._caminho_objeto(chave)
+        os.makedirs(os.path.dirname(objeto), exist_ok=True)
+        materializar(arquivo_saida, objeto)
+
+        with self._lock:
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO saidas (chave, tamanho, ultimo_acesso) VALUES (?, ?, ?)",
+                (chave, tamanho, time.time())
+            )
+            self._conexao.commit()
+        self._descartar_excedente()
+
+    def _descartar_excedente(self):
+        """
+        Remove os resultados usados há mais tempo até o cache caber no limite
+        """
+        with self._lock:
+            total = self._conexao.execute(
+                "SELECT COALESCE(SUM(tamanho), 0) FROM saidas"
+            ).fetchone()[0]
+            if total <= self.limite_bytes:
+                return
+
+            descartados = []
+            for chave, tamanho in self._conexao.execute(
+                "SELECT chave, tamanho FROM saidas ORDER BY ultimo_acesso"
+            ).fetchall():
+                if total <= self.limite_bytes:
+                    break
+                descartados.append(chave)
+                total -= tamanho
+
+            self._conexao.executemany(
+                "DELETE FROM saidas WHERE chave = ?", [(chave,) for chave in descartados]
+            )
+            self._conexao.commit()
+
+        for chave in descartados:
+            try:
+                os.remove(self._caminho_objeto(chave))
+            except OSError:
+                pass
+
+    def estatisticas(self):
+        """
+        Retorna os contadores e a ocupação do cache
+
+        Returns:
+            dict: Acertos, falhas, quantidade de resultados e bytes ocupados
+        """
+        with self._lock:
+            quantidade, total = self._conexao.execute(
+                "SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM saidas"
+            ).fetchone()
+            return {
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "resultados": quantidade,
+                "bytes": total,
+                "limite_bytes": self.limite_bytes
+            }
@@ -6,23 +6,79 @@ Módulo que contém a classe responsável pela compressão de arquivos
 """
 
 import os
-import time
+import glob
 import shutil
 import zipfile
-import threading
-from PIL import Image
-import subprocess
 import tempfile
-import json
+from PIL import Image
+
+from utils.agendador import (
+    FILA_CPU, FILA_IMAGEM, FILA_IO, RegistroTarefas, Tarefa, obter_agendador, tarefa_atual
+)
+from utils.ffmpeg import (
+    ENCODERS_CRF, ENCODERS_DUAS_PASSAGENS, argumentos_qualidade_video, argumentos_taxa_video,
+    executar_ffmpeg, medir_qualidade, obter_capacidades
+)
+from utils.diario import caminho_parcial
+from utils.imagem import (
+    FATOR_REDUCAO, FATOR_REDUCAO_RAPIDA, codificar_ate, decodificar, montar_em_faixas,
+    obter_orcamento_memoria, redimensionar, suporta_faixas, tamanho_contido
+)
+from utils.metricas import (
+    ETAPA_CODIFICAR, ETAPA_DECODIFICAR, ETAPA_GRAVAR, ETAPA_REDIMENSIONAR, ETAPA_RENOMEAR,
+    ETAPA_SONDAR, etapa, manipulador, manipulador_atual
+)
+from utils.metadados import obter_cache, obter_metadados, quadros_chave, stream_audio, stream_video
+from utils.processos_imagem import OPERACAO_COMPRIMIR
+from utils.segmentos import (
+    CRFS_CANDIDATOS, DURACAO_SEGMENTO_PADRAO, METRICA_PADRAO, METRICAS_QUALIDADE, ProgressoSegmentos,
+    escolher_crf, escrever_lista_concat, pontos_de_corte, trechos_de_amostra
+)
+from utils.zip_paralelo import (
+    AMOSTRA_BYTES, MINIMO_PARALELO, TIPOS_AMOSTRADOS, EconomiaArmazenamento, EnumeracaoMembros,
+    comprimir_membros, escolher_metodo, gravacao_paralela_suportada
+)
+
+# Tamanho máximo das imagens comprimidas (as maiores são reduzidas)
+TAMANHO_MAXIMO_IMAGEM = (1920, 1080)
+
+# Taxa de bits do áudio dos vídeos comprimidos (em bits/s)
+TAXA_AUDIO_VIDEO = 128000
+
+# Fração do tamanho alvo reservada ao vídeo e ao áudio (o restante cobre o
+# contêiner e a variação do encoder em torno da taxa média)
+MARGEM_TAMANHO_ALVO = 0.97
+
+# Menor taxa de bits de vídeo aceita no modo de tamanho alvo (em bits/s)
+TAXA_VIDEO_MINIMA = 50000
+
+# Parcela do progresso atribuída à primeira passagem
+PROGRESSO_PRIMEIRA_PASSAGEM = 40
+
+# Segundas passagens feitas no modo de tamanho alvo (as extras corrigem a
+# taxa quando a saída passa do alvo)
+TENTATIVAS_TAMANHO_ALVO = 2
+
+# Parcela do progresso atribuída à escolha automática do CRF
+PROGRESSO_BUSCA_CRF = 20
 
 class Compressor:
     """
     Classe responsável por comprimir diferentes tipos de arquivos
     """
     
-    def __init__(self):
+    def __init__(self, executor_imagens=None, agendador=None, cache=None, orcamento_memoria=None):
         """
         Inicializa o compressor com configurações padrão
+        
+        Args:
+            executor_imagens (ExecutorImagens): Executor opcional que processa
+                as imagens em processos separados em vez de na thread atual
+            agendador (Agendador): Agendador onde os segmentos de vídeos longos
+                são codificados (padrão: agendador compartilhado)
+            cache (CacheSaida): Cache opcional de resultados já produzidos
+            orcamento_memoria (OrcamentoMemoria): Orçamento de memória das
+                imagens (None usa o orçamento compartilhado da aplicação)
         """
         # Mapeamento de níveis de compressão para parâmetros específicos
         self.niveis_compressao = {
@@ -70,10 +126,22 @@ class Compressor:
             ".txt": "documento", ".xlsx": "documento", ".pptx": "documento"
         }
         
-        # Flag para cancelamento
-        self.cancelado = threading.Event()
+        # Tarefas em andamento (cada uma com seu próprio sinal de cancelamento)
+        self.tarefas = RegistroTarefas()
+        
+        # Executor de imagens em processos (None processa na thread atual)
+        self.executor_imagens = executor_imagens
+        
+        # Agendador usado pela codificação em segmentos
+        self.agendador = agendador
+        
+        # Cache de resultados (None desativa)
+        self.cache = cache
+        
+        # Limita a memória das imagens processadas ao mesmo tempo
+        self.orcamento_memoria = orcamento_memoria or obter_orcamento_memoria()
     
-    def comprimir_arquivo(self, arquivo_entrada, arquivo_saida, nivel_compressao, callback_progresso=None):
+    def comprimir_arquivo(self, arquivo_entrada, arquivo_saida, nivel_compressao, callback_progresso=None, tarefa=None, opcoes=None):
         """
         Comprime o arquivo de acordo com seu tipo e nível de compressão
         
@@ -82,12 +150,24 @@ class Compressor:
             arquivo_saida (str): Caminho onde o arquivo comprimido será salvo
             nivel_compressao (str): Nível de compressão ('baixo', 'médio', 'alto', 'máximo')
             callback_progresso (function): Função de callback para atualização do progresso
+            tarefa (Tarefa): Tarefa usada para cancelar esta compressão (uma
+                nova é criada se não for informada)
+            opcoes (dict): Opções adicionais (ex.: "segmentar" e
+                "duracao_segmento" para vídeos longos, "reducao_rapida", que
+                reduz imagens grandes até o próprio tamanho final antes do
+                LANCZOS, e "max_bytes" e
+                "reduzir_dimensoes" para limitar o tamanho das imagens)
             
         Returns:
             bool: True se a compressão foi bem-sucedida, False caso contrário
         """
-        # Reinicia a flag de cancelamento
-        self.cancelado.clear()
+        # Cada compressão tem o seu próprio sinal de cancelamento
+        if tarefa is None:
+            tarefa = Tarefa()
+        
+        # Inicializa opções se não fornecidas
+        if opcoes is None:
+            opcoes = {}
         
         # Verifica se o arquivo existe
         if not os.path.exists(arquivo_entrada):
@@ -106,20 +186,123 @@ class Compressor:
         # Obtém o nível de compressão para o tipo de arquivo
         params_compressao = self.niveis_compressao.get(nivel_compressao, self.niveis_compressao["médio"])
         
+        # As etapas são medidas em nome do manipulador do tipo de arquivo
+        with manipulador(f"compressor.{tipo_arquivo}", arquivo_entrada):
+            # Reaproveita um resultado idêntico já produzido, se houver cache
+            chave_cache = None
+            if self.cache is not None:
+                chave_cache = self.cache.chave(arquivo_entrada, "comprimir", nivel_compressao, opcoes)
+                with etapa(ETAPA_GRAVAR):
+                    reaproveitado = self.cache.obter(chave_cache, arquivo_saida)
+                if reaproveitado:
+                    if callback_progresso:
+                        callback_progresso(100)
+                    return True
+            
+            # A saída é escrita com um nome temporário e renomeada ao final, de
+            # modo que um arquivo parcial nunca é confundido com um concluído
+            arquivo_parcial = caminho_parcial(arquivo_saida)
+            try:
+                # Executa a compressão mantendo a tarefa registrada enquanto durar
+                with self.tarefas.acompanhar(tarefa):
+                    resultado = self._comprimir_por_tipo(
+                        tipo_arquivo,
+                        arquivo_entrada,
+                        arquivo_parcial,
+                        nivel_compressao,
+                        params_compressao,
+                        opcoes,
+                        tarefa,
+                        callback_progresso
+                    )
+            
+                if resultado:
+                    with etapa(ETAPA_RENOMEAR):
+                        os.replace(arquivo_parcial, arquivo_saida)
+            finally:
+                # Remove a saída parcial de uma operação cancelada ou com erro
+                if os.path.exists(arquivo_parcial):
+                    os.remove(arquivo_parcial)
+            
+            # Guarda o resultado para os próximos pedidos iguais
+            if resultado and chave_cache is not None:
+                try:
+                    with etapa(ETAPA_GRAVAR):
+                        self.cache.guardar(chave_cache, arquivo_saida)
+                except Exception as e:
+                    print(f"Erro ao guardar resultado no cache: {str(e)}")
+            
+            return resultado
+    
+    def _comprimir_por_tipo(self, tipo_arquivo, arquivo_entrada, arquivo_saida, nivel_compressao, params_compressao, opcoes, tarefa, callback_progresso=None):
+        """
+        Encaminha a compressão para o método adequado ao tipo de arquivo
+        
+        Args:
+            tipo_arquivo (str): Tipo do arquivo de entrada
+            arquivo_entrada (str): Caminho do arquivo a ser comprimido
+            arquivo_saida (str): Caminho onde o arquivo comprimido será salvo
+            nivel_compressao (str): Nível de compressão
+            params_compressao (dict): Parâmetros do nível de compressão
+            opcoes (dict): Opções adicionais da compressão
+            tarefa (Tarefa): Tarefa com o sinal de cancelamento da operação
+            callback_progresso (function): Função de callback para atualização do progresso
+            
+        Returns:
+            bool: True se a compressão foi bem-sucedida, False caso contrário
+        """
         # Executa a compressão de acordo com o tipo de arquivo
         if tipo_arquivo == "imagem":
-            return self._comprimir_imagem(
-                arquivo_entrada, 
-                arquivo_saida, 
-                params_compressao["imagem"],
-                callback_progresso
-            )
+            # Estima a memória pelo cabeçalho e espera ela caber no orçamento;
+            # imagens grandes demais são processadas em faixas, se possível
+            # Sem a redução rápida, mantém a margem do thumbnail() da Pillow
+            fator = FATOR_REDUCAO_RAPIDA if opcoes.get("reducao_rapida", False) else FATOR_REDUCAO
+            max_bytes = opcoes.get("max_bytes")
+            reduzir_dimensoes = opcoes.get("reduzir_dimensoes", False)
+            with etapa(ETAPA_SONDAR):
+                necessario, em_faixas = self.orcamento_memoria.planejar(
+                    arquivo_entrada,
+                    lambda tamanho: tamanho_contido(tamanho, TAMANHO_MAXIMO_IMAGEM),
+                    fator,
+                    opcoes.get("em_faixas", False)
+                )
+            if not self.orcamento_memoria.adquirir(necessario, tarefa.cancelado):
+                return False
+            
+            try:
+                # Usa o pool de processos, se configurado, para escapar do GIL
+                if self.executor_imagens is not None:
+                    return self.executor_imagens.executar(
+                        OPERACAO_COMPRIMIR,
+                        (
+                            arquivo_entrada, arquivo_saida, params_compressao["imagem"], fator,
+                            em_faixas, max_bytes, reduzir_dimensoes
+                        ),
+                        tarefa,
+                        callback_progresso
+                    )
+                
+                return self._comprimir_imagem(
+                    arquivo_entrada, 
+                    arquivo_saida, 
+                    params_compressao["imagem"],
+                    fator,
+                    em_faixas,
+                    max_bytes,
+                    reduzir_dimensoes,
+                    tarefa,
+                    callback_progresso
+                )
+            finally:
+                self.orcamento_memoria.liberar(necessario)
         
         elif tipo_arquivo == "video":
             return self._comprimir_video(
                 arquivo_entrada, 
                 arquivo_saida, 
                 params_compressao["video"],
+                opcoes,
+                tarefa,
                 callback_progresso
             )
         
@@ -128,30 +311,37 @@ class Compressor:
                 arquivo_entrada, 
                 arquivo_saida, 
                 params_compressao["audio"],
+                tarefa,
                 callback_progresso
             )
         
         elif tipo_arquivo == "zip":
-            return self._comprimir_zip(
-                arquivo_entrada, 
-                arquivo_saida, 
-                params_compressao["zip"],
-                callback_progresso
-            )
+            with etapa(ETAPA_CODIFICAR):
+                return self._comprimir_zip(
+                    arquivo_entrada, 
+                    arquivo_saida, 
+                    params_compressao["zip"],
+                    tarefa,
+                    callback_progresso
+                )
         
         elif tipo_arquivo == "documento":
-            return self._comprimir_documento(
-                arquivo_entrada, 
-                arquivo_saida, 
-                nivel_compressao,
-                callback_progresso
-            )
+            with etapa(ETAPA_GRAVAR):
+                return self._comprimir_documento(
+                    arquivo_entrada, 
+                    arquivo_saida, 
+                    nivel_compressao,
+                    tarefa,
+                    callback_progresso
+                )
         
         else:
             # Para outros tipos de arquivo, faz uma cópia simples
-            return self._fazer_copia(arquivo_entrada, arquivo_saida, callback_progresso)
+            with etapa(ETAPA_GRAVAR):
+                return self._fazer_copia(arquivo_entrada, arquivo_saida, tarefa, callback_progresso)
     
-    def _comprimir_imagem(self, arquivo_entrada, arquivo_saida, qualidade, callback_progresso=None):
+    def _comprimir_imagem(self, arquivo_entrada, arquivo_saida, qualidade, fator_reducao, em_faixas,
+                          max_bytes, reduzir_dimensoes, tarefa, callback_progresso=None):
         """
         Comprime uma imagem usando a biblioteca PIL
         
@@ -159,6 +349,16 @@ class Compressor:
             arquivo_entrada (str): Caminho da imagem a ser comprimida
             arquivo_saida (str): Caminho onde a imagem comprimida será salva
             qualidade (int): Valor de qualidade (0-100)
+            fator_reducao (float): Nas imagens maiores que o limite, decodifica
+                JPEGs em escala reduzida e reduz por fatores inteiros até este
+                múltiplo do tamanho final antes do LANCZOS (ver decodificar)
+            em_faixas (bool): Lê formatos sem compressão uma faixa de linhas
+                por vez, sem manter a imagem inteira na memória
+            max_bytes (int): Tamanho máximo do arquivo; a qualidade (até a do
+                nível) é escolhida para caber nele (None desativa)
+            reduzir_dimensoes (bool): Com max_bytes, permite reduzir também as
+                dimensões quando nem a menor qualidade couber
+            tarefa (Tarefa): Tarefa com o sinal de cancelamento da operação
             callback_progresso (function): Função de callback para atualização do progresso
             
         Returns:
@@ -170,39 +370,75 @@ class Compressor:
                 callback_progresso(10)
             
             # Verifica cancelamento
-            if self.cancelado.is_set():
+            if tarefa.cancelado.is_set():
                 return False
             
             # Abre a imagem
             with Image.open(arquivo_entrada) as img:
-                # Atualiza o progresso
-                if callback_progresso:
-                    callback_progresso(30)
-                
-                # Verifica cancelamento
-                if self.cancelado.is_set():
-                    return False
+                # Imagens muito grandes são reduzidas para caber no limite
+                tamanho_final = tamanho_contido(img.size, TAMANHO_MAXIMO_IMAGEM)
                 
-                # Redimensiona a imagem se ela for muito grande (opcional)
-                max_size = (1920, 1080)
-                if img.width > max_size[0] or img.height > max_size[1]:
-                    img.thumbnail(max_size, Image.LANCZOS)
+                if em_faixas and suporta_faixas(img):
+                    # Decodifica (e redimensiona) uma faixa de linhas por vez
+                    with etapa(ETAPA_DECODIFICAR):
+                        img = montar_em_faixas(img, tamanho_final, cancelado=tarefa.cancelado)
+                    if img is None:
+                        return False
+                else:
+                    # Decodifica já (em escala reduzida, na redução rápida de JPEGs)
+                    with etapa(ETAPA_DECODIFICAR):
+                        caixa = decodificar(img, tamanho_final, fator_reducao)
+                    
+                    # Atualiza o progresso
+                    if callback_progresso:
+                        callback_progresso(30)
+                    
+                    # Verifica cancelamento
+                    if tarefa.cancelado.is_set():
+                        return False
+                    
+                    # Redimensiona a imagem se ela for muito grande
+                    if tamanho_final is not None:
+                        with etapa(ETAPA_REDIMENSIONAR):
+                            img = redimensionar(img, tamanho_final, caixa, fator_reducao)
                 
                 # Atualiza o progresso
                 if callback_progresso:
                     callback_progresso(60)
                 
                 # Verifica cancelamento
-                if self.cancelado.is_set():
+                if tarefa.cancelado.is_set():
                     return False
                 
-                # Salva a imagem com a qualidade especificada
-                img.save(
-                    arquivo_saida, 
-                    quality=qualidade, 
-                    optimize=True,
-                    progressive=True
-                )
+                if max_bytes:
+                    # Busca em memória a maior qualidade que cabe no tamanho
+                    # pedido; só a codificação escolhida vai para o disco
+                    formato = Image.registered_extensions().get(os.path.splitext(arquivo_saida)[1].lower())
+                    with etapa(ETAPA_CODIFICAR):
+                        dados = codificar_ate(
+                            img,
+                            formato,
+                            int(max_bytes),
+                            qualidade,
+                            {"optimize": True, "progressive": True},
+                            reduzir_dimensoes,
+                            tarefa.cancelado
+                        )
+                    if dados is None:
+                        return False
+                    
+                    with etapa(ETAPA_GRAVAR):
+                        with open(arquivo_saida, "wb") as f:
+                            f.write(dados)
+                else:
+                    # Salva a imagem com a qualidade especificada
+                    with etapa(ETAPA_CODIFICAR):
+                        img.save(
+                            arquivo_saida, 
+                            quality=qualidade, 
+                            optimize=True,
+                            progressive=True
+                        )
             
             # Atualiza o progresso
             if callback_progresso:
@@ -214,130 +450,520 @@ class Compressor:
             print(f"Erro ao comprimir imagem: {str(e)}")
             raise
     
-    def _comprimir_video(self, arquivo_entrada, arquivo_saida, crf, callback_progresso=None):
+    def _comprimir_video(self, arquivo_entrada, arquivo_saida, crf, opcoes, tarefa, callback_progresso=None):
         """
         Comprime um vídeo usando FFmpeg
         
+        Com a opção "segmentar", vídeos mais longos que dois segmentos são
+        divididos e codificados em paralelo (ver _comprimir_video_segmentado).
+        Com "tamanho_alvo", o CRF é ignorado e o vídeo é codificado em duas
+        passagens para caber no tamanho pedido (ver _comprimir_video_alvo).
+        Com "qualidade_auto", o CRF do nível é trocado pelo maior que atinge a
+        qualidade pedida em trechos amostrados (ver _escolher_crf).
+        
         Args:
             arquivo_entrada (str): Caminho do vídeo a ser comprimido
             arquivo_saida (str): Caminho onde o vídeo comprimido será salvo
             crf (str): Constant Rate Factor (valor de qualidade)
+            opcoes (dict): Opções adicionais ("segmentar", "duracao_segmento",
+                "tamanho_alvo" em bytes, "qualidade_auto", "metrica_qualidade"
+                e "qualidade_alvo")
+            tarefa (Tarefa): Tarefa com o sinal de cancelamento da operação
             callback_progresso (function): Função de callback para atualização do progresso
             
         Returns:
             bool: True se a compressão foi bem-sucedida, False caso contrário
         """
         try:
-            # Verifica se o FFmpeg está disponível
-            try:
-                subprocess.run(
-                    ["ffmpeg", "-version"], 
-                    stdout=subprocess.PIPE, 
-                    stderr=subprocess.PIPE, 
-                    check=True
+            # Verifica se o FFmpeg está disponível (consultado uma vez por processo)
+            capacidades = obter_capacidades()
+            capacidades.exigir_ffmpeg("comprimir vídeos")
+            
+            # Obtém a duração e os streams em uma única sondagem (com cache)
+            # antes de iniciar o FFmpeg
+            metadados = obter_metadados(arquivo_entrada)
+            total_duration = metadados["duracao"]
+            
+            # O tamanho alvo depende da taxa de bits do arquivo inteiro, por
+            # isso não é combinado com a divisão em segmentos
+            if opcoes.get("tamanho_alvo"):
+                return self._comprimir_video_alvo(
+                    arquivo_entrada,
+                    arquivo_saida,
+                    int(opcoes["tamanho_alvo"]),
+                    metadados,
+                    tarefa,
+                    callback_progresso
                 )
-            except (subprocess.SubprocessError, FileNotFoundError):
-                raise RuntimeError(
-                    "FFmpeg não está instalado ou não está disponível no PATH. "
-                    "Por favor, instale o FFmpeg para comprimir vídeos."
+            
+            video = stream_video(metadados)
+            
+            # Escolhe o CRF pela qualidade medida em trechos do próprio vídeo
+            if opcoes.get("qualidade_auto") and video is not None and total_duration:
+                progresso_busca = None
+                if callback_progresso:
+                    progresso_busca = lambda valor: callback_progresso(int(PROGRESSO_BUSCA_CRF * valor / 100))
+                    callback_final = callback_progresso
+                    callback_progresso = lambda valor: callback_final(
+                        PROGRESSO_BUSCA_CRF + int((100 - PROGRESSO_BUSCA_CRF) * valor / 100)
+                    )
+                crf = self._escolher_crf(
+                    arquivo_entrada, arquivo_saida, crf, metadados, opcoes, tarefa, progresso_busca
                 )
+                if crf is None:
+                    return False
             
-            # Cria o diretório temporário para logs
-            temp_dir = tempfile.mkdtemp()
-            log_file = os.path.join(temp_dir, "ffmpeg_progress.txt")
+            # Vídeos longos podem ser divididos em segmentos nos quadros-chave
+            duracao_segmento = float(opcoes.get("duracao_segmento") or DURACAO_SEGMENTO_PADRAO)
+            if (
+                opcoes.get("segmentar") and video is not None
+                and total_duration and total_duration >= 2 * duracao_segmento
+            ):
+                cortes = pontos_de_corte(
+                    quadros_chave(arquivo_entrada, video["indice"]),
+                    total_duration,
+                    duracao_segmento
+                )
+                if cortes:
+                    return self._comprimir_video_segmentado(
+                        arquivo_entrada,
+                        arquivo_saida,
+                        crf,
+                        metadados,
+                        cortes,
+                        tarefa,
+                        callback_progresso
+                    )
             
-            # Comando para comprimir o vídeo
+            # Comando para comprimir o vídeo (com alternativas se o libx264 faltar)
             cmd = [
                 "ffmpeg",
                 "-i", arquivo_entrada,
-                "-c:v", "libx264",
-                "-crf", crf,
-                "-preset", "medium",
-                "-c:a", "aac",
-                "-b:a", "128k",
-                "-progress", log_file,
+                *self._argumentos_video(capacidades, crf),
+                *self._argumentos_audio(capacidades),
                 "-y",
                 arquivo_saida
             ]
             
-            # Inicia o processo FFmpeg
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
+            # Executa o FFmpeg acompanhando o progresso
+            return executar_ffmpeg(cmd, total_duration, tarefa, callback_progresso)
+        
+        except Exception as e:
+            print(f"Erro ao comprimir vídeo: {str(e)}")
+            raise
+    
+    def _escolher_crf(self, arquivo_entrada, arquivo_saida, crf, metadados, opcoes, tarefa, callback_progresso=None):
+        """
+        Escolhe o CRF de um vídeo pela qualidade medida em trechos amostrados
+        
+        Alguns trechos curtos (ver trechos_de_amostra) são codificados com
+        cada CRF candidato, em paralelo na fila de CPU do agendador, e
+        comparados com o original pelo filtro ssim ou psnr do FFmpeg. A
+        pontuação de um CRF é a do seu pior trecho, e o escolhido é o maior
+        que atinge o alvo. As pontuações ficam no cache de metadados, de modo
+        que o mesmo vídeo não é medido de novo (nem com outro alvo).
+        
+        Args:
+            arquivo_entrada (str): Caminho do vídeo a ser comprimido
+            arquivo_saida (str): Caminho da saída (os trechos ficam ao lado dela)
+            crf (str): CRF do nível, usado se o encoder não for controlado por CRF
+            metadados (dict): Metadados do vídeo (ver obter_metadados)
+            opcoes (dict): Opções com "metrica_qualidade" e "qualidade_alvo"
+            tarefa (Tarefa): Tarefa com o sinal de cancelamento da operação
+            callback_progresso (function): Função de callback para atualização do progresso
             
-            # Obtém a duração total do vídeo
-            duration_cmd = [
-                "ffprobe",
-                "-v", "error",
-                "-show_entries", "format=duration",
-                "-of", "json",
-                arquivo_entrada
-            ]
+        Returns:
+            str: CRF escolhido, ou None se a operação foi cancelada
             
-            duration_process = subprocess.run(
-                duration_cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
+        Raises:
+            ValueError: Se a métrica pedida não for conhecida
+        """
+        capacidades = obter_capacidades()
+        encoder_video = capacidades.escolher_encoder("libx264")
+        if encoder_video not in ENCODERS_CRF:
+            # A qualidade desse encoder não varia com o CRF
+            return crf
+        
+        metrica = opcoes.get("metrica_qualidade") or METRICA_PADRAO
+        if metrica not in METRICAS_QUALIDADE:
+            raise ValueError(f"Métrica de qualidade desconhecida: {metrica}")
+        alvo = float(opcoes.get("qualidade_alvo") or METRICAS_QUALIDADE[metrica])
+        
+        video = stream_video(metadados)
+        trechos = trechos_de_amostra(metadados["duracao"])
+        chave_cache = "|".join([
+            "crf", encoder_video, metrica,
+            ",".join(f"{inicio:.3f}+{duracao:.3f}" for inicio, duracao in trechos)
+        ])
+        
+        # Pontuações já medidas neste arquivo (as chaves do JSON são textos)
+        cache = obter_cache()
+        em_cache = cache.obter_medicoes(arquivo_entrada, chave_cache) or {}
+        pontuacoes = {int(valor): pontuacao for valor, pontuacao in em_cache.items()}
+        candidatos = [candidato for candidato in CRFS_CANDIDATOS if candidato not in pontuacoes]
+        
+        if candidatos:
+            agendador = self.agendador or obter_agendador()
+            nome_manipulador, arquivo_manipulador = manipulador_atual()
+            temp_dir = tempfile.mkdtemp(
+                prefix=".amostras_", dir=os.path.dirname(os.path.abspath(arquivo_saida))
             )
             
-            duration_data = json.loads(duration_process.stdout)
-            total_duration = float(duration_data["format"]["duration"])
+            def medir(candidato, indice, inicio, duracao):
+                # Codifica o trecho e o compara com o mesmo trecho do original
+                with manipulador(nome_manipulador, arquivo_manipulador):
+                    subtarefa = tarefa_atual()
+                    amostra = os.path.join(temp_dir, f"amostra_{candidato}_{indice}.mkv")
+                    cmd = [
+                        "ffmpeg",
+                        "-ss", f"{inicio:.3f}",
+                        "-t", f"{duracao:.3f}",
+                        "-i", arquivo_entrada,
+                        "-map", f"0:{video['indice']}",
+                        *self._argumentos_video(capacidades, candidato),
+                        "-an",
+                        "-y",
+                        amostra
+                    ]
+                    if not executar_ffmpeg(cmd, duracao, subtarefa):
+                        return None
+                    return medir_qualidade(
+                        amostra, arquivo_entrada, inicio, duracao, metrica, subtarefa, video["indice"]
+                    )
             
-            # Monitora o progresso
-            last_progress = 0
-            while process.poll() is None:
-                # Verifica cancelamento
-                if self.cancelado.is_set():
-                    process.terminate()
-                    shutil.rmtree(temp_dir, ignore_errors=True)
+            try:
+                subtarefas = []
+                for candidato in candidatos:
+                    for indice, (inicio, duracao) in enumerate(trechos):
+                        # Subtarefas são canceladas junto com a tarefa principal
+                        subtarefa = agendador.submeter(
+                            FILA_CPU, medir, candidato, indice, inicio, duracao,
+                            prioridade=int(metadados["duracao"])
+                        )
+                        tarefa.vincular(subtarefa)
+                        subtarefas.append((candidato, subtarefa))
+                
+                # Aguarda as medições, executando na própria thread as que
+                # ainda não foram iniciadas
+                erro = None
+                medidas = {}
+                for concluidas, (candidato, subtarefa) in enumerate(subtarefas, start=1):
+                    agendador.executar_ou_aguardar(subtarefa)
+                    if subtarefa.erro is not None and erro is None:
+                        erro = subtarefa.erro
+                        for _, outra in subtarefas:
+                            outra.cancelar()
+                    medidas.setdefault(candidato, []).append(subtarefa.resultado)
+                    if callback_progresso:
+                        callback_progresso(int(100 * concluidas / len(subtarefas)))
+                
+                if erro is not None:
+                    raise erro
+                if tarefa.cancelado.is_set() or any(
+                    pontuacao is None for lista in medidas.values() for pontuacao in lista
+                ):
+                    return None
+            finally:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+            
+            for candidato, lista in medidas.items():
+                pontuacoes[candidato] = min(lista)
+            cache.gravar_medicoes(arquivo_entrada, chave_cache, pontuacoes)
+        elif callback_progresso:
+            callback_progresso(100)
+        
+        escolhido = escolher_crf(pontuacoes, alvo)
+        tarefa.relatorio = {
+            **tarefa.relatorio,
+            "crf": escolhido,
+            "metrica": metrica,
+            "pontuacao": pontuacoes[escolhido]
+        }
+        return str(escolhido)
+    
+    def _argumentos_video(self, capacidades, crf):
+        """
+        Retorna os argumentos de codificação do vídeo comprimido
+        
+        Args:
+            capacidades (CapacidadesFFmpeg): Capacidades do FFmpeg instalado
+            crf (str): Constant Rate Factor (valor de qualidade)
+            
+        Returns:
+            list: Argumentos do FFmpeg
+        """
+        encoder_video = capacidades.escolher_encoder("libx264")
+        return [
+            "-c:v", encoder_video,
+            *argumentos_qualidade_video(encoder_video, crf),
+            "-preset", "medium"
+        ]
+    
+    def _comprimir_video_alvo(self, arquivo_entrada, arquivo_saida, tamanho_alvo, metadados, tarefa, callback_progresso=None):
+        """
+        Comprime um vídeo em duas passagens para caber em um tamanho alvo
+        
+        A taxa de bits do vídeo é calculada a partir da duração sondada e da
+        taxa do áudio. A primeira passagem só analisa o vídeo (sem áudio e sem
+        saída) e grava as estatísticas usadas pela segunda. Se a saída passar
+        do alvo, a segunda passagem é refeita com a taxa corrigida,
+        reaproveitando as mesmas estatísticas. O progresso restante é dividido
+        entre as tentativas, para nunca retroceder. O tamanho obtido é
+        informado em ``tarefa.relatorio``.
+        
+        Args:
+            arquivo_entrada (str): Caminho do vídeo a ser comprimido
+            arquivo_saida (str): Caminho onde o vídeo comprimido será salvo
+            tamanho_alvo (int): Tamanho máximo da saída em bytes
+            metadados (dict): Metadados do vídeo (ver obter_metadados)
+            tarefa (Tarefa): Tarefa com o sinal de cancelamento da operação
+            callback_progresso (function): Função de callback para atualização do progresso
+            
+        Returns:
+            bool: True se a compressão foi bem-sucedida, False se foi cancelada
+            
+        Raises:
+            ValueError: Se a duração for desconhecida ou o alvo for pequeno demais
+        """
+        capacidades = obter_capacidades()
+        duracao = metadados["duracao"]
+        if not duracao:
+            raise ValueError("A duração do vídeo é desconhecida; não é possível calcular a taxa de bits do tamanho alvo")
+        
+        # O áudio mantém a própria taxa quando já for menor que a padrão
+        taxa_audio = 0
+        audio = stream_audio(metadados)
+        if audio is not None:
+            taxa_audio = min(TAXA_AUDIO_VIDEO, audio["bitrate"] or TAXA_AUDIO_VIDEO)
+        
+        taxa_video = tamanho_alvo * 8 * MARGEM_TAMANHO_ALVO / duracao - taxa_audio
+        if taxa_video < TAXA_VIDEO_MINIMA:
+            raise ValueError(
+                f"O tamanho alvo de {tamanho_alvo / 1024 ** 2:.1f} MB é pequeno demais para "
+                f"{duracao:.0f} s de vídeo"
+            )
+        
+        encoder_video = capacidades.escolher_encoder("libx264")
+        duas_passagens = encoder_video in ENCODERS_DUAS_PASSAGENS
+        
+        def progresso(inicio, fim):
+            # Converte o progresso de uma passagem para a sua faixa do total
+            if not callback_progresso:
+                return None
+            return lambda valor: callback_progresso(int(inicio + (fim - inicio) * valor / 100))
+        
+        # As estatísticas ficam ao lado da saída e são removidas ao final
+        diretorio_passagens = tempfile.mkdtemp(
+            prefix=".passagens_", dir=os.path.dirname(os.path.abspath(arquivo_saida))
+        )
+        arquivo_estatisticas = os.path.join(diretorio_passagens, "passagem")
+        try:
+            inicio_segunda = 0
+            if duas_passagens:
+                inicio_segunda = PROGRESSO_PRIMEIRA_PASSAGEM
+                cmd = [
+                    "ffmpeg",
+                    "-i", arquivo_entrada,
+                    "-c:v", encoder_video,
+                    *argumentos_taxa_video(encoder_video, taxa_video, 1, arquivo_estatisticas),
+                    "-preset", "medium",
+                    "-an",
+                    "-f", "null",
+                    "-"
+                ]
+                if not executar_ffmpeg(cmd, duracao, tarefa, progresso(0, inicio_segunda)):
+                    return False
+            
+            # Cada tentativa da segunda passagem tem a sua faixa do progresso
+            faixa_tentativa = (100 - inicio_segunda) / TENTATIVAS_TAMANHO_ALVO
+            for tentativa in range(TENTATIVAS_TAMANHO_ALVO):
+                cmd = [
+                    "ffmpeg",
+                    "-i", arquivo_entrada,
+                    "-c:v", encoder_video,
+                    *argumentos_taxa_video(
+                        encoder_video, taxa_video, 2 if duas_passagens else None, arquivo_estatisticas
+                    ),
+                    "-preset", "medium",
+                    *self._argumentos_audio(capacidades, taxa_audio or TAXA_AUDIO_VIDEO),
+                    "-y",
+                    arquivo_saida
+                ]
+                inicio_tentativa = inicio_segunda + faixa_tentativa * tentativa
+                if not executar_ffmpeg(
+                    cmd, duracao, tarefa, progresso(inicio_tentativa, inicio_tentativa + faixa_tentativa)
+                ):
                     return False
                 
-                # Tenta ler o arquivo de log
-                try:
-                    if os.path.exists(log_file):
-                        with open(log_file, "r") as f:
-                            content = f.read()
-                            if "out_time_ms" in content:
-                                # Extrai o tempo atual
-                                time_ms = 0
-                                for line in content.split("\n"):
-                                    if line.startswith("out_time_ms="):
-                                        time_ms = int(line.split("=")[1]) / 1000000  # Converter para segundos
-                                        break
-                                
-                                progress = min(int((time_ms / total_duration) * 100), 99)
-                                
-                                # Atualiza o progresso se houve mudança
-                                if progress > last_progress:
-                                    last_progress = progress
-                                    if callback_progresso:
-                                        callback_progresso(progress)
-                except Exception:
-                    pass
+                tamanho_obtido = os.path.getsize(arquivo_saida)
+                if tamanho_obtido <= tamanho_alvo:
+                    break
                 
-                time.sleep(0.5)
+                # Passou do alvo: reduz a taxa do vídeo na mesma proporção
+                taxa_video *= tamanho_alvo / tamanho_obtido * MARGEM_TAMANHO_ALVO
             
-            # Limpa o diretório temporário
-            shutil.rmtree(temp_dir, ignore_errors=True)
+            tarefa.relatorio = {
+                "tamanho_alvo": tamanho_alvo,
+                "tamanho_obtido": tamanho_obtido,
+                "desvio_alvo": round((tamanho_obtido - tamanho_alvo) / tamanho_alvo, 4),
+                "taxa_video": int(taxa_video),
+                "passagens": 2 if duas_passagens else 1
+            }
+            if tamanho_obtido > tamanho_alvo:
+                print(
+                    f"Aviso: {os.path.basename(arquivo_entrada)} ficou com {tamanho_obtido} bytes, "
+                    f"acima do alvo de {tamanho_alvo} bytes"
+                )
+            return True
+        finally:
+            shutil.rmtree(diretorio_passagens, ignore_errors=True)
+    
+    def _argumentos_audio(self, capacidades, taxa_bits=TAXA_AUDIO_VIDEO):
+        """
+        Retorna os argumentos de codificação do áudio de um vídeo comprimido
+        
+        Args:
+            capacidades (CapacidadesFFmpeg): Capacidades do FFmpeg instalado
+            taxa_bits (int): Taxa de bits do áudio em bits/s
             
-            # Verifica se o processo foi bem-sucedido
-            if process.returncode == 0:
-                if callback_progresso:
-                    callback_progresso(100)
-                return True
-            else:
-                error = process.stderr.read() if process.stderr else "Erro desconhecido"
-                raise RuntimeError(f"Erro no FFmpeg: {error}")
+        Returns:
+            list: Argumentos do FFmpeg
+        """
+        return ["-c:a", capacidades.escolher_encoder("aac"), "-b:a", str(int(taxa_bits))]
+    
+    def _comprimir_video_segmentado(self, arquivo_entrada, arquivo_saida, crf, metadados, cortes, tarefa, callback_progresso=None):
+        """
+        Comprime um vídeo longo dividindo-o em segmentos codificados em paralelo
         
-        except Exception as e:
-            print(f"Erro ao comprimir vídeo: {str(e)}")
-            raise
+        O vídeo é separado nos quadros-chave sem recodificação, cada segmento é
+        codificado como uma tarefa da fila de CPU do agendador (o áudio é
+        codificado à parte, inteiro) e o resultado é unido com o demuxer concat,
+        também sem recodificação. Os arquivos intermediários ficam em um
+        diretório temporário ao lado da saída.
+        
+        Args:
+            arquivo_entrada (str): Caminho do vídeo a ser comprimido
+            arquivo_saida (str): Caminho onde o vídeo comprimido será salvo
+            crf (str): Constant Rate Factor (valor de qualidade)
+            metadados (dict): Metadados do vídeo (ver metadados.sondar_midia)
+            cortes (list): Instantes dos quadros-chave onde o vídeo é dividido
+            tarefa (Tarefa): Tarefa com o sinal de cancelamento da operação
+            callback_progresso (function): Função de callback para atualização do progresso
+            
+        Returns:
+            bool: True se a compressão foi bem-sucedida, False caso contrário
+        """
+        capacidades = obter_capacidades()
+        agendador = self.agendador or obter_agendador()
+        duracao = metadados["duracao"]
+        video = stream_video(metadados)
+        audio = stream_audio(metadados)
+        
+        # Diretório temporário no mesmo disco da saída (os segmentos somam o
+        # tamanho do vídeo)
+        diretorio_saida = os.path.dirname(os.path.abspath(arquivo_saida))
+        temp_dir = tempfile.mkdtemp(prefix=".segmentos_", dir=diretorio_saida)
+        
+        try:
+            # Separa o vídeo em partes nos quadros-chave, sem recodificar
+            cmd = [
+                "ffmpeg",
+                "-i", arquivo_entrada,
+                "-map", f"0:{video['indice']}",
+                "-c", "copy",
+                "-f", "segment",
+                "-segment_times", ",".join(f"{corte:.6f}" for corte in cortes),
+                "-reset_timestamps", "1",
+                "-y",
+                os.path.join(temp_dir, "parte_%05d.mkv")
+            ]
+            if not executar_ffmpeg(cmd, None, tarefa):
+                return False
+            
+            partes = sorted(glob.glob(os.path.join(temp_dir, "parte_*.mkv")))
+            limites = [0, *cortes, duracao]
+            duracoes = [fim - inicio for inicio, fim in zip(limites, limites[1:])]
+            if len(duracoes) != len(partes):
+                # O FFmpeg cortou em outros pontos: divide o progresso igualmente
+                duracoes = [duracao / len(partes)] * len(partes)
+            
+            progresso = ProgressoSegmentos(duracoes, callback_progresso)
+            
+            # Os segmentos rodam em outras threads, mas contam para o mesmo manipulador
+            nome_manipulador, arquivo_manipulador = manipulador_atual()
+            
+            def codificar(cmd, duracao_parte, callback):
+                with manipulador(nome_manipulador, arquivo_manipulador):
+                    return executar_ffmpeg(cmd, duracao_parte, tarefa_atual(), callback)
+            
+            def submeter(cmd, duracao_parte, callback=None):
+                # Subtarefas são canceladas junto com a tarefa principal
+                subtarefa = agendador.submeter(
+                    FILA_CPU, codificar, cmd, duracao_parte, callback,
+                    prioridade=int(duracao)
+                )
+                tarefa.vincular(subtarefa)
+                return subtarefa
+            
+            # O áudio é codificado inteiro, em paralelo com os segmentos
+            subtarefas = []
+            arquivo_audio = os.path.join(temp_dir, "audio.mka")
+            if audio is not None:
+                subtarefas.append(submeter([
+                    "ffmpeg",
+                    "-i", arquivo_entrada,
+                    "-map", f"0:{audio['indice']}",
+                    "-vn",
+                    *self._argumentos_audio(capacidades),
+                    "-y",
+                    arquivo_audio
+                ], duracao))
+            
+            # Cada parte do vídeo é codificada como uma tarefa da fila de CPU
+            codificados = []
+            for indice, parte in enumerate(partes):
+                codificado = os.path.join(temp_dir, f"codificado_{indice:05d}.mkv")
+                codificados.append(codificado)
+                subtarefas.append(submeter([
+                    "ffmpeg",
+                    "-i", parte,
+                    *self._argumentos_video(capacidades, crf),
+                    "-an",
+                    "-y",
+                    codificado
+                ], duracoes[indice], progresso.callback_segmento(indice)))
+            
+            # Aguarda as subtarefas, executando na própria thread as que ainda
+            # não foram iniciadas (evita travar com a fila de CPU cheia)
+            erro = None
+            for subtarefa in subtarefas:
+                agendador.executar_ou_aguardar(subtarefa)
+                if subtarefa.erro is not None and erro is None:
+                    # Um segmento falhou: os demais não são mais necessários
+                    erro = subtarefa.erro
+                    for outra in subtarefas:
+                        outra.cancelar()
+            
+            if erro is not None:
+                raise erro
+            if tarefa.cancelado.is_set() or not all(s.resultado for s in subtarefas):
+                return False
+            
+            # Une os segmentos (e o áudio) sem recodificar
+            lista = os.path.join(temp_dir, "lista.txt")
+            escrever_lista_concat(lista, codificados)
+            cmd = ["ffmpeg", "-f", "concat", "-safe", "0", "-i", lista]
+            if audio is not None:
+                cmd.extend(["-i", arquivo_audio, "-map", "0:v", "-map", "1:a"])
+            cmd.extend(["-c", "copy", "-y", arquivo_saida])
+            
+            return executar_ffmpeg(cmd, None, tarefa, callback_progresso)
+        
+        finally:
+            # Remove os segmentos intermediários
+            shutil.rmtree(temp_dir, ignore_errors=True)
     
-    def _comprimir_audio(self, arquivo_entrada, arquivo_saida, bitrate, callback_progresso=None):
+    def _comprimir_audio(self, arquivo_entrada, arquivo_saida, bitrate, tarefa, callback_progresso=None):
         """
         Comprime um arquivo de áudio usando FFmpeg
         
@@ -345,126 +971,53 @@ class Compressor:
             arquivo_entrada (str): Caminho do áudio a ser comprimido
             arquivo_saida (str): Caminho onde o áudio comprimido será salvo
             bitrate (str): Taxa de bits para o áudio comprimido
+            tarefa (Tarefa): Tarefa com o sinal de cancelamento da operação
             callback_progresso (function): Função de callback para atualização do progresso
             
         Returns:
             bool: True se a compressão foi bem-sucedida, False caso contrário
         """
         try:
-            # Verifica se o FFmpeg está disponível
-            try:
-                subprocess.run(
-                    ["ffmpeg", "-version"], 
-                    stdout=subprocess.PIPE, 
-                    stderr=subprocess.PIPE, 
-                    check=True
-                )
-            except (subprocess.SubprocessError, FileNotFoundError):
-                raise RuntimeError(
-                    "FFmpeg não está instalado ou não está disponível no PATH. "
-                    "Por favor, instale o FFmpeg para comprimir áudios."
-                )
+            # Verifica se o FFmpeg está disponível (consultado uma vez por processo)
+            capacidades = obter_capacidades()
+            capacidades.exigir_ffmpeg("comprimir áudios")
             
-            # Cria o diretório temporário para logs
-            temp_dir = tempfile.mkdtemp()
-            log_file = os.path.join(temp_dir, "ffmpeg_progress.txt")
+            # Obtém a duração e os streams em uma única sondagem (com cache)
+            # antes de iniciar o FFmpeg
+            metadados = obter_metadados(arquivo_entrada)
+            total_duration = metadados["duracao"]
             
             # Comando para comprimir o áudio
             cmd = [
                 "ffmpeg",
                 "-i", arquivo_entrada,
-                "-c:a", "libmp3lame",
+                "-c:a", capacidades.escolher_encoder("libmp3lame"),
                 "-b:a", bitrate,
-                "-progress", log_file,
                 "-y",
                 arquivo_saida
             ]
             
-            # Inicia o processo FFmpeg
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            # Obtém a duração total do áudio
-            duration_cmd = [
-                "ffprobe",
-                "-v", "error",
-                "-show_entries", "format=duration",
-                "-of", "json",
-                arquivo_entrada
-            ]
-            
-            duration_process = subprocess.run(
-                duration_cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            duration_data = json.loads(duration_process.stdout)
-            total_duration = float(duration_data["format"]["duration"])
-            
-            # Monitora o progresso
-            last_progress = 0
-            while process.poll() is None:
-                # Verifica cancelamento
-                if self.cancelado.is_set():
-                    process.terminate()
-                    shutil.rmtree(temp_dir, ignore_errors=True)
-                    return False
-                
-                # Tenta ler o arquivo de log
-                try:
-                    if os.path.exists(log_file):
-                        with open(log_file, "r") as f:
-                            content = f.read()
-                            if "out_time_ms" in content:
-                                # Extrai o tempo atual
-                                time_ms = 0
-                                for line in content.split("\n"):
-                                    if line.startswith("out_time_ms="):
-                                        time_ms = int(line.split("=")[1]) / 1000000  # Converter para segundos
-                                        break
-                                
-                                progress = min(int((time_ms / total_duration) * 100), 99)
-                                
-                                # Atualiza o progresso se houve mudança
-                                if progress > last_progress:
-                                    last_progress = progress
-                                    if callback_progresso:
-                                        callback_progresso(progress)
-                except Exception:
-                    pass
-                
-                time.sleep(0.5)
-            
-            # Limpa o diretório temporário
-            shutil.rmtree(temp_dir, ignore_errors=True)
-            
-            # Verifica se o processo foi bem-sucedido
-            if process.returncode == 0:
-                if callback_progresso:
-                    callback_progresso(100)
-                return True
-            else:
-                error = process.stderr.read() if process.stderr else "Erro desconhecido"
-                raise RuntimeError(f"Erro no FFmpeg: {error}")
+            # Executa o FFmpeg acompanhando o progresso
+            return executar_ffmpeg(cmd, total_duration, tarefa, callback_progresso)
         
         except Exception as e:
             print(f"Erro ao comprimir áudio: {str(e)}")
             raise
     
-    def _comprimir_zip(self, arquivo_entrada, arquivo_saida, metodo_compressao, callback_progresso=None):
+    def _comprimir_zip(self, arquivo_entrada, arquivo_saida, metodo_compressao, tarefa, callback_progresso=None):
         """
         Comprime um arquivo em formato ZIP
         
+        Com DEFLATE, os membros de tipos que costumam já estar comprimidos
+        (ver TIPOS_AMOSTRADOS) que quase não diminuem em uma amostra são
+        armazenados sem compressão; o que isso economizou é informado em
+        ``tarefa.relatorio``.
+        
         Args:
             arquivo_entrada (str): Caminho do arquivo a ser comprimido
             arquivo_saida (str): Caminho onde o arquivo comprimido será salvo
             metodo_compressao (int): Método de compressão ZIP
+            tarefa (Tarefa): Tarefa com o sinal de cancelamento da operação
             callback_progresso (function): Função de callback para atualização do progresso
             
         Returns:
@@ -476,47 +1029,102 @@ class Compressor:
                 callback_progresso(10)
             
             # Verifica cancelamento
-            if self.cancelado.is_set():
+            if tarefa.cancelado.is_set():
                 return False
             
+            # Membros amostrados antes de serem comprimidos
+            extensoes_amostradas = set()
+            if metodo_compressao == zipfile.ZIP_DEFLATED:
+                extensoes_amostradas = {
+                    extensao for extensao, tipo in self.extensao_para_tipo.items() if tipo in TIPOS_AMOSTRADOS
+                }
+            economia = EconomiaArmazenamento()
+            
+            def escrever(zipf, caminho, nome):
+                # Escreve um membro na própria thread, armazenando-o se a
+                # amostra mostrar que não vale comprimir
+                metodo = metodo_compressao
+                if os.path.splitext(caminho)[1].lower() in extensoes_amostradas:
+                    with open(caminho, "rb") as origem:
+                        amostra = origem.read(AMOSTRA_BYTES)
+                    metodo, avaliacao = escolher_metodo(amostra, True)
+                    economia.registrar(metodo, os.path.getsize(caminho), avaliacao)
+                zipf.write(caminho, nome, compress_type=metodo)
+            
             # Determina se é um diretório ou um arquivo
             if os.path.isdir(arquivo_entrada):
-                # Comprime o diretório
-                with zipfile.ZipFile(arquivo_saida, 'w', metodo_compressao) as zipf:
-                    total_files = sum([len(files) for _, _, files in os.walk(arquivo_entrada)])
-                    processed_files = 0
+                # Os arquivos são descobertos (uma única vez) enquanto os
+                # primeiros já estão sendo comprimidos
+                enumeracao = EnumeracaoMembros(arquivo_entrada)
+                arquivos_gravados = 0
+                bytes_gravados = 0
+                ultimo_progresso = 10
+                
+                def membro_gravado(caminho, tamanho):
+                    # Atualiza o progresso pelos bytes gravados (nunca volta,
+                    # mesmo que a enumeração descubra mais arquivos)
+                    nonlocal arquivos_gravados, bytes_gravados, ultimo_progresso
+                    arquivos_gravados += 1
+                    bytes_gravados += tamanho
+                    progress = min(int(enumeracao.progresso(arquivos_gravados, bytes_gravados) * 89) + 10, 99)
                     
-                    for root, _, files in os.walk(arquivo_entrada):
-                        for file in files:
-                            # Verifica cancelamento
-                            if self.cancelado.is_set():
-                                return False
-                            
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, os.path.dirname(arquivo_entrada))
-                            zipf.write(file_path, arcname)
-                            
-                            # Atualiza o contador e o progresso
-                            processed_files += 1
-                            progress = min(int((processed_files / total_files) * 90) + 10, 99)
-                            
-                            if callback_progresso:
-                                callback_progresso(progress)
+                    if progress > ultimo_progresso:
+                        ultimo_progresso = progress
+                        if callback_progresso:
+                            callback_progresso(progress)
+                
+                # Comprime o diretório
+                try:
+                    with zipfile.ZipFile(arquivo_saida, 'w', metodo_compressao) as zipf:
+                        # Com DEFLATE, os membros são comprimidos em processos
+                        # paralelos (diretórios pequenos não compensam o custo,
+                        # e versões do Python não conferidas usam o ZipFile.write)
+                        agendador = self.agendador or obter_agendador()
+                        if (
+                            metodo_compressao == zipfile.ZIP_DEFLATED and agendador.threads_cpu > 1
+                            and gravacao_paralela_suportada(zipf)
+                            and enumeracao.aguardar(2, MINIMO_PARALELO)
+                        ):
+                            temp_dir = tempfile.mkdtemp(
+                                prefix=".membros_", dir=os.path.dirname(os.path.abspath(arquivo_saida))
+                            )
+                            try:
+                                if not comprimir_membros(
+                                    zipf, enumeracao, temp_dir, agendador.threads_cpu,
+                                    cancelado=tarefa.cancelado, ao_gravar=membro_gravado,
+                                    extensoes_amostradas=extensoes_amostradas, economia=economia
+                                ):
+                                    return False
+                            finally:
+                                shutil.rmtree(temp_dir, ignore_errors=True)
+                        else:
+                            for file_path, arcname, tamanho in enumeracao:
+                                # Verifica cancelamento
+                                if tarefa.cancelado.is_set():
+                                    return False
+                                
+                                escrever(zipf, file_path, arcname)
+                                membro_gravado(file_path, tamanho)
+                finally:
+                    enumeracao.fechar()
             else:
                 # Comprime o arquivo individual
                 with zipfile.ZipFile(arquivo_saida, 'w', metodo_compressao) as zipf:
                     # Verifica cancelamento
-                    if self.cancelado.is_set():
+                    if tarefa.cancelado.is_set():
                         return False
                     
                     # Adiciona o arquivo ao ZIP
                     arcname = os.path.basename(arquivo_entrada)
-                    zipf.write(arquivo_entrada, arcname)
+                    escrever(zipf, arquivo_entrada, arcname)
                     
                     # Atualiza o progresso
                     if callback_progresso:
                         callback_progresso(90)
             
+            if extensoes_amostradas:
+                tarefa.relatorio = {**tarefa.relatorio, **economia.relatorio()}
+            
             # Atualiza o progresso final
             if callback_progresso:
                 callback_progresso(100)
@@ -527,7 +1135,7 @@ class Compressor:
             print(f"Erro ao comprimir para ZIP: {str(e)}")
             raise
     
-    def _comprimir_documento(self, arquivo_entrada, arquivo_saida, nivel_compressao, callback_progresso=None):
+    def _comprimir_documento(self, arquivo_entrada, arquivo_saida, nivel_compressao, tarefa, callback_progresso=None):
         """
         Comprime um documento (para documentos, geralmente fazemos uma cópia ou
         realizamos conversões específicas)
@@ -536,6 +1144,7 @@ class Compressor:
             arquivo_entrada (str): Caminho do documento a ser comprimido
             arquivo_saida (str): Caminho onde o documento comprimido será salvo
             nivel_compressao (str): Nível de compressão
+            tarefa (Tarefa): Tarefa com o sinal de cancelamento da operação
             callback_progresso (function): Função de callback para atualização do progresso
             
         Returns:
@@ -543,15 +1152,16 @@ class Compressor:
         """
         # Para documentos, por enquanto, fazemos apenas uma cópia
         # No futuro, poderíamos implementar compressão de PDF, etc.
-        return self._fazer_copia(arquivo_entrada, arquivo_saida, callback_progresso)
+        return self._fazer_copia(arquivo_entrada, arquivo_saida, tarefa, callback_progresso)
     
-    def _fazer_copia(self, arquivo_entrada, arquivo_saida, callback_progresso=None):
+    def _fazer_copia(self, arquivo_entrada, arquivo_saida, tarefa, callback_progresso=None):
         """
         Faz uma cópia do arquivo com atualizações de progresso
         
         Args:
             arquivo_entrada (str): Caminho do arquivo de origem
             arquivo_saida (str): Caminho do arquivo de destino
+            tarefa (Tarefa): Tarefa com o sinal de cancelamento da operação
             callback_progresso (function): Função de callback para atualização do progresso
             
         Returns:
@@ -570,14 +1180,14 @@ class Compressor:
                 callback_progresso(0)
             
             # Verifica cancelamento
-            if self.cancelado.is_set():
+            if tarefa.cancelado.is_set():
                 return False
             
             with open(arquivo_entrada, 'rb') as fin, open(arquivo_saida, 'wb') as fout:
                 copiado = 0
                 while True:
                     # Verifica cancelamento
-                    if self.cancelado.is_set():
+                    if tarefa.cancelado.is_set():
                         return False
                     
                     # Lê um bloco de dados
@@ -601,8 +1211,27 @@ class Compressor:
             print(f"Erro ao copiar arquivo: {str(e)}")
             raise
     
+    def fila_execucao(self, arquivo_entrada):
+        """
+        Determina a fila do agendador adequada para comprimir o arquivo
+        
+        Args:
+            arquivo_entrada (str): Caminho do arquivo a ser comprimido
+            
+        Returns:
+            str: Nome da fila de execução
+        """
+        _, extensao = os.path.splitext(arquivo_entrada)
+        tipo_arquivo = self.extensao_para_tipo.get(extensao.lower())
+        
+        if tipo_arquivo in ("video", "audio"):
+            return FILA_CPU
+        elif tipo_arquivo == "imagem":
+            return FILA_IMAGEM
+        return FILA_IO
+    
     def cancelar(self):
         """
-        Cancela a operação de compressão em andamento
+        Cancela todas as operações de compressão em andamento
         """
-        self.cancelado.set()
\ No newline at end of file
+        self.tarefas.cancelar_todas()
\ No newline at end of file
@@ -6,22 +6,42 @@ Módulo que contém a classe responsável pela conversão de arquivos
 """
 
 import os
-import time
-import json
-import subprocess
-import tempfile
-import shutil
-import threading
 from PIL import Image
 
+from utils.agendador import (
+    FILA_CPU, FILA_IMAGEM, FILA_IO, RegistroTarefas, Tarefa
+)
+from utils.ffmpeg import (
+    CONTEINER_AUDIO, argumentos_qualidade_video, codec_compativel, executar_ffmpeg,
+    obter_capacidades
+)
+from utils.diario import caminho_parcial
+from utils.imagem import (
+    FATOR_REDUCAO_RAPIDA, FORMATOS_ANIMADOS, SequenciaQuadros, decodificar, montar_em_faixas,
+    obter_orcamento_memoria, redimensionar as redimensionar_imagem, suporta_faixas
+)
+from utils.metricas import (
+    ETAPA_CODIFICAR, ETAPA_DECODIFICAR, ETAPA_GRAVAR, ETAPA_REDIMENSIONAR, ETAPA_RENOMEAR,
+    ETAPA_SONDAR, etapa, manipulador
+)
+from utils.metadados import obter_metadados, stream_audio, stream_video
+from utils.processos_imagem import OPERACAO_CONVERTER
+
 class Conversor:
     """
     Classe responsável por converter diferentes tipos de arquivos
     """
     
-    def __init__(self):
+    def __init__(self, executor_imagens=None, cache=None, orcamento_memoria=None):
         """
         Inicializa o conversor com configurações padrão
+        
+        Args:
+            executor_imagens (ExecutorImagens): Executor opcional que processa
+                as imagens em processos separados em vez de na thread atual
+            cache (CacheSaida): Cache opcional de resultados já produzidos
+            orcamento_memoria (OrcamentoMemoria): Orçamento de memória das
+                imagens (None usa o orçamento compartilhado da aplicação)
         """
         # Mapeamento de extensões para tipos de conversão
         self.extensao_para_tipo = {
@@ -47,10 +67,23 @@ class Conversor:
             "documento": ["pdf", "txt", "docx", "html"]
         }
         
-        # Flag para cancelamento
-        self.cancelado = threading.Event()
+        # Formatos aceitos na extração de áudio de vídeos ("auto" escolhe o
+        # contêiner que permite copiar o stream, ver formato_extracao_audio)
+        self.formatos_extracao_audio = ["auto", "mp3", "m4a", "ogg", "mka", "flac", "wav", "aac"]
+        
+        # Tarefas em andamento (cada uma com seu próprio sinal de cancelamento)
+        self.tarefas = RegistroTarefas()
+        
+        # Executor de imagens em processos (None processa na thread atual)
+        self.executor_imagens = executor_imagens
+        
+        # Cache de resultados (None desativa)
+        self.cache = cache
+        
+        # Limita a memória das imagens processadas ao mesmo tempo
+        self.orcamento_memoria = orcamento_memoria or obter_orcamento_memoria()
     
-    def converter_arquivo(self, arquivo_entrada, arquivo_saida, formato_saida, opcoes=None, callback_progresso=None):
+    def converter_arquivo(self, arquivo_entrada, arquivo_saida, formato_saida, opcoes=None, callback_progresso=None, tarefa=None):
         """
         Converte o arquivo para o formato especificado
         
@@ -60,12 +93,15 @@ class Conversor:
             formato_saida (str): Formato de saída desejado
             opcoes (dict): Opções adicionais para a conversão
             callback_progresso (function): Função de callback para atualização do progresso
+            tarefa (Tarefa): Tarefa usada para cancelar esta conversão (uma
+                nova é criada se não for informada)
             
         Returns:
             bool: True se a conversão foi bem-sucedida, False caso contrário
         """
-        # Reinicia a flag de cancelamento
-        self.cancelado.clear()
+        # Cada conversão tem o seu próprio sinal de cancelamento
+        if tarefa is None:
+            tarefa = Tarefa()
         
         # Inicializa opções se não fornecidas
         if opcoes is None:
@@ -86,20 +122,121 @@ class Conversor:
             raise ValueError(f"Tipo de arquivo não suportado: {extensao}")
         
         # Verifica se o formato de saída é válido para o tipo de arquivo
-        if formato_saida not in self.formatos_conversao.get(tipo_arquivo, []):
+        # (na extração de áudio, o formato é o do áudio extraído)
+        if tipo_arquivo == "vídeo" and opcoes.get("extracao_audio", False):
+            formatos_validos = self.formatos_extracao_audio[1:]
+        else:
+            formatos_validos = self.formatos_conversao.get(tipo_arquivo, [])
+        
+        if formato_saida not in formatos_validos:
             raise ValueError(
                 f"Formato de saída '{formato_saida}' não é válido para arquivos do tipo '{tipo_arquivo}'"
             )
         
+        # As etapas são medidas em nome do manipulador do tipo de arquivo
+        nome_manipulador = f"conversor.{tipo_arquivo}"
+        if tipo_arquivo == "vídeo" and opcoes.get("extracao_audio", False):
+            nome_manipulador = "conversor.extracao_audio"
+        
+        with manipulador(nome_manipulador, arquivo_entrada):
+            # Reaproveita um resultado idêntico já produzido, se houver cache
+            chave_cache = None
+            if self.cache is not None:
+                chave_cache = self.cache.chave(arquivo_entrada, "converter", formato_saida, opcoes)
+                with etapa(ETAPA_GRAVAR):
+                    reaproveitado = self.cache.obter(chave_cache, arquivo_saida)
+                if reaproveitado:
+                    if callback_progresso:
+                        callback_progresso(100)
+                    return True
+            
+            # A saída é escrita com um nome temporário e renomeada ao final, de
+            # modo que um arquivo parcial nunca é confundido com um concluído
+            arquivo_parcial = caminho_parcial(arquivo_saida)
+            try:
+                # Executa a conversão mantendo a tarefa registrada enquanto durar
+                with self.tarefas.acompanhar(tarefa):
+                    resultado = self._converter_por_tipo(
+                        tipo_arquivo,
+                        arquivo_entrada,
+                        arquivo_parcial,
+                        formato_saida,
+                        opcoes,
+                        tarefa,
+                        callback_progresso
+                    )
+            
+                if resultado:
+                    with etapa(ETAPA_RENOMEAR):
+                        os.replace(arquivo_parcial, arquivo_saida)
+            finally:
+                # Remove a saída parcial de uma operação cancelada ou com erro
+                if os.path.exists(arquivo_parcial):
+                    os.remove(arquivo_parcial)
+            
+            # Guarda o resultado para os próximos pedidos iguais
+            if resultado and chave_cache is not None:
+                try:
+                    with etapa(ETAPA_GRAVAR):
+                        self.cache.guardar(chave_cache, arquivo_saida)
+                except Exception as e:
+                    print(f"Erro ao guardar resultado no cache: {str(e)}")
+            
+            return resultado
+    
+    def _converter_por_tipo(self, tipo_arquivo, arquivo_entrada, arquivo_saida, formato_saida, opcoes, tarefa, callback_progresso=None):
+        """
+        Encaminha a conversão para o método adequado ao tipo de arquivo
+        
+        Args:
+            tipo_arquivo (str): Tipo do arquivo de entrada
+            arquivo_entrada (str): Caminho do arquivo a ser convertido
+            arquivo_saida (str): Caminho onde o arquivo convertido será salvo
+            formato_saida (str): Formato de saída desejado
+            opcoes (dict): Opções adicionais para a conversão
+            tarefa (Tarefa): Tarefa com o sinal de cancelamento da operação
+            callback_progresso (function): Função de callback para atualização do progresso
+            
+        Returns:
+            bool: True se a conversão foi bem-sucedida, False caso contrário
+        """
         # Executa a conversão de acordo com o tipo de arquivo
         if tipo_arquivo == "imagem":
-            return self._converter_imagem(
-                arquivo_entrada, 
-                arquivo_saida, 
-                formato_saida,
-                opcoes,
-                callback_progresso
-            )
+            # Estima a memória pelo cabeçalho e espera ela caber no orçamento;
+            # imagens grandes demais são processadas em faixas, se possível
+            with etapa(ETAPA_SONDAR):
+                necessario, em_faixas = self.orcamento_memoria.planejar(
+                    arquivo_entrada,
+                    self._tamanho_final(opcoes),
+                    FATOR_REDUCAO_RAPIDA if opcoes.get("reducao_rapida", False) else None,
+                    opcoes.get("em_faixas", False),
+                    formato_saida.lower()
+                )
+            if em_faixas:
+                opcoes = {**opcoes, "em_faixas": True}
+            if not self.orcamento_memoria.adquirir(necessario, tarefa.cancelado):
+                return False
+            
+            try:
+                # Usa o pool de processos, se configurado, para escapar do GIL
+                if self.executor_imagens is not None:
+                    return self.executor_imagens.executar(
+                        OPERACAO_CONVERTER,
+                        (arquivo_entrada, arquivo_saida, formato_saida, opcoes),
+                        tarefa,
+                        callback_progresso
+                    )
+                
+                return self._converter_imagem(
+                    arquivo_entrada, 
+                    arquivo_saida, 
+                    formato_saida,
+                    opcoes,
+                    tarefa,
+                    callback_progresso
+                )
+            finally:
+                self.orcamento_memoria.liberar(necessario)
         
         elif tipo_arquivo == "vídeo":
             # Verifica se é para extrair áudio
@@ -107,7 +244,9 @@ class Conversor:
                 return self._extrair_audio_de_video(
                     arquivo_entrada, 
                     arquivo_saida, 
+                    formato_saida,
                     opcoes,
+                    tarefa,
                     callback_progresso
                 )
             else:
@@ -116,6 +255,7 @@ class Conversor:
                     arquivo_saida, 
                     formato_saida,
                     opcoes,
+                    tarefa,
                     callback_progresso
                 )
         
@@ -125,30 +265,62 @@ class Conversor:
                 arquivo_saida, 
                 formato_saida,
                 opcoes,
+                tarefa,
                 callback_progresso
             )
         
         elif tipo_arquivo == "documento":
-            return self._converter_documento(
-                arquivo_entrada, 
-                arquivo_saida, 
-                formato_saida,
-                opcoes,
-                callback_progresso
-            )
+            with etapa(ETAPA_CODIFICAR):
+                return self._converter_documento(
+                    arquivo_entrada, 
+                    arquivo_saida, 
+                    formato_saida,
+                    opcoes,
+                    tarefa,
+                    callback_progresso
+                )
         
         else:
             raise ValueError(f"Conversão não implementada para o tipo de arquivo: {tipo_arquivo}")
     
-    def _converter_imagem(self, arquivo_entrada, arquivo_saida, formato_saida, opcoes, callback_progresso=None):
+    def _tamanho_final(self, opcoes):
+        """
+        Interpreta a opção "redimensionar" de uma conversão de imagem
+        
+        Args:
+            opcoes (dict): Opções da conversão
+            
+        Returns:
+            tuple: Largura e altura desejadas, ou None para manter o tamanho
+        """
+        redimensionar = opcoes.get("redimensionar", "original")
+        if redimensionar == "original":
+            return None
+        
+        try:
+            return tuple(map(int, redimensionar.split("x")))
+        except (ValueError, AttributeError):
+            # Se houver erro no formato, usa a imagem original
+            return None
+    
+    def _converter_imagem(self, arquivo_entrada, arquivo_saida, formato_saida, opcoes, tarefa, callback_progresso=None):
         """
         Converte uma imagem para o formato especificado
         
+        Animações convertidas para GIF, WebP ou PNG (APNG) mantêm todos os
+        quadros, as durações e as repetições; nos demais formatos, só o
+        primeiro quadro é gravado.
+        
         Args:
             arquivo_entrada (str): Caminho da imagem a ser convertida
             arquivo_saida (str): Caminho onde a imagem convertida será salva
             formato_saida (str): Formato de saída desejado
-            opcoes (dict): Opções adicionais para a conversão
+            opcoes (dict): Opções adicionais ("qualidade", "redimensionar",
+                "reducao_rapida", que decodifica JPEGs em escala reduzida e
+                reduz por fatores inteiros até o tamanho final antes do
+                LANCZOS, e "em_faixas", que lê formatos sem compressão uma
+                faixa de linhas por vez)
+            tarefa (Tarefa): Tarefa com o sinal de cancelamento da operação
             callback_progresso (function): Função de callback para atualização do progresso
             
         Returns:
@@ -160,40 +332,63 @@ class Conversor:
                 callback_progresso(10)
             
             # Verifica cancelamento
-            if self.cancelado.is_set():
+            if tarefa.cancelado.is_set():
                 return False
             
+            # Processa opções
+            qualidade = int(opcoes.get("qualidade", 90))
+            # Sem a redução rápida, o LANCZOS é aplicado à imagem inteira
+            fator = FATOR_REDUCAO_RAPIDA if opcoes.get("reducao_rapida", False) else None
+            
+            # Tamanho final, se for para redimensionar
+            tamanho_final = self._tamanho_final(opcoes)
+            
             # Abre a imagem
             with Image.open(arquivo_entrada) as img:
-                # Atualiza o progresso
-                if callback_progresso:
-                    callback_progresso(30)
-                
-                # Verifica cancelamento
-                if self.cancelado.is_set():
-                    return False
+                # Animações (GIF, WebP, APNG) em formatos que as guardam têm os
+                # quadros decodificados um por vez durante a gravação
+                animada = getattr(img, "is_animated", False) and formato_saida.lower() in FORMATOS_ANIMADOS
                 
-                # Processa opções
-                qualidade = int(opcoes.get("qualidade", 90))
-                redimensionar = opcoes.get("redimensionar", "original")
-                
-                # Redimensiona a imagem se solicitado
-                if redimensionar != "original":
-                    try:
-                        largura, altura = map(int, redimensionar.split("x"))
-                        img = img.resize((largura, altura), Image.LANCZOS)
-                    except (ValueError, AttributeError):
-                        # Se houver erro no formato, usa a imagem original
-                        pass
+                if not animada and opcoes.get("em_faixas", False) and suporta_faixas(img):
+                    # Decodifica (e redimensiona) uma faixa de linhas por vez
+                    modo = "RGB" if formato_saida.lower() in ("jpg", "jpeg") and img.mode == "RGBA" else None
+                    with etapa(ETAPA_DECODIFICAR):
+                        img = montar_em_faixas(img, tamanho_final, modo, tarefa.cancelado)
+                    if img is None:
+                        return False
+                elif not animada:
+                    # Decodifica já (em escala reduzida, na redução rápida de JPEGs)
+                    with etapa(ETAPA_DECODIFICAR):
+                        caixa = decodificar(img, tamanho_final, fator)
+                    
+                    # Atualiza o progresso
+                    if callback_progresso:
+                        callback_progresso(30)
+                    
+                    # Verifica cancelamento
+                    if tarefa.cancelado.is_set():
+                        return False
+                    
+                    # Redimensiona a imagem se solicitado
+                    if tamanho_final is not None:
+                        with etapa(ETAPA_REDIMENSIONAR):
+                            img = redimensionar_imagem(img, tamanho_final, caixa, fator)
                 
                 # Atualiza o progresso
                 if callback_progresso:
                     callback_progresso(60)
                 
                 # Verifica cancelamento
-                if self.cancelado.is_set():
+                if tarefa.cancelado.is_set():
                     return False
                 
+                if animada:
+                    def informar_quadro(indice, total):
+                        if callback_progresso:
+                            callback_progresso(60 + int(35 * (indice + 1) / total))
+                    
+                    img = SequenciaQuadros(img, tamanho_final, informar_quadro, tarefa.cancelado)
+                
                 # Configurações para formatos específicos
                 save_options = {}
                 
@@ -216,8 +411,24 @@ class Conversor:
                     save_options["quality"] = qualidade
                     save_options["lossless"] = qualidade >= 95
                 
+                # Grava todos os quadros, com as durações e repetições da origem
+                if animada:
+                    save_options["save_all"] = True
+                    save_options["duration"] = img.duracoes
+                    if img.loop is not None:
+                        save_options["loop"] = img.loop
+                    elif formato_saida.lower() != "gif":
+                        # GIF sem repetição definida toca uma vez (no WebP e
+                        # no APNG, omitir faria repetir para sempre)
+                        save_options["loop"] = 1
+                
                 # Salva a imagem no formato desejado
-                img.save(arquivo_saida, format=formato_saida.upper(), **save_options)
+                with etapa(ETAPA_CODIFICAR):
+                    try:
+                        img.save(arquivo_saida, format=formato_saida.upper(), **save_options)
+                    except InterruptedError:
+                        # Cancelada entre dois quadros da animação
+                        return False
             
             # Atualiza o progresso
             if callback_progresso:
@@ -229,7 +440,7 @@ class Conversor:
             print(f"Erro ao converter imagem: {str(e)}")
             raise
     
-    def _converter_video(self, arquivo_entrada, arquivo_saida, formato_saida, opcoes, callback_progresso=None):
+    def _converter_video(self, arquivo_entrada, arquivo_saida, formato_saida, opcoes, tarefa, callback_progresso=None):
         """
         Converte um vídeo para o formato especificado
         
@@ -238,159 +449,124 @@ class Conversor:
             arquivo_saida (str): Caminho onde o vídeo convertido será salvo
             formato_saida (str): Formato de saída desejado
             opcoes (dict): Opções adicionais para a conversão
+            tarefa (Tarefa): Tarefa com o sinal de cancelamento da operação
             callback_progresso (function): Função de callback para atualização do progresso
             
         Returns:
             bool: True se a conversão foi bem-sucedida, False caso contrário
         """
         try:
-            # Verifica se o FFmpeg está disponível
-            try:
-                subprocess.run(
-                    ["ffmpeg", "-version"], 
-                    stdout=subprocess.PIPE, 
-                    stderr=subprocess.PIPE, 
-                    check=True
-                )
-            except (subprocess.SubprocessError, FileNotFoundError):
-                raise RuntimeError(
-                    "FFmpeg não está instalado ou não está disponível no PATH. "
-                    "Por favor, instale o FFmpeg para converter vídeos."
-                )
+            # Verifica se o FFmpeg está disponível (consultado uma vez por processo)
+            capacidades = obter_capacidades()
+            capacidades.exigir_ffmpeg("converter vídeos")
             
-            # Cria o diretório temporário para logs
-            temp_dir = tempfile.mkdtemp()
-            log_file = os.path.join(temp_dir, "ffmpeg_progress.txt")
+            # Obtém a duração e os streams em uma única sondagem (com cache)
+            # antes de iniciar o FFmpeg
+            metadados = obter_metadados(arquivo_entrada)
+            total_duration = metadados["duracao"]
             
             # Processa opções
             resolucao = opcoes.get("resolucao", "original")
             fps = opcoes.get("fps", "original")
+            recodificar = opcoes.get("recodificar", False)
             
             # Constrói o comando base
             cmd = ["ffmpeg", "-i", arquivo_entrada]
             
-            # Adiciona opções de resolução
+            # Monta os filtros de resolução e de FPS
+            filtros = []
             if resolucao != "original":
                 if resolucao == "720p":
-                    cmd.extend(["-vf", "scale=-1:720"])
+                    filtros.append("scale=-1:720")
                 elif resolucao == "1080p":
-                    cmd.extend(["-vf", "scale=-1:1080"])
+                    filtros.append("scale=-1:1080")
                 elif resolucao == "480p":
-                    cmd.extend(["-vf", "scale=-1:480"])
+                    filtros.append("scale=-1:480")
                 elif resolucao == "360p":
-                    cmd.extend(["-vf", "scale=-1:360"])
+                    filtros.append("scale=-1:360")
             
-            # Adiciona opções de FPS
             if fps != "original":
                 try:
-                    fps_value = int(fps)
-                    if "-vf" in cmd:
-                        # Se já tem um filtro de vídeo, concatena
-                        vf_index = cmd.index("-vf")
-                        cmd[vf_index + 1] = f"{cmd[vf_index + 1]},fps={fps_value}"
-                    else:
-                        # Caso contrário, adiciona novo filtro
-                        cmd.extend(["-vf", f"fps={fps_value}"])
+                    filtros.append(f"fps={int(fps)}")
                 except ValueError:
                     pass
             
-            # Adiciona configurações de codec com base no formato
+            # Seleciona explicitamente os streams principais (ignorando capas)
+            video = stream_video(metadados)
+            audio = stream_audio(metadados)
+            if video:
+                cmd.extend(["-map", f"0:{video['indice']}"])
+            if audio:
+                cmd.extend(["-map", f"0:{audio['indice']}"])
+            
+            # Streams cujo codec já é aceito pelo contêiner de saída são
+            # copiados (remux), o que leva segundos em vez de minutos; o
+            # vídeo só pode ser copiado se nenhum filtro for aplicado
+            copiar_video = (
+                not recodificar and not filtros and video is not None
+                and codec_compativel(formato_saida, "video", video["codec"])
+            )
+            copiar_audio = (
+                not recodificar and audio is not None
+                and codec_compativel(formato_saida, "audio", audio["codec"])
+            )
+            
+            # Configurações de codec com base no formato
+            # (usa uma alternativa disponível se o encoder preferido faltar)
             if formato_saida == "mp4":
-                cmd.extend(["-c:v", "libx264", "-crf", "23", "-c:a", "aac", "-b:a", "128k"])
+                encoder = capacidades.escolher_encoder("libx264")
+                args_video = ["-c:v", encoder, *argumentos_qualidade_video(encoder, "23")]
+                args_audio = ["-c:a", capacidades.escolher_encoder("aac"), "-b:a", "128k"]
             elif formato_saida == "webm":
-                cmd.extend(["-c:v", "libvpx-vp9", "-crf", "30", "-b:v", "0", "-c:a", "libopus"])
+                encoder = capacidades.escolher_encoder("libvpx-vp9")
+                args_video = ["-c:v", encoder, *argumentos_qualidade_video(encoder, "30")]
+                args_audio = ["-c:a", capacidades.escolher_encoder("libopus")]
             elif formato_saida == "mkv":
-                cmd.extend(["-c:v", "libx264", "-crf", "23", "-c:a", "flac"])
+                encoder = capacidades.escolher_encoder("libx264")
+                args_video = ["-c:v", encoder, *argumentos_qualidade_video(encoder, "23")]
+                args_audio = ["-c:a", capacidades.escolher_encoder("flac")]
             elif formato_saida == "avi":
-                cmd.extend(["-c:v", "mpeg4", "-q:v", "6", "-c:a", "libmp3lame", "-q:a", "3"])
+                args_video = ["-c:v", capacidades.escolher_encoder("mpeg4"), "-q:v", "6"]
+                args_audio = ["-c:a", capacidades.escolher_encoder("libmp3lame"), "-q:a", "3"]
             elif formato_saida == "mov":
-                cmd.extend(["-c:v", "prores_ks", "-profile:v", "2", "-c:a", "pcm_s16le"])
+                encoder = capacidades.escolher_encoder("prores_ks")
+                args_video = ["-c:v", encoder, "-profile:v", "2"]
+                args_audio = ["-c:a", capacidades.escolher_encoder("pcm_s16le")]
+            else:
+                args_video = []
+                args_audio = []
+            
+            # Adiciona as configurações de vídeo (cópia ou recodificação)
+            if copiar_video:
+                cmd.extend(["-c:v", "copy"])
+                # Players da Apple só reconhecem HEVC com a etiqueta hvc1
+                if video["codec"] == "hevc" and formato_saida in ("mp4", "mov"):
+                    cmd.extend(["-tag:v", "hvc1"])
+            else:
+                if filtros:
+                    cmd.extend(["-vf", ",".join(filtros)])
+                cmd.extend(args_video)
+            
+            # Adiciona as configurações de áudio (cópia ou recodificação)
+            if copiar_audio:
+                cmd.extend(["-c:a", "copy"])
+            else:
+                cmd.extend(args_audio)
             
             # Adiciona arquivo de saída e opções de progresso
             cmd.extend([
-                "-progress", log_file,
                 "-y",
                 arquivo_saida
             ])
             
-            # Inicia o processo FFmpeg
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            # Obtém a duração total do vídeo
-            duration_cmd = [
-                "ffprobe",
-                "-v", "error",
-                "-show_entries", "format=duration",
-                "-of", "json",
-                arquivo_entrada
-            ]
-            
-            duration_process = subprocess.run(
-                duration_cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            duration_data = json.loads(duration_process.stdout)
-            total_duration = float(duration_data["format"]["duration"])
-            
-            # Monitora o progresso
-            last_progress = 0
-            while process.poll() is None:
-                # Verifica cancelamento
-                if self.cancelado.is_set():
-                    process.terminate()
-                    shutil.rmtree(temp_dir, ignore_errors=True)
-                    return False
-                
-                # Tenta ler o arquivo de log
-                try:
-                    if os.path.exists(log_file):
-                        with open(log_file, "r") as f:
-                            content = f.read()
-                            if "out_time_ms" in content:
-                                # Extrai o tempo atual
-                                time_ms = 0
-                                for line in content.split("\n"):
-                                    if line.startswith("out_time_ms="):
-                                        time_ms = int(line.split("=")[1]) / 1000000  # Converter para segundos
-                                        break
-                                
-                                progress = min(int((time_ms / total_duration) * 100), 99)
-                                
-                                # Atualiza o progresso se houve mudança
-                                if progress > last_progress:
-                                    last_progress = progress
-                                    if callback_progresso:
-                                        callback_progresso(progress)
-                except Exception:
-                    pass
-                
-                time.sleep(0.5)
-            
-            # Limpa o diretório temporário
-            shutil.rmtree(temp_dir, ignore_errors=True)
-            
-            # Verifica se o processo foi bem-sucedido
-            if process.returncode == 0:
-                if callback_progresso:
-                    callback_progresso(100)
-                return True
-            else:
-                error = process.stderr.read() if process.stderr else "Erro desconhecido"
-                raise RuntimeError(f"Erro no FFmpeg: {error}")
+            # Executa o FFmpeg acompanhando o progresso
+            return executar_ffmpeg(cmd, total_duration, tarefa, callback_progresso)
         
         except Exception as e:
             print(f"Erro ao converter vídeo: {str(e)}")
             raise
     
-    def _converter_audio(self, arquivo_entrada, arquivo_saida, formato_saida, opcoes, callback_progresso=None):
+    def _converter_audio(self, arquivo_entrada, arquivo_saida, formato_saida, opcoes, tarefa, callback_progresso=None):
         """
         Converte um arquivo de áudio para o formato especificado
         
@@ -399,29 +575,21 @@ class Conversor:
             arquivo_saida (str): Caminho onde o áudio convertido será salvo
             formato_saida (str): Formato de saída desejado
             opcoes (dict): Opções adicionais para a conversão
+            tarefa (Tarefa): Tarefa com o sinal de cancelamento da operação
             callback_progresso (function): Função de callback para atualização do progresso
             
         Returns:
             bool: True se a conversão foi bem-sucedida, False caso contrário
         """
         try:
-            # Verifica se o FFmpeg está disponível
-            try:
-                subprocess.run(
-                    ["ffmpeg", "-version"], 
-                    stdout=subprocess.PIPE, 
-                    stderr=subprocess.PIPE, 
-                    check=True
-                )
-            except (subprocess.SubprocessError, FileNotFoundError):
-                raise RuntimeError(
-                    "FFmpeg não está instalado ou não está disponível no PATH. "
-                    "Por favor, instale o FFmpeg para converter áudios."
-                )
+            # Verifica se o FFmpeg está disponível (consultado uma vez por processo)
+            capacidades = obter_capacidades()
+            capacidades.exigir_ffmpeg("converter áudios")
             
-            # Cria o diretório temporário para logs
-            temp_dir = tempfile.mkdtemp()
-            log_file = os.path.join(temp_dir, "ffmpeg_progress.txt")
+            # Obtém a duração e os streams em uma única sondagem (com cache)
+            # antes de iniciar o FFmpeg
+            metadados = obter_metadados(arquivo_entrada)
+            total_duration = metadados["duracao"]
             
             # Processa opções
             bitrate = opcoes.get("bitrate", "192k")
@@ -432,230 +600,112 @@ class Conversor:
             
             # Adiciona configurações de codec com base no formato
             if formato_saida == "mp3":
-                cmd.extend(["-c:a", "libmp3lame", "-b:a", bitrate])
+                cmd.extend(["-c:a", capacidades.escolher_encoder("libmp3lame"), "-b:a", bitrate])
             elif formato_saida == "ogg":
-                cmd.extend(["-c:a", "libvorbis", "-b:a", bitrate])
+                cmd.extend(["-c:a", capacidades.escolher_encoder("libvorbis"), "-b:a", bitrate])
             elif formato_saida == "flac":
-                cmd.extend(["-c:a", "flac"])
+                cmd.extend(["-c:a", capacidades.escolher_encoder("flac")])
             elif formato_saida == "wav":
-                cmd.extend(["-c:a", "pcm_s16le"])
+                cmd.extend(["-c:a", capacidades.escolher_encoder("pcm_s16le")])
             elif formato_saida == "aac":
-                cmd.extend(["-c:a", "aac", "-b:a", bitrate, "-strict", "experimental"])
+                cmd.extend(["-c:a", capacidades.escolher_encoder("aac"), "-b:a", bitrate, "-strict", "experimental"])
             
             # Adiciona configuração de canais
             cmd.extend(["-ac", canais])
             
             # Adiciona arquivo de saída e opções de progresso
             cmd.extend([
-                "-progress", log_file,
                 "-y",
                 arquivo_saida
             ])
             
-            # Inicia o processo FFmpeg
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            # Obtém a duração total do áudio
-            duration_cmd = [
-                "ffprobe",
-                "-v", "error",
-                "-show_entries", "format=duration",
-                "-of", "json",
-                arquivo_entrada
-            ]
-            
-            duration_process = subprocess.run(
-                duration_cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            duration_data = json.loads(duration_process.stdout)
-            total_duration = float(duration_data["format"]["duration"])
-            
-            # Monitora o progresso
-            last_progress = 0
-            while process.poll() is None:
-                # Verifica cancelamento
-                if self.cancelado.is_set():
-                    process.terminate()
-                    shutil.rmtree(temp_dir, ignore_errors=True)
-                    return False
-                
-                # Tenta ler o arquivo de log
-                try:
-                    if os.path.exists(log_file):
-                        with open(log_file, "r") as f:
-                            content = f.read()
-                            if "out_time_ms" in content:
-                                # Extrai o tempo atual
-                                time_ms = 0
-                                for line in content.split("\n"):
-                                    if line.startswith("out_time_ms="):
-                                        time_ms = int(line.split("=")[1]) / 1000000  # Converter para segundos
-                                        break
-                                
-                                progress = min(int((time_ms / total_duration) * 100), 99)
-                                
-                                # Atualiza o progresso se houve mudança
-                                if progress > last_progress:
-                                    last_progress = progress
-                                    if callback_progresso:
-                                        callback_progresso(progress)
-                except Exception:
-                    pass
-                
-                time.sleep(0.5)
-            
-            # Limpa o diretório temporário
-            shutil.rmtree(temp_dir, ignore_errors=True)
-            
-            # Verifica se o processo foi bem-sucedido
-            if process.returncode == 0:
-                if callback_progresso:
-                    callback_progresso(100)
-                return True
-            else:
-                error = process.stderr.read() if process.stderr else "Erro desconhecido"
-                raise RuntimeError(f"Erro no FFmpeg: {error}")
+            # Executa o FFmpeg acompanhando o progresso
+            return executar_ffmpeg(cmd, total_duration, tarefa, callback_progresso)
         
         except Exception as e:
             print(f"Erro ao converter áudio: {str(e)}")
             raise
     
-    def _extrair_audio_de_video(self, arquivo_entrada, arquivo_saida, opcoes, callback_progresso=None):
+    def _extrair_audio_de_video(self, arquivo_entrada, arquivo_saida, formato_saida, opcoes, tarefa, callback_progresso=None):
         """
         Extrai o áudio de um arquivo de vídeo
         
+        O stream de áudio é copiado sem recodificação quando o formato de saída
+        aceita o codec original e nenhuma mudança de taxa de bits ou de canais
+        foi pedida; caso contrário, é recodificado.
+        
         Args:
             arquivo_entrada (str): Caminho do vídeo
             arquivo_saida (str): Caminho onde o áudio será salvo
+            formato_saida (str): Formato do áudio extraído
             opcoes (dict): Opções adicionais para a extração
+            tarefa (Tarefa): Tarefa com o sinal de cancelamento da operação
             callback_progresso (function): Função de callback para atualização do progresso
             
         Returns:
             bool: True se a extração foi bem-sucedida, False caso contrário
         """
         try:
-            # Verifica se o FFmpeg está disponível
-            try:
-                subprocess.run(
-                    ["ffmpeg", "-version"], 
-                    stdout=subprocess.PIPE, 
-                    stderr=subprocess.PIPE, 
-                    check=True
-                )
-            except (subprocess.SubprocessError, FileNotFoundError):
-                raise RuntimeError(
-                    "FFmpeg não está instalado ou não está disponível no PATH. "
-                    "Por favor, instale o FFmpeg para extrair áudio de vídeos."
-                )
+            # Verifica se o FFmpeg está disponível (consultado uma vez por processo)
+            capacidades = obter_capacidades()
+            capacidades.exigir_ffmpeg("extrair áudio de vídeos")
+            
+            # Obtém a duração e os streams em uma única sondagem (com cache)
+            # antes de iniciar o FFmpeg
+            metadados = obter_metadados(arquivo_entrada)
+            total_duration = metadados["duracao"]
             
-            # Cria o diretório temporário para logs
-            temp_dir = tempfile.mkdtemp()
-            log_file = os.path.join(temp_dir, "ffmpeg_progress.txt")
+            audio = stream_audio(metadados)
+            if audio is None:
+                raise ValueError(f"O vídeo não possui áudio: {arquivo_entrada}")
             
             # Processa opções
             bitrate = opcoes.get("bitrate", "192k")
-            canais = opcoes.get("canais", "2")
+            canais = opcoes.get("canais")
             
-            # Comando para extrair o áudio
+            # Comando para extrair o áudio (apenas o stream principal)
             cmd = [
                 "ffmpeg",
                 "-i", arquivo_entrada,
-                "-vn",  # Não usar vídeo
-                "-c:a", "libmp3lame",  # Usar codec MP3
-                "-b:a", bitrate,
-                "-ac", canais,
-                "-progress", log_file,
-                "-y",
-                arquivo_saida
+                "-map", f"0:{audio['indice']}",
+                "-vn", "-sn", "-dn"  # Não usar vídeo, legendas ou dados
             ]
             
-            # Inicia o processo FFmpeg
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            # Obtém a duração total do vídeo
-            duration_cmd = [
-                "ffprobe",
-                "-v", "error",
-                "-show_entries", "format=duration",
-                "-of", "json",
-                arquivo_entrada
-            ]
-            
-            duration_process = subprocess.run(
-                duration_cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            duration_data = json.loads(duration_process.stdout)
-            total_duration = float(duration_data["format"]["duration"])
-            
-            # Monitora o progresso
-            last_progress = 0
-            while process.poll() is None:
-                # Verifica cancelamento
-                if self.cancelado.is_set():
-                    process.terminate()
-                    shutil.rmtree(temp_dir, ignore_errors=True)
-                    return False
-                
-                # Tenta ler o arquivo de log
-                try:
-                    if os.path.exists(log_file):
-                        with open(log_file, "r") as f:
-                            content = f.read()
-                            if "out_time_ms" in content:
-                                # Extrai o tempo atual
-                                time_ms = 0
-                                for line in content.split("\n"):
-                                    if line.startswith("out_time_ms="):
-                                        time_ms = int(line.split("=")[1]) / 1000000  # Converter para segundos
-                                        break
-                                
-                                progress = min(int((time_ms / total_duration) * 100), 99)
-                                
-                                # Atualiza o progresso se houve mudança
-                                if progress > last_progress:
-                                    last_progress = progress
-                                    if callback_progresso:
-                                        callback_progresso(progress)
-                except Exception:
-                    pass
+            if self._pode_copiar_audio(audio, formato_saida, opcoes):
+                # Apenas demultiplexa o stream (segundos, mesmo em vídeos longos)
+                cmd.extend(["-c:a", "copy"])
+            else:
+                # Recodifica com o codec adequado ao formato de saída
+                if formato_saida in ("m4a", "aac"):
+                    cmd.extend(["-c:a", capacidades.escolher_encoder("aac"), "-b:a", bitrate])
+                elif formato_saida == "ogg":
+                    cmd.extend(["-c:a", capacidades.escolher_encoder("libvorbis"), "-b:a", bitrate])
+                elif formato_saida == "mka":
+                    cmd.extend(["-c:a", capacidades.escolher_encoder("libopus"), "-b:a", bitrate])
+                elif formato_saida == "flac":
+                    cmd.extend(["-c:a", capacidades.escolher_encoder("flac")])
+                elif formato_saida == "wav":
+                    cmd.extend(["-c:a", capacidades.escolher_encoder("pcm_s16le")])
+                else:
+                    cmd.extend(["-c:a", capacidades.escolher_encoder("libmp3lame"), "-b:a", bitrate])
                 
-                time.sleep(0.5)
+                if canais:
+                    cmd.extend(["-ac", str(canais)])
             
-            # Limpa o diretório temporário
-            shutil.rmtree(temp_dir, ignore_errors=True)
+            # Adiciona arquivo de saída
+            cmd.extend([
+                "-y",
+                arquivo_saida
+            ])
             
-            # Verifica se o processo foi bem-sucedido
-            if process.returncode == 0:
-                if callback_progresso:
-                    callback_progresso(100)
-                return True
-            else:
-                error = process.stderr.read() if process.stderr else "Erro desconhecido"
-                raise RuntimeError(f"Erro no FFmpeg: {error}")
+            # Executa o FFmpeg acompanhando o progresso
+            return executar_ffmpeg(cmd, total_duration, tarefa, callback_progresso)
         
         except Exception as e:
             print(f"Erro ao extrair áudio: {str(e)}")
             raise
     
-    def _converter_documento(self, arquivo_entrada, arquivo_saida, formato_saida, opcoes, callback_progresso=None):
+    def _converter_documento(self, arquivo_entrada, arquivo_saida, formato_saida, opcoes, tarefa, callback_progresso=None):
         """
         Converte um documento para o formato especificado
         
@@ -664,6 +714,7 @@ class Conversor:
             arquivo_saida (str): Caminho onde o documento convertido será salvo
             formato_saida (str): Formato de saída desejado
             opcoes (dict): Opções adicionais para a conversão
+            tarefa (Tarefa): Tarefa com o sinal de cancelamento da operação
             callback_progresso (function): Função de callback para atualização do progresso
             
         Returns:
@@ -679,7 +730,7 @@ class Conversor:
         
         try:
             # Verifica cancelamento
-            if self.cancelado.is_set():
+            if tarefa.cancelado.is_set():
                 return False
             
             # Obtém as extensões
@@ -691,7 +742,7 @@ class Conversor:
                 callback_progresso(20)
             
             # Verifica cancelamento
-            if self.cancelado.is_set():
+            if tarefa.cancelado.is_set():
                 return False
             
             # Verifica se temos suporte para a conversão
@@ -710,7 +761,7 @@ class Conversor:
                         with open(arquivo_saida, 'w', encoding='utf-8') as output:
                             for i, page in enumerate(reader.pages):
                                 # Verifica cancelamento
-                                if self.cancelado.is_set():
+                                if tarefa.cancelado.is_set():
                                     return False
                                 
                                 # Extrai o texto da página
@@ -774,8 +825,78 @@ class Conversor:
             print(f"Erro ao converter documento: {str(e)}")
             raise
     
+    def _pode_copiar_audio(self, audio, formato_saida, opcoes):
+        """
+        Indica se o stream de áudio pode ser extraído sem recodificação
+        
+        Args:
+            audio (dict): Stream de áudio (ver metadados.stream_audio)
+            formato_saida (str): Formato do áudio extraído
+            opcoes (dict): Opções da extração
+            
+        Returns:
+            bool: True se o stream pode ser copiado
+        """
+        # Mudança de taxa de bits exige recodificação
+        if opcoes.get("bitrate") or opcoes.get("recodificar"):
+            return False
+        
+        # Mudança no número de canais também
+        canais = opcoes.get("canais")
+        if canais and str(canais) != str(audio.get("canais")):
+            return False
+        
+        return codec_compativel(formato_saida, "audio", audio["codec"])
+    
+    def formato_extracao_audio(self, arquivo_entrada, opcoes=None):
+        """
+        Escolhe o formato do áudio extraído de um vídeo no modo "auto"
+        
+        Usa o contêiner que aceita o codec original (ex.: AAC em m4a, Opus em
+        ogg) quando o stream pode ser copiado e MP3 quando precisa ser
+        recodificado.
+        
+        Args:
+            arquivo_entrada (str): Caminho do vídeo
+            opcoes (dict): Opções da extração
+            
+        Returns:
+            str: Formato (extensão) do áudio extraído
+        """
+        if opcoes is None:
+            opcoes = {}
+        
+        audio = stream_audio(obter_metadados(arquivo_entrada))
+        if audio is None:
+            # A extração informará o erro
+            return "mp3"
+        
+        formato = CONTEINER_AUDIO.get(audio["codec"], "mka")
+        if self._pode_copiar_audio(audio, formato, opcoes):
+            return formato
+        return "mp3"
+    
+    def fila_execucao(self, arquivo_entrada):
+        """
+        Determina a fila do agendador adequada para converter o arquivo
+        
+        Args:
+            arquivo_entrada (str): Caminho do arquivo a ser convertido
+            
+        Returns:
+            str: Nome da fila de execução
+        """
+        _, extensao = os.path.splitext(arquivo_entrada)
+        tipo_arquivo = self.extensao_para_tipo.get(extensao.lower())
+        
+        if tipo_arquivo in ("vídeo", "áudio"):
+            return FILA_CPU
+        elif tipo_arquivo == "imagem":
+            return FILA_IMAGEM
+        return FILA_IO
+    
     def cancelar(self):
         """
-        Cancela a operação de conversão em andamento
+        Cancela todas as operações de conversão em andamento
         """
-        self.cancelado.set()
\ No newline at end of file
+        self.tarefas.cancelar_todas()
\ No newline at end of file
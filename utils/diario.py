@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Módulo que contém o diário de lotes, que permite retomar um lote
+interrompido sem refazer os arquivos já concluídos
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+# Nome do banco do diário, criado no diretório de saída do lote
+NOME_DIARIO = ".conversor_diario.sqlite3"
+
+# Estados registrados para cada arquivo
+ESTADO_NA_FILA = "na_fila"
+ESTADO_EXECUTANDO = "executando"
+ESTADO_CONCLUIDO = "concluido"
+ESTADO_ERRO = "erro"
+ESTADO_CANCELADO = "cancelado"
+
+
+def caminho_parcial(arquivo_saida):
+    """
+    Retorna o nome temporário usado enquanto a saída é escrita
+
+    O arquivo fica oculto no mesmo diretório (o que permite renomeá-lo de
+    forma atômica) e mantém a extensão, usada pelo FFmpeg e pelo Pillow para
+    escolher o formato.
+
+    Args:
+        arquivo_saida (str): Caminho final da saída
+
+    Returns:
+        str: Caminho temporário
+    """
+    diretorio, nome = os.path.split(arquivo_saida)
+    base, extensao = os.path.splitext(nome)
+    return os.path.join(diretorio, f".{base}.{uuid.uuid4().hex[:8]}.parcial{extensao}")
+
+
+def impressao_digital(arquivo):
+    """
+    Retorna a impressão digital (tamanho e data de modificação) de um arquivo
+
+    Args:
+        arquivo (str): Caminho do arquivo
+
+    Returns:
+        tuple: (tamanho, mtime_ns) ou (None, None) se o arquivo não existir
+    """
+    try:
+        info = os.stat(arquivo)
+    except OSError:
+        return None, None
+    return info.st_size, info.st_mtime_ns
+
+
+class DiarioLote:
+    """
+    Registro persistente (SQLite) do estado de cada arquivo de um lote
+
+    Cada arquivo é identificado pelo caminho de saída e guarda a impressão
+    digital da entrada e os parâmetros da operação, de modo que um arquivo
+    só é considerado concluído se a entrada e os parâmetros não mudaram e a
+    saída ainda existe.
+
+    O banco usa o modo WAL com synchronous=NORMAL: cada mudança de estado é
+    um append ao log, sem fsync a cada commit. Uma queda de energia pode
+    perder as últimas mudanças, o que ao retomar apenas refaz esses arquivos.
+    """
+
+    def __init__(self, diretorio_saida):
+        """
+        Abre (ou cria) o diário do diretório de saída
+
+        Args:
+            diretorio_saida (str): Diretório de saída do lote
+        """
+        os.makedirs(diretorio_saida, exist_ok=True)
+        self.caminho = os.path.join(diretorio_saida, NOME_DIARIO)
+        self._lock = threading.Lock()
+        self._conexao = sqlite3.connect(self.caminho, timeout=30, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS tarefas ("
+            " saida TEXT PRIMARY KEY,"
+            " entrada TEXT NOT NULL,"
+            " tamanho INTEGER,"
+            " mtime_ns INTEGER,"
+            " operacao TEXT NOT NULL,"
+            " parametros TEXT NOT NULL,"
+            " estado TEXT NOT NULL,"
+            " erro TEXT,"
+            " atualizado REAL NOT NULL)"
+        )
+        self._conexao.commit()
+
+    @staticmethod
+    def _parametros(parametros):
+        """
+        Converte os parâmetros da operação para a forma guardada no banco
+
+        Args:
+            parametros (dict): Formato, nível e opções da operação
+
+        Returns:
+            str: JSON canônico
+        """
+        return json.dumps(parametros or {}, sort_keys=True, default=str)
+
+    def registrar(self, entrada, saida, operacao, parametros):
+        """
+        Registra um arquivo colocado na fila
+
+        Args:
+            entrada (str): Arquivo de entrada
+            saida (str): Arquivo de saída
+            operacao (str): "converter" ou "comprimir"
+            parametros (dict): Formato, nível e opções da operação
+        """
+        self.registrar_varios([(entrada, saida)], operacao, parametros)
+
+    def registrar_varios(self, arquivos, operacao, parametros):
+        """
+        Registra vários arquivos colocados na fila em uma única transação
+
+        Args:
+            arquivos (list): Tuplas (entrada, saída)
+            operacao (str): "converter" ou "comprimir"
+            parametros (dict): Formato, nível e opções da operação
+        """
+        parametros = self._parametros(parametros)
+        agora = time.time()
+        linhas = [
+            (
+                os.path.abspath(saida), os.path.abspath(entrada), *impressao_digital(entrada),
+                operacao, parametros, ESTADO_NA_FILA, agora
+            )
+            for entrada, saida in arquivos
+        ]
+        with self._lock:
+            self._conexao.executemany(
+                "INSERT OR REPLACE INTO tarefas"
+                " (saida, entrada, tamanho, mtime_ns, operacao, parametros, estado, erro, atualizado)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, NULL, ?)",
+                linhas
+            )
+            self._conexao.commit()
+
+    def marcar(self, saida, estado, erro=None):
+        """
+        Atualiza o estado de um arquivo
+
+        Args:
+            saida (str): Arquivo de saída
+            estado (str): Novo estado
+            erro (str): Mensagem de erro, se houver
+        """
+        with self._lock:
+            self._conexao.execute(
+                "UPDATE tarefas SET estado = ?, erro = ?, atualizado = ? WHERE saida = ?",
+                (estado, erro, time.time(), os.path.abspath(saida))
+            )
+            self._conexao.commit()
+
+    def concluido(self, entrada, saida, operacao, parametros):
+        """
+        Indica se um arquivo já foi concluído com a mesma entrada e parâmetros
+
+        Args:
+            entrada (str): Arquivo de entrada
+            saida (str): Arquivo de saída
+            operacao (str): "converter" ou "comprimir"
+            parametros (dict): Formato, nível e opções da operação
+
+        Returns:
+            bool: True se o arquivo pode ser ignorado
+        """
+        if not os.path.exists(saida):
+            return False
+
+        tamanho, mtime_ns = impressao_digital(entrada)
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT 1 FROM tarefas WHERE saida = ? AND entrada = ? AND tamanho = ?"
+                " AND mtime_ns = ? AND operacao = ? AND parametros = ? AND estado = ?",
+                (
+                    os.path.abspath(saida), os.path.abspath(entrada), tamanho, mtime_ns,
+                    operacao, self._parametros(parametros), ESTADO_CONCLUIDO
+                )
+            ).fetchone()
+        return linha is not None
+
+    def pendentes(self, operacao=None):
+        """
+        Lista os arquivos que não foram concluídos (inclusive os que estavam
+        em execução quando o lote foi interrompido)
+
+        Args:
+            operacao (str): Filtra pela operação (todas se não informada)
+
+        Returns:
+            list: Dicionários com entrada, saída, operação, parâmetros e estado
+        """
+        consulta = (
+            "SELECT entrada, saida, operacao, parametros, estado FROM tarefas"
+            " WHERE estado != ?"
+        )
+        argumentos = [ESTADO_CONCLUIDO]
+        if operacao is not None:
+            consulta += " AND operacao = ?"
+            argumentos.append(operacao)
+
+        with self._lock:
+            linhas = self._conexao.execute(consulta + " ORDER BY rowid", argumentos).fetchall()
+
+        return [
+            {
+                "entrada": entrada,
+                "saida": saida,
+                "operacao": operacao_linha,
+                "parametros": json.loads(parametros),
+                "estado": estado
+            }
+            for entrada, saida, operacao_linha, parametros, estado in linhas
+        ]
+
+    def resumo(self):
+        """
+        Conta os arquivos em cada estado
+
+        Returns:
+            dict: Quantidade de arquivos por estado
+        """
+        with self._lock:
+            return dict(self._conexao.execute(
+                "SELECT estado, COUNT(*) FROM tarefas GROUP BY estado"
+            ).fetchall())
+
+    def fechar(self):
+        """
+        Fecha o banco do diário
+        """
+        with self._lock:
+            self._conexao.close()
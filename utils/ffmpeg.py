@@ -0,0 +1,541 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Módulo que contém funções auxiliares para o uso do FFmpeg e do FFprobe
+"""
+
+import re
+import subprocess
+import threading
+from collections import deque
+
+from utils.agendador import encerrar_processo
+from utils.metricas import ETAPA_CODIFICAR, etapa
+
+# Alternativas, em ordem de preferência, para cada encoder usado pelos motores
+ALTERNATIVAS_ENCODER = {
+    "libx264": ["libx264", "libopenh264", "mpeg4"],
+    "libvpx-vp9": ["libvpx-vp9", "libvpx"],
+    "libopus": ["libopus", "libvorbis", "opus"],
+    "libvorbis": ["libvorbis", "vorbis"],
+    "libmp3lame": ["libmp3lame", "libshine"],
+    "prores_ks": ["prores_ks", "prores", "prores_aw"],
+    "aac": ["aac", "libfdk_aac"],
+    "flac": ["flac"],
+    "pcm_s16le": ["pcm_s16le"],
+    "mpeg4": ["mpeg4"]
+}
+
+# Encoders de vídeo que aceitam codificação em duas passagens (os demais
+# usam uma passagem com a taxa de bits limitada)
+ENCODERS_DUAS_PASSAGENS = ("libx264", "libx265", "libvpx-vp9", "libvpx", "mpeg4")
+
+# Encoders de vídeo cuja qualidade é controlada pelo CRF (ver
+# argumentos_qualidade_video)
+ENCODERS_CRF = ("libx264", "libx265", "libvpx-vp9", "libvpx", "mpeg4")
+
+# Resumo impresso pelos filtros de medição de qualidade ao final
+_REGEX_MEDICAO = {
+    "ssim": re.compile(r"SSIM .*All:\s*([\d.]+|inf)"),
+    "psnr": re.compile(r"PSNR .*average:\s*([\d.]+|inf)")
+}
+
+# Codecs (nomes do FFprobe) que cada contêiner de saída aceita sem
+# recodificação, usados para decidir quando basta copiar os streams
+CODECS_CONTEINER = {
+    "mp4": {
+        "video": {"h264", "hevc", "av1", "vp9", "mpeg4"},
+        "audio": {"aac", "mp3", "opus", "flac", "alac", "ac3", "eac3"}
+    },
+    "mov": {
+        "video": {"h264", "hevc", "prores", "mpeg4", "mjpeg"},
+        "audio": {"aac", "mp3", "alac", "ac3", "pcm_s16le", "pcm_s24le"}
+    },
+    "mkv": {
+        "video": {"h264", "hevc", "av1", "vp8", "vp9", "mpeg4", "mpeg2video", "prores", "theora"},
+        "audio": {"aac", "mp3", "opus", "vorbis", "flac", "alac", "ac3", "eac3", "dts", "pcm_s16le", "pcm_s24le"}
+    },
+    "webm": {
+        "video": {"vp8", "vp9", "av1"},
+        "audio": {"opus", "vorbis"}
+    },
+    "avi": {
+        "video": {"mpeg4", "mjpeg"},
+        "audio": {"mp3", "ac3", "pcm_s16le"}
+    },
+    # Contêineres somente de áudio (extração de áudio de vídeos)
+    "m4a": {"audio": {"aac", "alac", "mp3"}},
+    "ogg": {"audio": {"opus", "vorbis", "flac"}},
+    "mka": {"audio": {"aac", "mp3", "opus", "vorbis", "flac", "alac", "ac3", "eac3", "dts", "pcm_s16le", "pcm_s24le"}},
+    "mp3": {"audio": {"mp3"}},
+    "flac": {"audio": {"flac"}},
+    "aac": {"audio": {"aac"}},
+    "wav": {"audio": {"pcm_s16le", "pcm_s24le", "pcm_f32le"}}
+}
+
+# Contêiner de áudio usado para copiar cada codec sem recodificação
+# (codecs ausentes vão para o Matroska, que aceita praticamente todos)
+CONTEINER_AUDIO = {
+    "aac": "m4a",
+    "alac": "m4a",
+    "opus": "ogg",
+    "vorbis": "ogg",
+    "mp3": "mp3",
+    "flac": "flac",
+    "pcm_s16le": "wav",
+    "pcm_s24le": "wav"
+}
+
+# Linhas da listagem de encoders ("V....D libx264  ...") e de filtros
+# ("TSC scale  V->V  ...")
+_REGEX_ENCODER = re.compile(r"^\s*[VAS][F.][S.][X.][B.][D.]\s+(\S+)")
+_REGEX_FILTRO = re.compile(r"^\s*[T.][S.][C.]\s+(\S+)\s+\S*->\S*")
+
+# Opções listadas na ajuda completa do FFmpeg ("-threads  <n>  ...")
+_REGEX_OPCAO = re.compile(r"^-(\w+)")
+
+# Intervalo entre os relatórios de progresso (quando o FFmpeg permite ajustá-lo)
+INTERVALO_PROGRESSO = 0.25
+
+# Quantidade de linhas finais da saída de erro mantidas para mensagens de erro
+LINHAS_ERRO = 40
+
+
+class CapacidadesFFmpeg:
+    """
+    Versões, encoders e filtros disponíveis no FFmpeg instalado
+    """
+
+    def __init__(self):
+        """
+        Consulta o FFmpeg e o FFprobe uma única vez
+        """
+        self.versao_ffmpeg = self._consultar_versao("ffmpeg")
+        self.versao_ffprobe = self._consultar_versao("ffprobe")
+
+        self.encoders = set()
+        self.filtros = set()
+        self.opcoes = set()
+
+        if self.versao_ffmpeg:
+            for linha in self._executar(["ffmpeg", "-hide_banner", "-encoders"]).splitlines():
+                correspondencia = _REGEX_ENCODER.match(linha)
+                if correspondencia and correspondencia.group(1) != "=":
+                    self.encoders.add(correspondencia.group(1))
+
+            for linha in self._executar(["ffmpeg", "-hide_banner", "-filters"]).splitlines():
+                correspondencia = _REGEX_FILTRO.match(linha)
+                if correspondencia:
+                    self.filtros.add(correspondencia.group(1))
+
+            # Opções aceitas (algumas, como -stats_period, são recentes)
+            for linha in self._executar(["ffmpeg", "-hide_banner", "-h", "long"]).splitlines():
+                correspondencia = _REGEX_OPCAO.match(linha)
+                if correspondencia:
+                    self.opcoes.add(correspondencia.group(1))
+
+    @staticmethod
+    def _executar(cmd):
+        """
+        Executa um comando e retorna a sua saída
+
+        Args:
+            cmd (list): Comando a ser executado
+
+        Returns:
+            str: Saída padrão do comando (vazia em caso de erro)
+        """
+        try:
+            processo = subprocess.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                check=True
+            )
+            return processo.stdout
+        except (subprocess.SubprocessError, FileNotFoundError):
+            return ""
+
+    def _consultar_versao(self, programa):
+        """
+        Obtém a versão de um programa do pacote FFmpeg
+
+        Args:
+            programa (str): "ffmpeg" ou "ffprobe"
+
+        Returns:
+            str: Versão encontrada ou None se o programa não estiver disponível
+        """
+        saida = self._executar([programa, "-version"])
+        if not saida:
+            return None
+
+        # Primeira linha: "ffmpeg version 7.0.2 Copyright ..."
+        partes = saida.splitlines()[0].split()
+        return partes[2] if len(partes) > 2 else "desconhecida"
+
+    def exigir_ffmpeg(self, acao):
+        """
+        Garante que o FFmpeg e o FFprobe estejam disponíveis
+
+        Args:
+            acao (str): Descrição da ação, usada na mensagem de erro
+
+        Raises:
+            RuntimeError: Se algum dos programas não estiver disponível
+        """
+        if not self.versao_ffmpeg:
+            raise RuntimeError(
+                "FFmpeg não está instalado ou não está disponível no PATH. "
+                f"Por favor, instale o FFmpeg para {acao}."
+            )
+        if not self.versao_ffprobe:
+            raise RuntimeError(
+                "FFprobe não está instalado ou não está disponível no PATH. "
+                f"Por favor, instale o FFmpeg completo para {acao}."
+            )
+
+    def possui_encoder(self, encoder):
+        """
+        Indica se um encoder está disponível
+
+        Args:
+            encoder (str): Nome do encoder
+
+        Returns:
+            bool: True se o encoder está disponível
+        """
+        return encoder in self.encoders
+
+    def possui_filtro(self, filtro):
+        """
+        Indica se um filtro está disponível
+
+        Args:
+            filtro (str): Nome do filtro
+
+        Returns:
+            bool: True se o filtro está disponível
+        """
+        return filtro in self.filtros
+
+    def possui_opcao(self, opcao):
+        """
+        Indica se o FFmpeg aceita uma opção de linha de comando
+
+        Args:
+            opcao (str): Nome da opção, sem o hífen
+
+        Returns:
+            bool: True se a opção está disponível
+        """
+        return opcao in self.opcoes
+
+    def escolher_encoder(self, preferido):
+        """
+        Escolhe o encoder preferido ou a primeira alternativa disponível
+
+        Args:
+            preferido (str): Encoder desejado
+
+        Returns:
+            str: Encoder a ser usado
+
+        Raises:
+            RuntimeError: Se nenhuma alternativa estiver disponível
+        """
+        for encoder in ALTERNATIVAS_ENCODER.get(preferido, [preferido]):
+            if encoder in self.encoders:
+                return encoder
+
+        raise RuntimeError(
+            f"O FFmpeg instalado não possui o encoder '{preferido}' "
+            "nem uma alternativa compatível."
+        )
+
+
+def argumentos_qualidade_video(encoder, crf):
+    """
+    Traduz um valor de CRF para os argumentos de qualidade do encoder
+
+    Args:
+        encoder (str): Encoder de vídeo escolhido
+        crf (str): Constant Rate Factor desejado
+
+    Returns:
+        list: Argumentos do FFmpeg que controlam a qualidade
+    """
+    if encoder in ("libx264", "libx265"):
+        return ["-crf", str(crf)]
+    elif encoder in ("libvpx-vp9", "libvpx"):
+        return ["-crf", str(crf), "-b:v", "0"]
+    elif encoder == "mpeg4":
+        # Escala de quantização do MPEG-4 (2 = melhor, 31 = pior)
+        return ["-q:v", str(max(2, min(31, round(int(crf) / 5))))]
+    # Encoders sem controle por qualidade: usa uma taxa de bits razoável
+    return ["-b:v", "4M"]
+
+
+def argumentos_taxa_video(encoder, taxa_bits, passagem=None, arquivo_estatisticas=None):
+    """
+    Retorna os argumentos que codificam o vídeo com uma taxa de bits média
+
+    Com ``passagem`` (1 ou 2), a codificação é feita em duas passagens: a
+    primeira grava as estatísticas em ``arquivo_estatisticas`` e a segunda as
+    usa para distribuir os bits. Encoders fora de ENCODERS_DUAS_PASSAGENS (ou
+    sem ``passagem``) usam uma passagem com a taxa limitada por -maxrate.
+
+    Args:
+        encoder (str): Encoder de vídeo escolhido
+        taxa_bits (int): Taxa de bits média do vídeo em bits/s
+        passagem (int): 1 ou 2 para duas passagens, None para uma
+        arquivo_estatisticas (str): Prefixo do arquivo de estatísticas das passagens
+
+    Returns:
+        list: Argumentos do FFmpeg que controlam a taxa de bits
+    """
+    taxa = str(int(taxa_bits))
+    if passagem is None or encoder not in ENCODERS_DUAS_PASSAGENS:
+        return ["-b:v", taxa, "-maxrate", taxa, "-bufsize", str(2 * int(taxa_bits))]
+    if encoder == "libx265":
+        # O x265 recebe as passagens pelos seus próprios parâmetros
+        return ["-b:v", taxa, "-x265-params", f"pass={passagem}:stats={arquivo_estatisticas}"]
+    return ["-b:v", taxa, "-pass", str(passagem), "-passlogfile", arquivo_estatisticas]
+
+
+def codec_compativel(formato, tipo, codec):
+    """
+    Indica se um codec pode ser copiado para o contêiner sem recodificação
+
+    Args:
+        formato (str): Formato (contêiner) de saída
+        tipo (str): "video" ou "audio"
+        codec (str): Nome do codec informado pelo FFprobe
+
+    Returns:
+        bool: True se o stream pode ser copiado
+    """
+    return codec in CODECS_CONTEINER.get(formato, {}).get(tipo, set())
+
+
+def _numero_progresso(valor, tipo=float):
+    """
+    Converte um valor do relatório de progresso ("N/A" vira None)
+
+    Args:
+        valor (str): Valor informado pelo FFmpeg
+        tipo (type): int ou float
+
+    Returns:
+        int ou float: Valor convertido ou None
+    """
+    try:
+        return tipo(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _estatisticas_progresso(bloco):
+    """
+    Extrai as estatísticas de um bloco do relatório de progresso
+
+    Args:
+        bloco (dict): Pares chave=valor de um bloco (terminado em "progress=")
+
+    Returns:
+        dict: Tempo processado (segundos), quadros por segundo e velocidade
+    """
+    # out_time_us é o campo correto; out_time_ms (apesar do nome) também
+    # está em microssegundos em todas as versões do FFmpeg
+    microssegundos = _numero_progresso(bloco.get("out_time_us"), int)
+    if microssegundos is None:
+        microssegundos = _numero_progresso(bloco.get("out_time_ms"), int)
+
+    return {
+        "out_time": max(microssegundos, 0) / 1000000 if microssegundos is not None else None,
+        "fps": _numero_progresso(bloco.get("fps")),
+        "speed": _numero_progresso(bloco.get("speed", "").rstrip("x")),
+        "frame": _numero_progresso(bloco.get("frame"), int)
+    }
+
+
+@etapa(ETAPA_CODIFICAR)
+def executar_ffmpeg(cmd, duracao, tarefa, callback_progresso=None, saida_erro=None):
+    """
+    Executa o FFmpeg acompanhando o progresso pelo relatório em pipe
+
+    O relatório de "-progress pipe:1" é lido linha a linha conforme o FFmpeg o
+    escreve, e a saída de erro é drenada por outra thread, de modo que o
+    processo nunca fica bloqueado com um pipe cheio. As últimas estatísticas
+    ficam disponíveis em ``tarefa.estatisticas``. Se o agendador reservou um
+    número de threads para a tarefa (``tarefa.threads``), ele é repassado ao
+    FFmpeg com -threads e -filter_threads.
+
+    Args:
+        cmd (list): Comando do FFmpeg (sem as opções de progresso)
+        duracao (float): Duração da mídia em segundos (None se desconhecida)
+        tarefa (Tarefa): Tarefa com o sinal de cancelamento da operação
+        callback_progresso (function): Função de callback para atualização do progresso
+        saida_erro (list): Lista que recebe as últimas linhas da saída de erro
+            (ex.: o resumo de um filtro de medição)
+
+    Returns:
+        bool: True se o FFmpeg terminou com sucesso, False se foi cancelado
+
+    Raises:
+        RuntimeError: Se o FFmpeg terminar com erro
+    """
+    capacidades = obter_capacidades()
+
+    # Opções globais do relatório de progresso, logo após o nome do programa
+    opcoes_globais = ["-hide_banner", "-nostats", "-progress", "pipe:1"]
+    if capacidades.possui_opcao("stats_period"):
+        opcoes_globais += ["-stats_period", str(INTERVALO_PROGRESSO)]
+
+    # Limita as threads à parte do orçamento reservada para a tarefa (as de
+    # codificação valem para a saída, que é o último argumento)
+    opcoes_saida = []
+    if tarefa.threads:
+        opcoes_saida = ["-threads", str(tarefa.threads)]
+        if capacidades.possui_opcao("filter_threads"):
+            opcoes_globais += ["-filter_threads", str(tarefa.threads)]
+
+    cmd = [cmd[0], *opcoes_globais, *cmd[1:-1], *opcoes_saida, cmd[-1]]
+
+    # Inicia o processo FFmpeg
+    process = subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+        bufsize=1
+    )
+    tarefa.registrar_processo(process)
+
+    # Drena a saída de erro, guardando apenas as últimas linhas
+    linhas_erro = deque(maxlen=LINHAS_ERRO)
+    leitor_erro = threading.Thread(
+        target=linhas_erro.extend, args=(process.stderr,), name="ffmpeg-stderr", daemon=True
+    )
+    leitor_erro.start()
+
+    try:
+        # Lê o relatório de progresso conforme ele é produzido
+        bloco = {}
+        last_progress = -1
+        for linha in process.stdout:
+            chave, _, valor = linha.strip().partition("=")
+            if not chave:
+                continue
+            bloco[chave] = valor
+
+            # Cada bloco termina com "progress=continue" ou "progress=end"
+            if chave != "progress":
+                continue
+
+            estatisticas = _estatisticas_progresso(bloco)
+            tarefa.estatisticas = estatisticas
+            bloco = {}
+
+            if duracao and estatisticas["out_time"] is not None:
+                progress = min(int((estatisticas["out_time"] / duracao) * 100), 99)
+
+                # Atualiza o progresso se houve mudança
+                if progress > last_progress:
+                    last_progress = progress
+                    if callback_progresso:
+                        callback_progresso(progress)
+
+        process.wait()
+        leitor_erro.join()
+        if saida_erro is not None:
+            saida_erro.extend(linhas_erro)
+    except BaseException:
+        # Erro no callback ou interrupção: não deixa o FFmpeg órfão
+        encerrar_processo(process)
+        raise
+    finally:
+        tarefa.liberar_processo()
+
+    # Processo encerrado por cancelamento
+    if tarefa.cancelado.is_set():
+        return False
+
+    # Verifica se o processo foi bem-sucedido
+    if process.returncode != 0:
+        error = "".join(linhas_erro).strip() or "Erro desconhecido"
+        raise RuntimeError(f"Erro no FFmpeg: {error}")
+
+    if callback_progresso:
+        callback_progresso(100)
+    return True
+
+
+def medir_qualidade(arquivo, referencia, inicio, duracao, metrica, tarefa, indice_stream=0):
+    """
+    Compara um trecho codificado com o mesmo trecho do vídeo original
+
+    Args:
+        arquivo (str): Trecho codificado (começando em zero)
+        referencia (str): Vídeo original
+        inicio (float): Início do trecho no original, em segundos
+        duracao (float): Duração do trecho em segundos
+        metrica (str): "ssim" ou "psnr"
+        tarefa (Tarefa): Tarefa com o sinal de cancelamento da operação
+        indice_stream (int): Índice do stream de vídeo do original
+
+    Returns:
+        float: SSIM (0 a 1) ou PSNR médio (em dB), ou None se foi cancelado
+
+    Raises:
+        RuntimeError: Se o FFmpeg falhar ou não informar o resultado
+    """
+    filtro = (
+        "[0:v]setpts=PTS-STARTPTS[codificado];"
+        f"[1:{indice_stream}]setpts=PTS-STARTPTS[original];"
+        f"[codificado][original]{metrica}"
+    )
+    cmd = [
+        "ffmpeg",
+        "-i", arquivo,
+        "-ss", f"{inicio:.3f}",
+        "-t", f"{duracao:.3f}",
+        "-i", referencia,
+        "-lavfi", filtro,
+        "-f", "null",
+        "-"
+    ]
+    linhas = []
+    if not executar_ffmpeg(cmd, duracao, tarefa, saida_erro=linhas):
+        return None
+
+    for linha in reversed(linhas):
+        encontrado = _REGEX_MEDICAO[metrica].search(linha)
+        if encontrado:
+            return float(encontrado.group(1))
+
+    raise RuntimeError(f"O FFmpeg não informou o {metrica.upper()} de {arquivo}")
+
+
+# Capacidades consultadas uma única vez por processo
+_capacidades = None
+_capacidades_lock = threading.Lock()
+
+
+def obter_capacidades():
+    """
+    Retorna as capacidades do FFmpeg, consultando-as apenas na primeira vez
+
+    Returns:
+        CapacidadesFFmpeg: Capacidades do FFmpeg instalado
+    """
+    global _capacidades
+    with _capacidades_lock:
+        if _capacidades is None:
+            _capacidades = CapacidadesFFmpeg()
+        return _capacidades
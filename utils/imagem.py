@@ -0,0 +1,750 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Módulo que contém auxiliares de decodificação e redimensionamento de imagens
+compartilhados pelo Conversor e pelo Compressor
+
+Também controla a memória gasta com imagens: o OrcamentoMemoria estima pelo
+cabeçalho quanto cada imagem ocupará decodificada, faz esperar (em ordem de
+chegada) as tarefas que não cabem no orçamento e, nos formatos sem compressão
+(BMP, TIFF, PPM, TGA), permite processar a imagem em faixas de linhas. As
+animações são entregues ao codificador um quadro por vez pela SequenciaQuadros
+(só o de WebP grava cada quadro ao recebê-lo; os de GIF e APNG guardam todos,
+o que a estimativa leva em conta).
+"""
+
+import io
+import os
+import math
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+# Margem entre o tamanho decodificado e o tamanho final: a imagem é reduzida
+# por fatores inteiros (DCT no JPEG e reduce()) até no mínimo este múltiplo
+# do tamanho final, e só então passa pelo filtro LANCZOS. FATOR_REDUCAO é o
+# do thumbnail() da Pillow; a redução rápida vai até o próprio tamanho final,
+# o que já decodifica 4x menos pixels a partir de uma redução de 2x
+FATOR_REDUCAO = 2.0
+FATOR_REDUCAO_RAPIDA = 1.0
+
+# Fração da memória física dividida entre os trabalhadores de imagem
+FRACAO_MEMORIA = 0.5
+
+# Memória por trabalhador quando a memória física não pode ser consultada
+MEMORIA_TRABALHADOR_PADRAO = 1024 ** 3
+
+# Tamanho aproximado de cada faixa decodificada no processamento em faixas
+BYTES_FAIXA = 64 * 1024 ** 2
+
+# Formatos de saída que guardam animações (GIF, WebP e APNG)
+FORMATOS_ANIMADOS = ("gif", "webp", "png")
+
+# Bytes por pixel de cada quadro que o codificador da Pillow guarda até o fim
+# da animação: o de GIF mantém todos os quadros em paleta e o de APNG em RGBA
+# (para calcular as diferenças); o de WebP codifica cada quadro ao recebê-lo
+_BYTES_QUADRO_GUARDADO = {"gif": 1, "png": 4, "webp": 0}
+
+# Busca pelo tamanho de arquivo alvo: menor qualidade testada, folga abaixo do
+# alvo aceita como suficiente, codificações simultâneas por rodada e quantas
+# vezes as dimensões podem ser reduzidas
+QUALIDADE_MINIMA_ALVO = 10
+TOLERANCIA_ALVO = 0.05
+TENTATIVAS_PARALELAS = 4
+MAX_REDUCOES_ALVO = 6
+
+# Formatos (nomes da Pillow) em que a qualidade altera o tamanho
+_FORMATOS_COM_QUALIDADE = ("JPEG", "WEBP")
+
+# Bits por pixel dos modos brutos cujo tile não informa o tamanho da linha
+_BITS_MODO_BRUTO = {
+    "L": 8, "P": 8, "LA": 16, "I;16": 16, "I;16B": 16, "I;16L": 16,
+    "RGB": 24, "BGR": 24, "RGBA": 32, "BGRA": 32, "RGBX": 32, "BGRX": 32,
+    "CMYK": 32, "I": 32, "I;32": 32, "F": 32, "F;32F": 32
+}
+
+
+def tamanho_contido(tamanho, limite):
+    """
+    Calcula o tamanho que cabe em um limite mantendo a proporção
+
+    Args:
+        tamanho (tuple): Largura e altura da imagem
+        limite (tuple): Largura e altura máximas
+
+    Returns:
+        tuple: Novo tamanho, ou None se a imagem já cabe no limite
+    """
+    largura, altura = tamanho
+    if largura <= limite[0] and altura <= limite[1]:
+        return None
+
+    escala = min(limite[0] / largura, limite[1] / altura)
+    return max(1, round(largura * escala)), max(1, round(altura * escala))
+
+
+def decodificar(img, tamanho_final=None, fator=None):
+    """
+    Decodifica os pixels de uma imagem aberta (e ainda não carregada)
+
+    Com um fator de redução, um JPEG é decodificado já em escala reduzida no
+    domínio DCT (1/2, 1/4 ou 1/8), desde que continue com pelo menos ``fator``
+    vezes o tamanho final, o que poupa tempo e memória com fotos muito maiores
+    que o tamanho final.
+
+    Args:
+        img (PIL.Image.Image): Imagem aberta com Image.open
+        tamanho_final (tuple): Tamanho após o redimensionamento (None se a
+            imagem não será redimensionada)
+        fator (float): FATOR_REDUCAO ou FATOR_REDUCAO_RAPIDA (None decodifica
+            a imagem inteira)
+
+    Returns:
+        tuple: Região da imagem decodificada correspondente à original
+            (repassada a redimensionar), ou None
+    """
+    caixa = None
+    if fator is not None and tamanho_final is not None:
+        resultado = img.draft(None, (int(tamanho_final[0] * fator), int(tamanho_final[1] * fator)))
+        if resultado is not None:
+            caixa = resultado[1]
+    img.load()
+    return caixa
+
+
+def redimensionar(img, tamanho_final, caixa=None, fator=None):
+    """
+    Redimensiona uma imagem com o filtro LANCZOS
+
+    Com um fator de redução, a imagem é antes reduzida por um fator inteiro
+    (Image.reduce, que apenas tira médias de blocos de pixels) até ficar com
+    cerca de ``fator`` vezes o tamanho final. Sem ele, o LANCZOS é aplicado
+    diretamente sobre a imagem inteira.
+
+    Args:
+        img (PIL.Image.Image): Imagem decodificada
+        tamanho_final (tuple): Largura e altura desejadas
+        caixa (tuple): Região retornada por decodificar
+        fator (float): FATOR_REDUCAO ou FATOR_REDUCAO_RAPIDA (None aplica só
+            o LANCZOS)
+
+    Returns:
+        PIL.Image.Image: Imagem redimensionada
+    """
+    return img.resize(tamanho_final, Image.LANCZOS, box=caixa, reducing_gap=fator)
+
+
+def memoria_fisica():
+    """
+    Retorna a memória física da máquina
+
+    Returns:
+        int: Memória em bytes (None se não puder ser consultada)
+    """
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def _bytes_por_pixel(modo):
+    """
+    Retorna quantos bytes a Pillow usa por pixel de um modo
+
+    Args:
+        modo (str): Modo da imagem
+
+    Returns:
+        int: Bytes por pixel
+    """
+    if modo in ("1", "L", "P"):
+        return 1
+    if modo.startswith("I;16"):
+        return 2
+    # Os modos de várias bandas ocupam 4 bytes por pixel, mesmo o RGB
+    return 4
+
+
+def _linhas_faixa(largura, bytes_faixa=BYTES_FAIXA):
+    """
+    Calcula quantas linhas cabem em uma faixa
+
+    Args:
+        largura (int): Largura da imagem
+        bytes_faixa (int): Tamanho aproximado da faixa
+
+    Returns:
+        int: Número de linhas
+    """
+    return max(1, bytes_faixa // (largura * 4))
+
+
+def suporta_faixas(img):
+    """
+    Verifica se uma imagem aberta pode ser decodificada em faixas de linhas
+
+    Só os formatos gravados sem compressão (decodificador "raw") permitem ler
+    um intervalo de linhas sem decodificar as anteriores.
+
+    Args:
+        img (PIL.Image.Image): Imagem aberta com Image.open e ainda não carregada
+
+    Returns:
+        bool: True se a imagem pode ser lida em faixas
+    """
+    if not getattr(img, "filename", None) or not img.tile or getattr(img, "n_frames", 1) > 1:
+        return False
+
+    for tile in img.tile:
+        if tile[0] != "raw":
+            return False
+        argumentos = (tile[3],) if isinstance(tile[3], str) else tuple(tile[3])
+        modo_bruto = argumentos[0]
+        passo = argumentos[1] if len(argumentos) > 1 else 0
+        if not passo and modo_bruto not in _BITS_MODO_BRUTO:
+            return False
+    return True
+
+
+def _ler_faixa(img, y0, y1):
+    """
+    Decodifica apenas as linhas [y0, y1) de uma imagem aceita por suporta_faixas
+
+    Args:
+        img (PIL.Image.Image): Imagem aberta (fornece o arquivo e os tiles)
+        y0 (int): Primeira linha
+        y1 (int): Linha seguinte à última
+
+    Returns:
+        PIL.Image.Image: Faixa decodificada
+    """
+    tiles = []
+    for codec, (x0, ty0, x1, ty1), deslocamento, argumentos in img.tile:
+        inicio, fim = max(y0, ty0), min(y1, ty1)
+        if inicio >= fim:
+            continue
+
+        argumentos = (argumentos,) if isinstance(argumentos, str) else tuple(argumentos)
+        modo_bruto = argumentos[0]
+        passo = argumentos[1] if len(argumentos) > 1 else 0
+        direcao = argumentos[2] if len(argumentos) > 2 else 1
+        if not passo:
+            passo = ((x1 - x0) * _BITS_MODO_BRUTO[modo_bruto] + 7) // 8
+
+        # Arquivos de baixo para cima (BMP, TGA) guardam antes as últimas linhas
+        if direcao < 0:
+            deslocamento += (ty1 - fim) * passo
+        else:
+            deslocamento += (inicio - ty0) * passo
+
+        tiles.append((
+            codec, (x0, inicio - y0, x1, fim - y0), deslocamento, (modo_bruto, passo, direcao)
+        ))
+
+    faixa = Image.open(img.filename)
+    faixa._size = (img.width, y1 - y0)
+    faixa.tile = tiles
+    faixa.load()
+    return faixa
+
+
+def montar_em_faixas(img, tamanho_final=None, modo=None, cancelado=None):
+    """
+    Monta a imagem (redimensionada, se pedido) decodificando uma faixa de
+    linhas por vez
+
+    Só a imagem final e uma faixa ficam na memória. No redimensionamento,
+    cada faixa é lida com as linhas vizinhas que o filtro LANCZOS alcança, de
+    modo que o resultado não tem emendas.
+
+    Args:
+        img (PIL.Image.Image): Imagem aceita por suporta_faixas
+        tamanho_final (tuple): Tamanho após o redimensionamento (None mantém)
+        modo (str): Modo da imagem final (None mantém o da imagem, trocando
+            "1" e "P" por RGB ou RGBA quando há redimensionamento)
+        cancelado (threading.Event): Sinal de cancelamento, verificado a cada faixa
+
+    Returns:
+        PIL.Image.Image: Imagem montada, ou None se a operação foi cancelada
+    """
+    largura, altura = img.size
+    if modo is None:
+        modo = img.mode
+        if tamanho_final is not None and modo in ("1", "P"):
+            modo = "RGBA" if "transparency" in img.info else "RGB"
+
+    linhas = _linhas_faixa(largura)
+    if tamanho_final is None:
+        saida = Image.new(modo, img.size)
+        for y0 in range(0, altura, linhas):
+            if cancelado is not None and cancelado.is_set():
+                return None
+            faixa = _ler_faixa(img, y0, min(altura, y0 + linhas))
+            if modo == "P" and faixa.mode == "P" and y0 == 0:
+                # Os índices são copiados como estão; a paleta vem da entrada
+                modo_paleta = faixa.palette.mode
+                saida.putpalette(faixa.getpalette(modo_paleta), modo_paleta)
+                if "transparency" in faixa.info:
+                    saida.info["transparency"] = faixa.info["transparency"]
+            saida.paste(faixa.convert(modo), (0, y0))
+            faixa.close()
+        return saida
+
+    saida = Image.new(modo, tamanho_final)
+    escala = altura / tamanho_final[1]
+    linhas_saida = max(1, int(linhas / max(escala, 1)))
+
+    # Alcance do LANCZOS (3 pixels da saída) em linhas da entrada
+    margem = math.ceil(3 * max(escala, 1)) + 1
+
+    for s0 in range(0, tamanho_final[1], linhas_saida):
+        if cancelado is not None and cancelado.is_set():
+            return None
+        s1 = min(tamanho_final[1], s0 + linhas_saida)
+        f0, f1 = s0 * escala, s1 * escala
+        y0 = max(0, math.floor(f0) - margem)
+        y1 = min(altura, math.ceil(f1) + margem)
+
+        faixa = _ler_faixa(img, y0, y1)
+        convertida = faixa.convert(modo)
+        faixa.close()
+        parte = convertida.resize(
+            (tamanho_final[0], s1 - s0), Image.LANCZOS, box=(0, f0 - y0, largura, f1 - y0)
+        )
+        saida.paste(parte, (0, s0))
+    return saida
+
+
+def estimar_memoria(img, tamanho_final=None, fator=None, em_faixas=False, formato_saida=None):
+    """
+    Estima pelo cabeçalho a memória que o processamento de uma imagem ocupará
+
+    Soma a imagem decodificada e uma cópia do tamanho final (redimensionamento,
+    conversão de modo ou o próprio codificador). Com um fator de redução,
+    aplica o draft à imagem recebida para considerar a decodificação em escala
+    reduzida, portanto ela deve ter sido aberta só para a estimativa. Uma
+    animação gravada como animação soma um quadro decodificado, o mesmo quadro
+    no tamanho final e os quadros que o codificador guarda (todos, em GIF e
+    APNG).
+
+    Args:
+        img (PIL.Image.Image): Imagem aberta com Image.open e ainda não carregada
+        tamanho_final (tuple): Tamanho após o redimensionamento (None mantém)
+        fator (float): Fator de redução passado a decodificar (None se a
+            imagem será decodificada inteira)
+        em_faixas (bool): Estima o processamento em faixas
+        formato_saida (str): Formato de saída (extensão em minúsculas), que
+            decide se as animações são gravadas quadro a quadro
+
+    Returns:
+        int: Memória estimada em bytes
+    """
+    largura_final, altura_final = tamanho_final or img.size
+    copia = largura_final * altura_final * 4
+
+    if getattr(img, "is_animated", False) and formato_saida in FORMATOS_ANIMADOS:
+        guardados = img.n_frames * largura_final * altura_final * _BYTES_QUADRO_GUARDADO[formato_saida]
+        return img.width * img.height * 4 + copia + guardados
+
+    if em_faixas:
+        # Uma faixa decodificada e a mesma faixa convertida
+        return copia + 2 * _linhas_faixa(img.width) * img.width * 4
+
+    if fator is not None and tamanho_final is not None:
+        img.draft(None, (int(largura_final * fator), int(altura_final * fator)))
+    return img.width * img.height * _bytes_por_pixel(img.mode) + copia
+
+
+class OrcamentoMemoria:
+    """
+    Limita a memória usada pelas imagens processadas ao mesmo tempo
+
+    Cada trabalhador (thread da fila de imagem ou processo do ExecutorImagens)
+    tem direito a limite_trabalhador bytes, e o total é dividido entre as
+    tarefas em andamento. As tarefas que não cabem esperam, em ordem de
+    chegada; as maiores que o total esperam a máquina ficar livre e executam
+    sozinhas.
+    """
+
+    def __init__(self, limite_trabalhador=None, trabalhadores=None):
+        """
+        Inicializa o orçamento
+
+        Args:
+            limite_trabalhador (int): Memória por trabalhador em bytes (None
+                divide FRACAO_MEMORIA da memória física entre os trabalhadores)
+            trabalhadores (int): Número de imagens processadas ao mesmo tempo
+                (None usa o número de núcleos)
+        """
+        self.trabalhadores = max(1, trabalhadores or os.cpu_count() or 1)
+        self.memoria_fisica = memoria_fisica()
+        if limite_trabalhador is None:
+            if self.memoria_fisica:
+                limite_trabalhador = int(self.memoria_fisica * FRACAO_MEMORIA / self.trabalhadores)
+            else:
+                limite_trabalhador = MEMORIA_TRABALHADOR_PADRAO
+
+        self.limite_trabalhador = int(limite_trabalhador)
+        self.total = self.limite_trabalhador * self.trabalhadores
+
+        self._em_uso = 0
+        self._ativas = 0
+        self._fila = deque()
+        self._condicao = threading.Condition()
+
+    def planejar(self, arquivo, tamanho_final=None, fator=None, em_faixas=False, formato_saida=None):
+        """
+        Estima a memória de uma imagem e decide se ela deve ser processada em faixas
+
+        As faixas são usadas quando pedidas ou quando a imagem passa do limite
+        por trabalhador, se o formato permitir.
+
+        Args:
+            arquivo (str): Caminho da imagem
+            tamanho_final (tuple | function): Tamanho após o redimensionamento,
+                ou função que o calcula a partir do tamanho original
+            fator (float): Fator de redução passado a decodificar (None se a
+                imagem será decodificada inteira)
+            em_faixas (bool): Prefere o processamento em faixas
+            formato_saida (str): Formato de saída (ver estimar_memoria)
+
+        Returns:
+            tuple: (memória estimada em bytes, True se deve ser em faixas)
+
+        Raises:
+            MemoryError: Se a imagem não cabe na memória física da máquina ou
+                passa do limite de pixels da Pillow
+        """
+        try:
+            aberta = Image.open(arquivo)
+        except Image.DecompressionBombError as erro:
+            raise MemoryError(f"A imagem passa do limite de pixels da Pillow: {erro}") from erro
+
+        with aberta as img:
+            if callable(tamanho_final):
+                tamanho_final = tamanho_final(img.size)
+
+            faixas = suporta_faixas(img)
+            if faixas:
+                necessario_faixas = estimar_memoria(img, tamanho_final, em_faixas=True)
+            necessario = estimar_memoria(img, tamanho_final, fator, formato_saida=formato_saida)
+
+            em_faixas = faixas and (em_faixas or (
+                necessario > self.limite_trabalhador and necessario_faixas < necessario
+            ))
+            if em_faixas:
+                necessario = necessario_faixas
+
+        if self.memoria_fisica and necessario > self.memoria_fisica:
+            raise MemoryError(
+                f"A imagem precisa de cerca de {necessario / 1024 ** 2:.0f} MB, "
+                f"mais que a memória da máquina ({self.memoria_fisica / 1024 ** 2:.0f} MB)"
+            )
+        return necessario, em_faixas
+
+    def adquirir(self, necessario, cancelado=None):
+        """
+        Reserva memória, esperando a vez e a liberação das tarefas anteriores
+
+        Args:
+            necessario (int): Memória em bytes
+            cancelado (threading.Event): Sinal que interrompe a espera
+
+        Returns:
+            bool: True se a memória foi reservada, False se a espera foi cancelada
+        """
+        ficha = object()
+        with self._condicao:
+            self._fila.append(ficha)
+            try:
+                while True:
+                    if self._fila[0] is ficha and (
+                        self._ativas == 0 or self._em_uso + necessario <= self.total
+                    ):
+                        self._em_uso += necessario
+                        self._ativas += 1
+                        return True
+                    if cancelado is not None and cancelado.is_set():
+                        return False
+                    self._condicao.wait(0.2)
+            finally:
+                self._fila.remove(ficha)
+                self._condicao.notify_all()
+
+    def liberar(self, necessario):
+        """
+        Devolve a memória reservada com adquirir
+
+        Args:
+            necessario (int): Memória em bytes
+        """
+        with self._condicao:
+            self._em_uso -= necessario
+            self._ativas -= 1
+            self._condicao.notify_all()
+
+    def em_uso(self):
+        """
+        Retorna a memória reservada no momento
+
+        Returns:
+            int: Memória em bytes
+        """
+        with self._condicao:
+            return self._em_uso
+
+
+def _codificar_em_memoria(img, formato, qualidade, opcoes_salvar):
+    """
+    Codifica uma imagem em memória
+
+    Pode ser chamada ao mesmo tempo por várias threads com a mesma imagem: o
+    save() da Pillow guarda as opções de codificação no próprio objeto
+    (encoderinfo), então cada chamada codifica uma cópia.
+
+    Args:
+        img (PIL.Image.Image): Imagem decodificada
+        formato (str): Formato da Pillow (ex.: "JPEG")
+        qualidade (int): Qualidade da codificação
+        opcoes_salvar (dict): Demais opções de Image.save
+
+    Returns:
+        tuple: (qualidade, bytes codificados)
+    """
+    buffer = io.BytesIO()
+    img.copy().save(buffer, format=formato, quality=qualidade, **opcoes_salvar)
+    return qualidade, buffer.getvalue()
+
+
+def _buscar_qualidade(img, formato, max_bytes, qualidade_maxima, opcoes_salvar, executor, cancelado):
+    """
+    Procura a maior qualidade cuja codificação cabe em max_bytes
+
+    Cada rodada codifica ao mesmo tempo TENTATIVAS_PARALELAS qualidades
+    espalhadas pelo intervalo ainda possível (a maior delas é sempre o topo do
+    intervalo) e estreita o intervalo em volta da fronteira. A busca termina
+    quando o topo cabe, quando o melhor resultado fica a menos de
+    TOLERANCIA_ALVO do alvo ou quando o intervalo se esgota.
+
+    Args:
+        img (PIL.Image.Image): Imagem decodificada
+        formato (str): Formato da Pillow
+        max_bytes (int): Tamanho máximo do arquivo
+        qualidade_maxima (int): Maior qualidade permitida
+        opcoes_salvar (dict): Demais opções de Image.save
+        executor (ThreadPoolExecutor): Executor das codificações
+        cancelado (threading.Event): Sinal de cancelamento, verificado a cada rodada
+
+    Returns:
+        tuple: (melhor codificação que cabe ou None, menor codificação obtida)
+    """
+    if formato not in _FORMATOS_COM_QUALIDADE:
+        # Sem qualidade a ajustar: só há uma codificação possível
+        dados = _codificar_em_memoria(img, formato, qualidade_maxima, opcoes_salvar)[1]
+        return (dados if len(dados) <= max_bytes else None), dados
+
+    baixa, alta = min(QUALIDADE_MINIMA_ALVO, qualidade_maxima), qualidade_maxima
+    melhor = None
+    melhor_qualidade = -1
+    menor = None
+
+    while baixa <= alta:
+        if cancelado is not None and cancelado.is_set():
+            return None, None
+
+        passos = min(TENTATIVAS_PARALELAS, alta - baixa + 1)
+        qualidades = sorted({
+            baixa + round((alta - baixa) * (indice + 1) / passos) for indice in range(passos)
+        })
+        resultados = list(executor.map(
+            lambda qualidade: _codificar_em_memoria(img, formato, qualidade, opcoes_salvar),
+            qualidades
+        ))
+
+        cabem = []
+        excedem = []
+        for qualidade, dados in resultados:
+            if menor is None or len(dados) < len(menor):
+                menor = dados
+            if len(dados) <= max_bytes:
+                cabem.append(qualidade)
+                if qualidade > melhor_qualidade:
+                    melhor, melhor_qualidade = dados, qualidade
+            else:
+                excedem.append(qualidade)
+
+        # O topo do intervalo cabe, ou o melhor já está perto o bastante do alvo
+        if alta in cabem or (melhor is not None and len(melhor) >= max_bytes * (1 - TOLERANCIA_ALVO)):
+            break
+
+        if cabem:
+            baixa = max(cabem) + 1
+        alta = min(excedem) - 1
+
+    return melhor, menor
+
+
+def codificar_ate(img, formato, max_bytes, qualidade_maxima, opcoes_salvar=None,
+                  reduzir_dimensoes=False, cancelado=None):
+    """
+    Codifica uma imagem em memória com a maior qualidade que cabe em max_bytes
+
+    Todas as tentativas são feitas em memória (BytesIO), em paralelo; só a
+    codificação escolhida é devolvida para ser gravada. Se nem a menor
+    qualidade couber e reduzir_dimensoes for verdadeiro, a imagem é reduzida
+    na proporção estimada pelo menor resultado e a busca recomeça.
+
+    Args:
+        img (PIL.Image.Image): Imagem decodificada
+        formato (str): Formato da Pillow (ex.: "JPEG")
+        max_bytes (int): Tamanho máximo do arquivo
+        qualidade_maxima (int): Maior qualidade permitida
+        opcoes_salvar (dict): Demais opções de Image.save
+        reduzir_dimensoes (bool): Permite reduzir as dimensões da imagem
+        cancelado (threading.Event): Sinal de cancelamento
+
+    Returns:
+        bytes: Imagem codificada, ou None se a operação foi cancelada
+
+    Raises:
+        ValueError: Se não for possível chegar ao tamanho pedido
+    """
+    opcoes_salvar = opcoes_salvar or {}
+    tentativas = min(TENTATIVAS_PARALELAS, os.cpu_count() or 1)
+
+    with ThreadPoolExecutor(tentativas, thread_name_prefix="tamanho-alvo") as executor:
+        atual = img
+        for _ in range(MAX_REDUCOES_ALVO + 1):
+            melhor, menor = _buscar_qualidade(
+                atual, formato, max_bytes, qualidade_maxima, opcoes_salvar, executor, cancelado
+            )
+            if melhor is not None:
+                return melhor
+            if menor is None:
+                # Cancelada
+                return None
+            if not reduzir_dimensoes or atual.width <= 1 and atual.height <= 1:
+                break
+
+            # O tamanho do arquivo acompanha aproximadamente o número de pixels
+            escala = min(0.9, math.sqrt(max_bytes / len(menor)) * 0.95)
+            atual = img.resize(
+                (max(1, round(atual.width * escala)), max(1, round(atual.height * escala))),
+                Image.LANCZOS
+            )
+
+    raise ValueError(
+        f"Não foi possível reduzir a imagem a {max_bytes} bytes "
+        f"(menor resultado: {len(menor)} bytes)"
+    )
+
+
+class SequenciaQuadros(Image.Image):
+    """
+    Animação que decodifica (e redimensiona) um quadro por vez
+
+    Salvar a sequência com save_all=True faz o codificador da Pillow pedir os
+    quadros em ordem com seek(), de modo que a animação nunca é decodificada
+    inteira de uma vez. Só o codificador de WebP grava cada quadro ao recebê-lo
+    e mantém apenas o atual na memória; os de GIF e APNG guardam uma cópia de
+    todos os quadros (em paleta e em RGBA) até o fim, o que estimar_memoria
+    cobra do orçamento. As durações de cada quadro são anotadas em
+    ``duracoes`` à medida que os quadros são lidos; a lista deve ser passada
+    como "duration" ao salvar, pois os codificadores só consultam a duração de
+    um quadro depois de posicioná-lo.
+    """
+
+    def __init__(self, fonte, tamanho_final=None, ao_quadro=None, cancelado=None):
+        """
+        Inicializa a sequência no primeiro quadro
+
+        Args:
+            fonte (PIL.Image.Image): Animação aberta com Image.open
+            tamanho_final (tuple): Tamanho dos quadros (None mantém)
+            ao_quadro (function): Chamada com (índice, total) a cada quadro novo
+            cancelado (threading.Event): Sinal de cancelamento, verificado a cada quadro
+        """
+        super().__init__()
+        self._fonte = fonte
+        self._tamanho_final = tamanho_final
+        self._ao_quadro = ao_quadro
+        self._cancelado = cancelado
+
+        self.n_frames = getattr(fonte, "n_frames", 1)
+        self.is_animated = self.n_frames > 1
+        self.duracoes = [0] * self.n_frames
+
+        # Repetições da animação (None se a origem não define)
+        self.loop = fonte.info.get("loop")
+        self._quadro = None
+        self._ultimo_informado = -1
+        self.seek(0)
+
+    def seek(self, quadro):
+        """
+        Decodifica um quadro da animação
+
+        Args:
+            quadro (int): Índice do quadro
+
+        Raises:
+            EOFError: Se o quadro não existe (fim da sequência)
+            InterruptedError: Se a operação foi cancelada
+        """
+        if not 0 <= quadro < self.n_frames:
+            raise EOFError("Fim da sequência de quadros")
+        if quadro == self._quadro:
+            return
+        if self._cancelado is not None and self._cancelado.is_set():
+            raise InterruptedError("Operação cancelada")
+
+        self._fonte.seek(quadro)
+        imagem = self._fonte.copy()
+        if self._tamanho_final is not None:
+            if imagem.mode not in ("RGB", "RGBA"):
+                imagem = imagem.convert("RGBA")
+            imagem = imagem.resize(self._tamanho_final, Image.LANCZOS)
+
+        # Passa a representar o novo quadro
+        self.im = imagem.im
+        self._mode = imagem.mode
+        self._size = imagem.size
+        self.palette = imagem.palette
+        self.info = dict(imagem.info)
+        self.duracoes[quadro] = self._fonte.info.get("duration", 0)
+        self._quadro = quadro
+
+        if self._ao_quadro is not None and quadro > self._ultimo_informado:
+            self._ultimo_informado = quadro
+            self._ao_quadro(quadro, self.n_frames)
+
+    def tell(self):
+        """
+        Retorna o índice do quadro atual
+
+        Returns:
+            int: Índice do quadro
+        """
+        return self._quadro
+
+
+# Orçamento compartilhado por quem não informa o seu
+_orcamento_padrao = None
+_orcamento_lock = threading.Lock()
+
+
+def obter_orcamento_memoria():
+    """
+    Retorna o orçamento de memória padrão, compartilhado pela aplicação
+
+    Returns:
+        OrcamentoMemoria: Orçamento padrão
+    """
+    global _orcamento_padrao
+    with _orcamento_lock:
+        if _orcamento_padrao is None:
+            _orcamento_padrao = OrcamentoMemoria()
+        return _orcamento_padrao
@@ -0,0 +1,430 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Módulo que contém a sondagem de metadados de mídia com o FFprobe e o cache
+persistente desses metadados (e das medições de qualidade dos trechos
+amostrados)
+"""
+
+import os
+import json
+import sqlite3
+import subprocess
+import threading
+
+from utils.metricas import ETAPA_SONDAR, etapa
+
+# Versão do formato dos metadados guardados no cache (mudar ao alterar
+# sondar_midia faz os arquivos serem sondados novamente)
+VERSAO_METADADOS = 2
+
+
+def _numero(valor, tipo=float):
+    """
+    Converte um valor do FFprobe para número, ignorando valores ausentes
+
+    Args:
+        valor: Valor informado pelo FFprobe (geralmente texto)
+        tipo (type): int ou float
+
+    Returns:
+        int ou float: Valor convertido ou None
+    """
+    try:
+        return tipo(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _taxa_quadros(valor):
+    """
+    Converte uma fração do FFprobe ("30000/1001") em quadros por segundo
+
+    Args:
+        valor (str): Fração informada pelo FFprobe
+
+    Returns:
+        float: Quadros por segundo ou None
+    """
+    try:
+        numerador, denominador = valor.split("/")
+        if float(denominador) == 0:
+            return None
+        return round(float(numerador) / float(denominador), 3)
+    except (AttributeError, ValueError):
+        return None
+
+
+def sondar_midia(arquivo):
+    """
+    Obtém os metadados de um arquivo de mídia em uma única chamada ao FFprobe
+
+    Args:
+        arquivo (str): Caminho do arquivo
+
+    Returns:
+        dict: Duração, taxa de bits, formato e lista de streams (tipo, codec,
+            resolução, taxa de quadros, taxa de bits, canais e se é uma capa
+            anexada)
+
+    Raises:
+        RuntimeError: Se o FFprobe não conseguir ler o arquivo
+    """
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-show_format",
+        "-show_streams",
+        "-of", "json",
+        arquivo
+    ]
+
+    try:
+        processo = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+    except FileNotFoundError:
+        raise RuntimeError(
+            "FFprobe não está instalado ou não está disponível no PATH."
+        )
+
+    if processo.returncode != 0:
+        raise RuntimeError(f"Erro no FFprobe: {processo.stderr.strip()}")
+
+    dados = json.loads(processo.stdout or "{}")
+    formato = dados.get("format", {})
+
+    streams = []
+    for stream in dados.get("streams", []):
+        streams.append({
+            "indice": stream.get("index"),
+            "tipo": stream.get("codec_type"),
+            "codec": stream.get("codec_name"),
+            "largura": _numero(stream.get("width"), int),
+            "altura": _numero(stream.get("height"), int),
+            "fps": _taxa_quadros(stream.get("avg_frame_rate")) or _taxa_quadros(stream.get("r_frame_rate")),
+            "bitrate": _numero(stream.get("bit_rate"), int),
+            "canais": _numero(stream.get("channels"), int),
+            "taxa_amostragem": _numero(stream.get("sample_rate"), int),
+            "duracao": _numero(stream.get("duration")),
+            # Imagem de capa (ex.: arte do álbum em MP3/M4A), não um vídeo
+            "capa": stream.get("disposition", {}).get("attached_pic") == 1
+        })
+
+    # Alguns contêineres só informam a duração nos streams
+    duracao = _numero(formato.get("duration"))
+    if duracao is None:
+        duracoes = [s["duracao"] for s in streams if s["duracao"]]
+        duracao = max(duracoes) if duracoes else None
+
+    return {
+        "versao": VERSAO_METADADOS,
+        "formato": formato.get("format_name"),
+        "duracao": duracao,
+        "bitrate": _numero(formato.get("bit_rate"), int),
+        "streams": streams
+    }
+
+
+def stream_video(metadados):
+    """
+    Retorna o primeiro stream de vídeo (ignorando capas anexadas)
+
+    Vídeos em MJPEG ou PNG (comuns em AVI e MOV) são streams de vídeo como os
+    demais; só as capas marcadas como attached_pic são ignoradas.
+
+    Args:
+        metadados (dict): Metadados retornados por sondar_midia
+
+    Returns:
+        dict: Stream de vídeo ou None
+    """
+    for stream in metadados.get("streams", []):
+        if stream["tipo"] == "video" and not stream.get("capa"):
+            return stream
+    return None
+
+
+def stream_audio(metadados):
+    """
+    Retorna o primeiro stream de áudio
+
+    Args:
+        metadados (dict): Metadados retornados por sondar_midia
+
+    Returns:
+        dict: Stream de áudio ou None
+    """
+    for stream in metadados.get("streams", []):
+        if stream["tipo"] == "audio":
+            return stream
+    return None
+
+
+@etapa(ETAPA_SONDAR)
+def quadros_chave(arquivo, indice_stream):
+    """
+    Lista os instantes dos quadros-chave de um stream de vídeo
+
+    Lê apenas os pacotes (sem decodificar), o que é rápido mesmo em vídeos
+    longos.
+
+    Args:
+        arquivo (str): Caminho do arquivo
+        indice_stream (int): Índice do stream de vídeo (ver stream_video)
+
+    Returns:
+        list: Instantes (em segundos) dos quadros-chave, em ordem crescente
+
+    Raises:
+        RuntimeError: Se o FFprobe não conseguir ler o arquivo
+    """
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", str(indice_stream),
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0",
+        arquivo
+    ]
+
+    try:
+        processo = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+    except FileNotFoundError:
+        raise RuntimeError(
+            "FFprobe não está instalado ou não está disponível no PATH."
+        )
+
+    if processo.returncode != 0:
+        raise RuntimeError(f"Erro no FFprobe: {processo.stderr.strip()}")
+
+    # Linhas no formato "12.345000,K__" (K indica quadro-chave)
+    instantes = set()
+    for linha in processo.stdout.splitlines():
+        instante, _, flags = linha.partition(",")
+        if "K" in flags:
+            valor = _numero(instante)
+            if valor is not None:
+                instantes.add(valor)
+
+    return sorted(instantes)
+
+
+def caminho_cache_padrao():
+    """
+    Retorna o caminho padrão do banco de cache
+
+    Returns:
+        str: Caminho do arquivo SQLite
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "conversor_arquivos", "metadados.sqlite3")
+
+
+class CacheMetadados:
+    """
+    Cache persistente (SQLite) dos metadados de mídia
+
+    As entradas são identificadas por (caminho, tamanho, mtime_ns), de modo
+    que um arquivo alterado é sondado novamente. Entradas gravadas com outra
+    VERSAO_METADADOS também são sondadas de novo.
+    """
+
+    def __init__(self, caminho=None):
+        """
+        Abre (ou cria) o banco de cache
+
+        Args:
+            caminho (str): Caminho do arquivo SQLite (padrão em ~/.cache)
+        """
+        self.caminho = caminho or caminho_cache_padrao()
+        self._lock = threading.Lock()
+
+        try:
+            os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+            self._conexao = sqlite3.connect(self.caminho, timeout=30, check_same_thread=False)
+            self._conexao.execute(
+                "CREATE TABLE IF NOT EXISTS metadados ("
+                " caminho TEXT PRIMARY KEY,"
+                " tamanho INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " dados TEXT NOT NULL)"
+            )
+            self._conexao.execute(
+                "CREATE TABLE IF NOT EXISTS medicoes ("
+                " caminho TEXT NOT NULL,"
+                " chave TEXT NOT NULL,"
+                " tamanho INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " dados TEXT NOT NULL,"
+                " PRIMARY KEY (caminho, chave))"
+            )
+            self._conexao.commit()
+        except (OSError, sqlite3.Error) as e:
+            # Sem cache persistente (ex.: diretório somente leitura)
+            print(f"Cache de metadados indisponível: {str(e)}")
+            self._conexao = None
+
+    def obter(self, arquivo):
+        """
+        Retorna os metadados do arquivo, sondando apenas se necessário
+
+        Args:
+            arquivo (str): Caminho do arquivo
+
+        Returns:
+            dict: Metadados do arquivo (ver sondar_midia)
+        """
+        caminho = os.path.abspath(arquivo)
+        info = os.stat(caminho)
+
+        dados = self._consultar(caminho, info.st_size, info.st_mtime_ns)
+        if dados is not None:
+            return dados
+
+        dados = sondar_midia(caminho)
+        self._gravar(caminho, info.st_size, info.st_mtime_ns, dados)
+        return dados
+
+    def _consultar(self, caminho, tamanho, mtime_ns):
+        """
+        Procura os metadados no banco
+
+        Args:
+            caminho (str): Caminho absoluto do arquivo
+            tamanho (int): Tamanho atual do arquivo
+            mtime_ns (int): Data de modificação atual do arquivo
+
+        Returns:
+            dict: Metadados em cache ou None
+        """
+        if self._conexao is None:
+            return None
+
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT dados FROM metadados WHERE caminho = ? AND tamanho = ? AND mtime_ns = ?",
+                (caminho, tamanho, mtime_ns)
+            ).fetchone()
+
+        if not linha:
+            return None
+
+        dados = json.loads(linha[0])
+        return dados if dados.get("versao") == VERSAO_METADADOS else None
+
+    def _gravar(self, caminho, tamanho, mtime_ns, dados):
+        """
+        Grava os metadados no banco
+
+        Args:
+            caminho (str): Caminho absoluto do arquivo
+            tamanho (int): Tamanho do arquivo
+            mtime_ns (int): Data de modificação do arquivo
+            dados (dict): Metadados sondados
+        """
+        if self._conexao is None:
+            return
+
+        try:
+            with self._lock:
+                self._conexao.execute(
+                    "INSERT OR REPLACE INTO metadados (caminho, tamanho, mtime_ns, dados) VALUES (?, ?, ?, ?)",
+                    (caminho, tamanho, mtime_ns, json.dumps(dados))
+                )
+                self._conexao.commit()
+        except sqlite3.Error as e:
+            print(f"Erro ao gravar cache de metadados: {str(e)}")
+
+    def obter_medicoes(self, arquivo, chave):
+        """
+        Procura as medições feitas em um arquivo com a mesma configuração
+
+        Args:
+            arquivo (str): Caminho do arquivo
+            chave (str): Identificação da configuração medida (encoder,
+                métrica, trechos...)
+
+        Returns:
+            dict: Medições em cache ou None (também se o arquivo mudou)
+        """
+        if self._conexao is None:
+            return None
+
+        caminho = os.path.abspath(arquivo)
+        info = os.stat(caminho)
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT dados FROM medicoes"
+                " WHERE caminho = ? AND chave = ? AND tamanho = ? AND mtime_ns = ?",
+                (caminho, chave, info.st_size, info.st_mtime_ns)
+            ).fetchone()
+
+        return json.loads(linha[0]) if linha else None
+
+    def gravar_medicoes(self, arquivo, chave, dados):
+        """
+        Grava as medições feitas em um arquivo
+
+        Args:
+            arquivo (str): Caminho do arquivo
+            chave (str): Identificação da configuração medida
+            dados (dict): Medições (serializáveis em JSON)
+        """
+        if self._conexao is None:
+            return
+
+        caminho = os.path.abspath(arquivo)
+        info = os.stat(caminho)
+        try:
+            with self._lock:
+                self._conexao.execute(
+                    "INSERT OR REPLACE INTO medicoes (caminho, chave, tamanho, mtime_ns, dados)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (caminho, chave, info.st_size, info.st_mtime_ns, json.dumps(dados))
+                )
+                self._conexao.commit()
+        except sqlite3.Error as e:
+            print(f"Erro ao gravar medições no cache: {str(e)}")
+
+
+# Cache compartilhado pelos motores do processo
+_cache_padrao = None
+_cache_lock = threading.Lock()
+
+
+def obter_cache():
+    """
+    Retorna o cache compartilhado, abrindo-o na primeira vez
+
+    Returns:
+        CacheMetadados: Cache compartilhado pelos motores
+    """
+    global _cache_padrao
+    with _cache_lock:
+        if _cache_padrao is None:
+            _cache_padrao = CacheMetadados()
+    return _cache_padrao
+
+
+@etapa(ETAPA_SONDAR)
+def obter_metadados(arquivo):
+    """
+    Retorna os metadados de um arquivo usando o cache compartilhado
+
+    Args:
+        arquivo (str): Caminho do arquivo
+
+    Returns:
+        dict: Metadados do arquivo (ver sondar_midia)
+    """
+    return obter_cache().obter(arquivo)
@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Módulo que contém a instrumentação das etapas de conversão e compressão
+
+Os motores marcam as etapas de cada arquivo (sondar, decodificar,
+redimensionar, codificar, gravar e renomear) com ``etapa()``. Cada etapa
+concluída gera um evento com os instantes de início e fim (time.monotonic),
+entregue aos ganchos registrados com ``registrar_gancho()``. Sem ganchos, as
+etapas não são medidas. O ColetorMetricas é um gancho que acumula histogramas
+de duração por manipulador e etapa e os grava em JSON ou no formato de texto
+do Prometheus.
+"""
+
+import os
+import json
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+# Etapas medidas pelos motores
+ETAPA_SONDAR = "sondar"
+ETAPA_DECODIFICAR = "decodificar"
+ETAPA_REDIMENSIONAR = "redimensionar"
+ETAPA_CODIFICAR = "codificar"
+ETAPA_GRAVAR = "gravar"
+ETAPA_RENOMEAR = "renomear"
+ETAPAS = (
+    ETAPA_SONDAR, ETAPA_DECODIFICAR, ETAPA_REDIMENSIONAR,
+    ETAPA_CODIFICAR, ETAPA_GRAVAR, ETAPA_RENOMEAR
+)
+
+# Limites (em segundos) dos intervalos dos histogramas
+LIMITES_PADRAO = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 30, 60, 120, 300, 600
+)
+
+# Nome da métrica no formato do Prometheus
+NOME_METRICA = "conversor_etapa_duracao_segundos"
+
+# Ganchos que recebem os eventos de etapa
+_ganchos = []
+_ganchos_lock = threading.Lock()
+
+# Manipulador e arquivo em processamento em cada thread
+_contexto = threading.local()
+
+
+def registrar_gancho(gancho):
+    """
+    Registra uma função chamada com cada evento de etapa
+
+    Os eventos são dicionários com "evento" ("etapa"), "manipulador",
+    "etapa", "arquivo", "inicio", "fim", "duracao" e "sucesso". A função é
+    chamada na thread que executou a etapa e não deve demorar.
+
+    Args:
+        gancho (function): Função que recebe o evento
+    """
+    with _ganchos_lock:
+        _ganchos.append(gancho)
+
+
+def remover_gancho(gancho):
+    """
+    Remove um gancho registrado
+
+    Args:
+        gancho (function): Função registrada com registrar_gancho
+    """
+    with _ganchos_lock:
+        if gancho in _ganchos:
+            _ganchos.remove(gancho)
+
+
+def emitir(evento):
+    """
+    Entrega um evento de etapa aos ganchos registrados
+
+    Args:
+        evento (dict): Evento de etapa
+    """
+    with _ganchos_lock:
+        ganchos = list(_ganchos)
+
+    for gancho in ganchos:
+        try:
+            gancho(evento)
+        except Exception as e:
+            print(f"Erro ao repassar evento de etapa: {str(e)}")
+
+
+def manipulador_atual():
+    """
+    Retorna o manipulador e o arquivo em processamento na thread atual
+
+    Returns:
+        tuple: (manipulador, arquivo) ou (None, None)
+    """
+    return getattr(_contexto, "manipulador", None), getattr(_contexto, "arquivo", None)
+
+
+@contextmanager
+def manipulador(nome, arquivo=None):
+    """
+    Define o manipulador (ex.: "conversor.imagem") das etapas executadas no
+    bloco pela thread atual
+
+    Args:
+        nome (str): Nome do manipulador
+        arquivo (str): Arquivo em processamento
+    """
+    anterior = manipulador_atual()
+    _contexto.manipulador, _contexto.arquivo = nome, arquivo
+    try:
+        yield
+    finally:
+        _contexto.manipulador, _contexto.arquivo = anterior
+
+
+@contextmanager
+def etapa(nome):
+    """
+    Mede uma etapa do manipulador atual e emite o evento ao final
+
+    Args:
+        nome (str): Nome da etapa (ver ETAPAS)
+    """
+    if not _ganchos:
+        # Ninguém acompanha: não mede
+        yield
+        return
+
+    nome_manipulador, arquivo = manipulador_atual()
+    inicio = time.monotonic()
+    sucesso = False
+    try:
+        yield
+        sucesso = True
+    finally:
+        fim = time.monotonic()
+        emitir({
+            "evento": "etapa",
+            "manipulador": nome_manipulador or "desconhecido",
+            "etapa": nome,
+            "arquivo": arquivo,
+            "inicio": inicio,
+            "fim": fim,
+            "duracao": fim - inicio,
+            "sucesso": sucesso
+        })
+
+
+def _rotulos(manipulador_metrica, etapa_metrica, **extras):
+    """
+    Formata os rótulos de uma série do Prometheus
+
+    Args:
+        manipulador_metrica (str): Nome do manipulador
+        etapa_metrica (str): Nome da etapa
+        **extras: Rótulos adicionais (ex.: le)
+
+    Returns:
+        str: Rótulos entre chaves
+    """
+    rotulos = {"manipulador": manipulador_metrica, "etapa": etapa_metrica, **extras}
+    partes = []
+    for chave, valor in rotulos.items():
+        valor = str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        partes.append(f'{chave}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def _numero_prometheus(valor):
+    """
+    Formata um limite de histograma como o Prometheus espera
+
+    Args:
+        valor (float): Limite
+
+    Returns:
+        str: Limite formatado
+    """
+    return "+Inf" if math.isinf(valor) else repr(float(valor))
+
+
+class ColetorMetricas:
+    """
+    Gancho que acumula histogramas da duração das etapas por manipulador
+    """
+
+    def __init__(self, limites=LIMITES_PADRAO):
+        """
+        Inicializa o coletor vazio
+
+        Args:
+            limites (tuple): Limites superiores dos intervalos em segundos
+        """
+        self.limites = tuple(sorted(limites)) + (math.inf,)
+        self._lock = threading.Lock()
+
+        # (manipulador, etapa) -> contagens por intervalo, soma, quantidade e falhas
+        self._histogramas = {}
+
+    def __call__(self, evento):
+        """
+        Registra um evento de etapa (permite usar o coletor como gancho)
+
+        Args:
+            evento (dict): Evento de etapa
+        """
+        if evento.get("evento") != "etapa":
+            return
+
+        chave = (evento["manipulador"], evento["etapa"])
+        duracao = evento["duracao"]
+        with self._lock:
+            histograma = self._histogramas.get(chave)
+            if histograma is None:
+                histograma = {"contagens": [0] * len(self.limites), "soma": 0.0, "quantidade": 0, "falhas": 0}
+                self._histogramas[chave] = histograma
+
+            for indice, limite in enumerate(self.limites):
+                if duracao <= limite:
+                    histograma["contagens"][indice] += 1
+                    break
+            histograma["soma"] += duracao
+            histograma["quantidade"] += 1
+            if not evento.get("sucesso", True):
+                histograma["falhas"] += 1
+
+    def _copiar(self):
+        """
+        Copia os histogramas para serem formatados fora do lock
+
+        Returns:
+            list: Tuplas ((manipulador, etapa), histograma) ordenadas
+        """
+        with self._lock:
+            return sorted(
+                (chave, {**histograma, "contagens": list(histograma["contagens"])})
+                for chave, histograma in self._histogramas.items()
+            )
+
+    def para_dict(self):
+        """
+        Retorna os histogramas em uma forma serializável em JSON
+
+        Returns:
+            dict: Limites e histogramas (contagens acumuladas por limite)
+        """
+        histogramas = []
+        for (nome_manipulador, nome_etapa), histograma in self._copiar():
+            acumuladas = []
+            total = 0
+            for contagem in histograma["contagens"]:
+                total += contagem
+                acumuladas.append(total)
+
+            histogramas.append({
+                "manipulador": nome_manipulador,
+                "etapa": nome_etapa,
+                "contagens": acumuladas,
+                "soma": round(histograma["soma"], 6),
+                "quantidade": histograma["quantidade"],
+                "falhas": histograma["falhas"]
+            })
+
+        return {
+            "limites": [None if math.isinf(limite) else limite for limite in self.limites],
+            "histogramas": histogramas
+        }
+
+    def texto_prometheus(self):
+        """
+        Formata os histogramas no formato de texto do Prometheus
+
+        Returns:
+            str: Métricas em texto
+        """
+        linhas = [
+            f"# HELP {NOME_METRICA} Duração das etapas de conversão e compressão por manipulador",
+            f"# TYPE {NOME_METRICA} histogram"
+        ]
+        falhas = []
+        for (nome_manipulador, nome_etapa), histograma in self._copiar():
+            total = 0
+            for limite, contagem in zip(self.limites, histograma["contagens"]):
+                total += contagem
+                rotulos = _rotulos(nome_manipulador, nome_etapa, le=_numero_prometheus(limite))
+                linhas.append(f"{NOME_METRICA}_bucket{rotulos} {total}")
+
+            rotulos = _rotulos(nome_manipulador, nome_etapa)
+            linhas.append(f"{NOME_METRICA}_sum{rotulos} {histograma['soma']!r}")
+            linhas.append(f"{NOME_METRICA}_count{rotulos} {histograma['quantidade']}")
+            falhas.append(f"conversor_etapa_falhas_total{rotulos} {histograma['falhas']}")
+
+        linhas.append("# HELP conversor_etapa_falhas_total Etapas interrompidas por erro ou cancelamento")
+        linhas.append("# TYPE conversor_etapa_falhas_total counter")
+        linhas.extend(falhas)
+        return "\n".join(linhas) + "\n"
+
+    def gravar(self, caminho):
+        """
+        Grava as métricas em um arquivo, substituindo-o de forma atômica
+
+        Arquivos terminados em .json recebem JSON; os demais, o formato de
+        texto do Prometheus (ex.: para o textfile collector do node_exporter).
+
+        Args:
+            caminho (str): Arquivo de destino
+        """
+        if caminho.lower().endswith(".json"):
+            conteudo = json.dumps(self.para_dict(), ensure_ascii=False, indent=2) + "\n"
+        else:
+            conteudo = self.texto_prometheus()
+
+        diretorio = os.path.dirname(os.path.abspath(caminho))
+        os.makedirs(diretorio, exist_ok=True)
+        temporario = os.path.join(diretorio, f".{os.path.basename(caminho)}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(temporario, "w", encoding="utf-8") as f:
+            f.write(conteudo)
+        os.replace(temporario, caminho)
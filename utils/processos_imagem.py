@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Módulo que contém o executor de tarefas de imagem em processos separados
+
+A decodificação, o redimensionamento e a codificação feitos pelo Pillow
+seguram o GIL em boa parte do tempo, de modo que várias threads processando
+imagens acabam usando apenas um núcleo. O ExecutorImagens envia essas tarefas
+em lotes para um ProcessPoolExecutor e repassa o progresso de volta ao
+processo principal.
+"""
+
+import os
+import sys
+import functools
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from utils import metricas
+
+# Operações aceitas pelo executor
+OPERACAO_CONVERTER = "converter"
+OPERACAO_COMPRIMIR = "comprimir"
+
+# Estado de cada processo trabalhador (preenchido por _inicializar_processo)
+_fila_progresso_processo = None
+_motores_processo = {}
+
+
+def _inicializar_processo(fila_progresso):
+    """
+    Inicializa um processo trabalhador
+
+    Args:
+        fila_progresso (multiprocessing.Queue): Fila usada para enviar o
+            progresso ao processo principal
+    """
+    global _fila_progresso_processo
+    _fila_progresso_processo = fila_progresso
+
+    # Mensagens dos motores (print) não devem se misturar à saída do processo
+    # principal, que pode estar reservada para resultados (linha de comando)
+    sys.stdout = sys.stderr
+
+    # Os eventos de etapa seguem pela fila de progresso e são repassados aos
+    # ganchos do processo principal (identificador None)
+    metricas.registrar_gancho(lambda evento: fila_progresso.put((None, evento)))
+
+
+def _obter_motor(operacao):
+    """
+    Retorna (criando se necessário) o motor usado pela operação no processo
+
+    Args:
+        operacao (str): OPERACAO_CONVERTER ou OPERACAO_COMPRIMIR
+
+    Returns:
+        Conversor ou Compressor: Motor do processo trabalhador
+    """
+    if operacao not in _motores_processo:
+        if operacao == OPERACAO_CONVERTER:
+            from utils.conversor import Conversor
+            _motores_processo[operacao] = Conversor()
+        else:
+            from utils.compressor import Compressor
+            _motores_processo[operacao] = Compressor()
+    return _motores_processo[operacao]
+
+
+def _processar_lote(lote):
+    """
+    Processa um lote de tarefas de imagem em um processo trabalhador
+
+    Args:
+        lote (list): Tuplas (identificador, operação, argumentos)
+
+    Returns:
+        list: Tuplas (identificador, sucesso, resultado ou mensagem de erro)
+    """
+    from utils.agendador import Tarefa
+
+    resultados = []
+    for identificador, operacao, argumentos in lote:
+        def atualizar_progresso(progresso, identificador=identificador):
+            _fila_progresso_processo.put((identificador, progresso))
+
+        try:
+            motor = _obter_motor(operacao)
+            nome_manipulador = "conversor.imagem" if operacao == OPERACAO_CONVERTER else "compressor.imagem"
+            with metricas.manipulador(nome_manipulador, argumentos[0]):
+                if operacao == OPERACAO_CONVERTER:
+                    resultado = motor._converter_imagem(*argumentos, Tarefa(), atualizar_progresso)
+                else:
+                    resultado = motor._comprimir_imagem(*argumentos, Tarefa(), atualizar_progresso)
+            resultados.append((identificador, True, resultado))
+        except Exception as e:
+            # Exceções nem sempre podem ser serializadas; envia a mensagem
+            resultados.append((identificador, False, f"{type(e).__name__}: {e}"))
+
+    return resultados
+
+
+class ExecutorImagens:
+    """
+    Executa conversões e compressões de imagem em um pool de processos
+
+    As tarefas submetidas são agrupadas em lotes (até ``tamanho_lote`` tarefas
+    ou ``espera_lote`` segundos) antes de serem enviadas aos processos, o que
+    reduz o custo de comunicação em lotes com milhares de fotos.
+    """
+
+    def __init__(self, max_processos=None, tamanho_lote=8, espera_lote=0.05):
+        """
+        Inicializa o executor
+
+        Args:
+            max_processos (int): Número de processos (padrão: núcleos da máquina)
+            tamanho_lote (int): Quantidade máxima de tarefas por lote
+            espera_lote (float): Tempo máximo que uma tarefa espera o lote encher
+        """
+        self.max_processos = max_processos or os.cpu_count() or 1
+        self.tamanho_lote = max(1, int(tamanho_lote))
+        self.espera_lote = espera_lote
+
+        # "spawn" evita herdar o estado das threads da aplicação (Tk, agendador)
+        contexto = multiprocessing.get_context("spawn")
+        self._fila_progresso = contexto.Queue()
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_processos,
+            mp_context=contexto,
+            initializer=_inicializar_processo,
+            initargs=(self._fila_progresso,)
+        )
+
+        self._condicao = threading.Condition()
+        self._pendentes = []
+        self._futuros = {}
+        self._callbacks = {}
+        self._identificadores = itertools.count()
+        self._encerrado = False
+
+        # Thread que forma os lotes e thread que repassa o progresso
+        self._thread_lotes = threading.Thread(
+            target=self._formar_lotes, name="imagens-lotes", daemon=True
+        )
+        self._thread_progresso = threading.Thread(
+            target=self._repassar_progresso, name="imagens-progresso", daemon=True
+        )
+        self._thread_lotes.start()
+        self._thread_progresso.start()
+
+    def submeter(self, operacao, argumentos, callback_progresso=None):
+        """
+        Submete uma tarefa de imagem
+
+        Args:
+            operacao (str): OPERACAO_CONVERTER ou OPERACAO_COMPRIMIR
+            argumentos (tuple): Argumentos do manipulador de imagem do motor,
+                sem a tarefa e o callback de progresso
+            callback_progresso (function): Função chamada com o progresso
+
+        Returns:
+            concurrent.futures.Future: Resultado do manipulador
+        """
+        futuro = Future()
+        with self._condicao:
+            if self._encerrado:
+                raise RuntimeError("O executor de imagens já foi encerrado.")
+
+            identificador = next(self._identificadores)
+            self._futuros[identificador] = futuro
+            if callback_progresso:
+                self._callbacks[identificador] = callback_progresso
+            self._pendentes.append((identificador, operacao, tuple(argumentos)))
+            self._condicao.notify_all()
+
+        return futuro
+
+    def executar(self, operacao, argumentos, tarefa=None, callback_progresso=None):
+        """
+        Submete uma tarefa de imagem e aguarda o resultado
+
+        Uma tarefa cancelada antes de ser enviada a um processo é descartada.
+        Depois de enviada, ela é concluída e o resultado é ignorado.
+
+        Args:
+            operacao (str): OPERACAO_CONVERTER ou OPERACAO_COMPRIMIR
+            argumentos (tuple): Argumentos do manipulador de imagem do motor
+            tarefa (Tarefa): Tarefa com o sinal de cancelamento da operação
+            callback_progresso (function): Função chamada com o progresso
+
+        Returns:
+            bool: True se a operação foi bem-sucedida, False se foi cancelada
+        """
+        futuro = self.submeter(operacao, argumentos, callback_progresso)
+
+        while True:
+            try:
+                resultado = futuro.result(timeout=0.2)
+                break
+            except TimeoutError:
+                # Retira da fila tarefas canceladas que ainda não foram enviadas
+                if tarefa is not None and tarefa.cancelado.is_set() and self._descartar(futuro):
+                    return False
+
+        if tarefa is not None and tarefa.cancelado.is_set():
+            return False
+        return resultado
+
+    def _descartar(self, futuro):
+        """
+        Remove da fila uma tarefa que ainda não foi enviada aos processos
+
+        Args:
+            futuro (Future): Futuro retornado por submeter
+
+        Returns:
+            bool: True se a tarefa foi descartada
+        """
+        with self._condicao:
+            for posicao, (identificador, _, _) in enumerate(self._pendentes):
+                if self._futuros.get(identificador) is futuro:
+                    del self._pendentes[posicao]
+                    del self._futuros[identificador]
+                    self._callbacks.pop(identificador, None)
+                    return True
+        return False
+
+    def _formar_lotes(self):
+        """
+        Agrupa as tarefas pendentes em lotes e envia ao pool de processos
+        """
+        while True:
+            with self._condicao:
+                while not self._pendentes and not self._encerrado:
+                    self._condicao.wait()
+                if self._encerrado and not self._pendentes:
+                    return
+
+                # Espera o lote encher, sem atrasar a primeira tarefa demais
+                if len(self._pendentes) < self.tamanho_lote and not self._encerrado:
+                    self._condicao.wait(self.espera_lote)
+
+                lote = self._pendentes[:self.tamanho_lote]
+                del self._pendentes[:self.tamanho_lote]
+
+            if not lote:
+                continue
+
+            identificadores = [item[0] for item in lote]
+            futuro_lote = self._pool.submit(_processar_lote, lote)
+            futuro_lote.add_done_callback(
+                functools.partial(self._concluir_lote, identificadores)
+            )
+
+    def _concluir_lote(self, identificadores, futuro_lote):
+        """
+        Resolve os futuros individuais a partir do resultado de um lote
+
+        Args:
+            identificadores (list): Identificadores das tarefas do lote
+            futuro_lote (Future): Futuro do lote enviado ao pool
+        """
+        erro_lote = futuro_lote.exception()
+        if erro_lote:
+            # O processo morreu (ex.: falta de memória): todas as tarefas falham
+            resultados = [
+                (i, False, f"Falha no processo de imagem: {erro_lote}")
+                for i in identificadores
+            ]
+        else:
+            resultados = futuro_lote.result()
+
+        with self._condicao:
+            futuros = {i: self._futuros.pop(i, None) for i in identificadores}
+            for identificador in identificadores:
+                self._callbacks.pop(identificador, None)
+
+        for identificador, sucesso, valor in resultados:
+            futuro = futuros.get(identificador)
+            if futuro is None:
+                continue
+            if sucesso:
+                futuro.set_result(valor)
+            else:
+                futuro.set_exception(RuntimeError(valor))
+
+    def _repassar_progresso(self):
+        """
+        Repassa as atualizações de progresso dos processos aos callbacks
+        """
+        while True:
+            mensagem = self._fila_progresso.get()
+            if mensagem is None:
+                return
+
+            identificador, progresso = mensagem
+            if identificador is None:
+                # Evento de etapa medido no processo trabalhador
+                metricas.emitir(progresso)
+                continue
+
+            with self._condicao:
+                callback = self._callbacks.get(identificador)
+            if callback:
+                try:
+                    callback(progresso)
+                except Exception as e:
+                    print(f"Erro ao repassar progresso: {str(e)}")
+
+    def encerrar(self):
+        """
+        Encerra o executor após concluir as tarefas já submetidas
+        """
+        with self._condicao:
+            self._encerrado = True
+            self._condicao.notify_all()
+
+        self._thread_lotes.join()
+        self._pool.shutdown(wait=True)
+        self._fila_progresso.put(None)
+        self._thread_progresso.join()
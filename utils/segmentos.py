@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Módulo que contém as funções auxiliares da codificação de vídeos em
+segmentos paralelos e da escolha do CRF por trechos amostrados
+"""
+
+import threading
+
+# Duração padrão (em segundos) de cada segmento
+DURACAO_SEGMENTO_PADRAO = 60
+
+# Trechos amostrados na escolha automática do CRF e a duração (em segundos)
+# de cada um
+AMOSTRAS_QUALIDADE = 3
+DURACAO_AMOSTRA = 4.0
+
+# CRFs experimentados nos trechos amostrados
+CRFS_CANDIDATOS = (18, 21, 24, 27, 30, 33)
+
+# Métricas aceitas e a pontuação mínima padrão de cada uma (o SSIM vai de 0
+# a 1; o PSNR é medido em dB)
+METRICAS_QUALIDADE = {"ssim": 0.98, "psnr": 40.0}
+METRICA_PADRAO = "ssim"
+
+
+def pontos_de_corte(quadros_chave, duracao, duracao_segmento=DURACAO_SEGMENTO_PADRAO):
+    """
+    Escolhe os quadros-chave onde o vídeo será dividido
+
+    Cada corte é o primeiro quadro-chave depois de ``duracao_segmento``
+    segundos desde o corte anterior, de modo que os segmentos podem ser
+    separados sem recodificação. Um último segmento muito curto é unido ao
+    anterior.
+
+    Args:
+        quadros_chave (list): Instantes dos quadros-chave (em segundos)
+        duracao (float): Duração total do vídeo
+        duracao_segmento (float): Duração desejada de cada segmento
+
+    Returns:
+        list: Instantes dos cortes (vazia se o vídeo não precisa ser dividido)
+    """
+    cortes = []
+    proximo = duracao_segmento
+    for instante in quadros_chave:
+        if instante >= proximo and instante < duracao:
+            cortes.append(instante)
+            proximo = instante + duracao_segmento
+
+    # Evita um último segmento com menos de um quarto do tamanho desejado
+    if cortes and duracao - cortes[-1] < duracao_segmento / 4:
+        cortes.pop()
+
+    return cortes
+
+
+def trechos_de_amostra(duracao, quantidade=AMOSTRAS_QUALIDADE, duracao_amostra=DURACAO_AMOSTRA):
+    """
+    Escolhe os trechos do vídeo codificados na escolha automática do CRF
+
+    Os trechos são distribuídos igualmente ao longo do vídeo, longe do início
+    e do fim (aberturas e créditos costumam ser mais simples que o resto).
+    Vídeos curtos demais viram um único trecho com o vídeo inteiro.
+
+    Args:
+        duracao (float): Duração total do vídeo
+        quantidade (int): Quantidade de trechos
+        duracao_amostra (float): Duração de cada trecho
+
+    Returns:
+        list: Tuplas (inicio, duracao) em segundos
+    """
+    if duracao <= quantidade * duracao_amostra * 2:
+        return [(0.0, duracao)]
+
+    return [
+        (round(duracao * (indice + 1) / (quantidade + 1) - duracao_amostra / 2, 3), duracao_amostra)
+        for indice in range(quantidade)
+    ]
+
+
+def escolher_crf(pontuacoes, alvo):
+    """
+    Escolhe o maior CRF (menor arquivo) cuja pontuação atinge o alvo
+
+    Args:
+        pontuacoes (dict): Pontuação de cada CRF (a do pior trecho)
+        alvo (float): Pontuação mínima aceita
+
+    Returns:
+        int: CRF escolhido (o menor candidato se nenhum atingir o alvo)
+    """
+    aceitos = [crf for crf, pontuacao in pontuacoes.items() if pontuacao >= alvo]
+    return max(aceitos) if aceitos else min(pontuacoes)
+
+
+def escrever_lista_concat(caminho, arquivos):
+    """
+    Escreve a lista de arquivos lida pelo demuxer concat do FFmpeg
+
+    Args:
+        caminho (str): Caminho do arquivo de lista
+        arquivos (list): Caminhos absolutos dos segmentos, em ordem
+    """
+    with open(caminho, "w", encoding="utf-8") as f:
+        for arquivo in arquivos:
+            # Aspas simples são escapadas fechando e reabrindo a string
+            escapado = arquivo.replace("'", "'\\''")
+            f.write(f"file '{escapado}'\n")
+
+
+class ProgressoSegmentos:
+    """
+    Combina o progresso de vários segmentos em um único percentual,
+    ponderado pela duração de cada segmento
+    """
+
+    def __init__(self, duracoes, callback_progresso=None):
+        """
+        Inicializa o acompanhamento
+
+        Args:
+            duracoes (list): Duração de cada segmento, em segundos
+            callback_progresso (function): Função chamada com o progresso total
+        """
+        self.duracoes = duracoes
+        self.total = sum(duracoes) or 1
+        self.callback_progresso = callback_progresso
+        self._progressos = [0] * len(duracoes)
+        self._ultimo = -1
+        self._lock = threading.Lock()
+
+    def callback_segmento(self, indice):
+        """
+        Cria o callback de progresso de um segmento
+
+        Args:
+            indice (int): Posição do segmento
+
+        Returns:
+            function: Callback que recebe o progresso (0-100) do segmento
+        """
+        def atualizar(progresso):
+            self.atualizar(indice, progresso)
+        return atualizar
+
+    def atualizar(self, indice, progresso):
+        """
+        Registra o progresso de um segmento e repassa o total
+
+        Args:
+            indice (int): Posição do segmento
+            progresso (int): Progresso do segmento (0-100)
+        """
+        with self._lock:
+            self._progressos[indice] = progresso
+            concluido = sum(d * p for d, p in zip(self.duracoes, self._progressos))
+
+            # O 100% fica reservado para depois da concatenação
+            total = min(int(concluido / self.total), 99)
+            if total <= self._ultimo:
+                return
+            self._ultimo = total
+
+        if self.callback_progresso:
+            self.callback_progresso(total)
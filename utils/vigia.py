@@ -0,0 +1,767 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Módulo que contém o modo de vigia de pastas
+
+O Vigia observa um ou mais diretórios e, quando o tamanho e a data de
+modificação de um arquivo novo param de mudar, envia o arquivo ao Conversor
+ou ao Compressor segundo a regra da pasta. No Linux as mudanças são
+informadas pelo inotify; nos demais sistemas as pastas são varridas
+periodicamente. Os arquivos prontos passam por uma fila limitada, de modo que
+uma rajada de milhares de arquivos não cria milhares de tarefas de uma vez.
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import ctypes
+import select
+import struct
+import threading
+import ctypes.util
+
+from utils.agendador import tarefa_atual
+from utils.diario import (
+    ESTADO_CANCELADO, ESTADO_CONCLUIDO, ESTADO_ERRO, ESTADO_EXECUTANDO, DiarioLote,
+    impressao_digital
+)
+
+# Operações aceitas nas regras
+OPERACAO_CONVERTER = "converter"
+OPERACAO_COMPRIMIR = "comprimir"
+
+# Tempo (em segundos) sem mudanças para um arquivo ser considerado completo
+ESTABILIDADE_PADRAO = 5.0
+
+# Intervalo (em segundos) entre as varreduras quando não há inotify
+INTERVALO_PADRAO = 2.0
+
+# Número máximo de arquivos prontos aguardando ou em processamento
+MAX_FILA_PADRAO = 64
+
+# Eventos do inotify usados pelo observador (ver inotify(7))
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+MASCARA_INOTIFY = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
+
+# Cabeçalho de cada evento lido do inotify (wd, mask, cookie, len)
+_CABECALHO_EVENTO = struct.Struct("iIII")
+
+
+class RegraPasta:
+    """
+    Regra de processamento dos arquivos que chegam a uma pasta vigiada
+    """
+
+    def __init__(self, entrada, operacao, saida, formato=None, nivel="médio", opcoes=None, recursivo=True):
+        """
+        Inicializa a regra
+
+        Args:
+            entrada (str): Pasta vigiada
+            operacao (str): OPERACAO_CONVERTER ou OPERACAO_COMPRIMIR
+            saida (str): Diretório onde as saídas são gravadas
+            formato (str): Formato de saída (obrigatório na conversão)
+            nivel (str): Nível de compressão
+            opcoes (dict): Opções repassadas ao Conversor ou ao Compressor
+            recursivo (bool): Vigia também as subpastas
+        """
+        if operacao not in (OPERACAO_CONVERTER, OPERACAO_COMPRIMIR):
+            raise ValueError(f"Operação desconhecida na regra de {entrada}: {operacao}")
+        if operacao == OPERACAO_CONVERTER and not formato:
+            raise ValueError(f"A regra de conversão de {entrada} precisa de um formato")
+
+        self.entrada = os.path.abspath(entrada)
+        self.operacao = operacao
+        self.saida = os.path.abspath(saida)
+        self.formato = formato.lower() if formato else None
+        self.nivel = nivel
+        self.opcoes = dict(opcoes or {})
+        self.recursivo = recursivo
+
+        # Extensões aceitas (preenchidas pelo Vigia conforme o motor)
+        self.extensoes = set()
+
+    @classmethod
+    def de_dict(cls, dados, saida_padrao):
+        """
+        Cria uma regra a partir de um dicionário (ex.: lido de um arquivo JSON)
+
+        Args:
+            dados (dict): Campos "entrada", "operacao", "saida", "formato",
+                "nivel", "opcoes" e "recursivo"
+            saida_padrao (str): Diretório de saída quando a regra não informa
+
+        Returns:
+            RegraPasta: Regra criada
+        """
+        if "entrada" not in dados:
+            raise ValueError("Toda regra precisa do campo 'entrada'")
+
+        operacao = dados.get("operacao")
+        if operacao is None:
+            operacao = OPERACAO_CONVERTER if dados.get("formato") else OPERACAO_COMPRIMIR
+
+        return cls(
+            dados["entrada"],
+            operacao,
+            dados.get("saida") or saida_padrao,
+            formato=dados.get("formato"),
+            nivel=dados.get("nivel", "médio"),
+            opcoes=dados.get("opcoes"),
+            recursivo=dados.get("recursivo", True)
+        )
+
+    def parametros(self):
+        """
+        Retorna os parâmetros registrados no diário (os mesmos da linha de
+        comando, o que permite alternar entre os dois modos)
+
+        Returns:
+            dict: Formato ou nível e opções da regra
+        """
+        if self.operacao == OPERACAO_CONVERTER:
+            return {"formato": self.formato, "opcoes": self.opcoes}
+        return {"nivel": self.nivel, "opcoes": self.opcoes}
+
+    def nome_saida(self, arquivo, relativo, conversor):
+        """
+        Retorna o caminho de saída de um arquivo
+
+        Args:
+            arquivo (str): Arquivo de entrada
+            relativo (str): Caminho do arquivo relativo à pasta vigiada
+            conversor (Conversor): Usado para escolher o contêiner na
+                extração de áudio com formato "auto"
+
+        Returns:
+            str: Caminho da saída
+        """
+        base, extensao = os.path.splitext(relativo)
+        if self.operacao == OPERACAO_COMPRIMIR:
+            return os.path.join(self.saida, f"{base}_comprimido{extensao}")
+
+        formato = self.formato
+        if formato == "auto":
+            try:
+                formato = conversor.formato_extracao_audio(arquivo, self.opcoes)
+            except Exception:
+                # O erro real será informado quando o arquivo for processado
+                formato = "mp3"
+        return os.path.join(self.saida, f"{base}.{formato}")
+
+
+def carregar_regras(caminho, saida_padrao):
+    """
+    Lê as regras de um arquivo JSON
+
+    O arquivo contém uma lista de regras ou um objeto com a lista em "pastas".
+
+    Args:
+        caminho (str): Arquivo JSON
+        saida_padrao (str): Diretório de saída das regras que não informam
+
+    Returns:
+        list: Regras (RegraPasta)
+    """
+    with open(caminho, "r", encoding="utf-8") as f:
+        dados = json.load(f)
+
+    if isinstance(dados, dict):
+        dados = dados.get("pastas", [])
+
+    return [RegraPasta.de_dict(regra, saida_padrao) for regra in dados]
+
+
+def _carregar_libc():
+    """
+    Carrega as funções do inotify da biblioteca C
+
+    Returns:
+        ctypes.CDLL: Biblioteca C ou None se o inotify não estiver disponível
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class ObservadorInotify:
+    """
+    Observador de pastas baseado no inotify (Linux)
+    """
+
+    def __init__(self, libc):
+        """
+        Inicializa o observador
+
+        Args:
+            libc (ctypes.CDLL): Biblioteca C com as funções do inotify
+        """
+        self._libc = libc
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            erro = ctypes.get_errno()
+            raise OSError(erro, os.strerror(erro))
+
+        # Diretório observado por cada descritor de vigia
+        self._diretorios = {}
+
+    def observar(self, diretorio):
+        """
+        Passa a observar um diretório (não inclui as subpastas)
+
+        Args:
+            diretorio (str): Diretório observado
+
+        Returns:
+            bool: True se o diretório passou a ser observado
+        """
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(diretorio), MASCARA_INOTIFY)
+        if wd < 0:
+            # Diretório removido ou limite de vigias do sistema atingido
+            return False
+        self._diretorios[wd] = diretorio
+        return True
+
+    def aguardar(self, timeout):
+        """
+        Aguarda mudanças nas pastas observadas
+
+        Args:
+            timeout (float): Tempo máximo de espera em segundos
+
+        Returns:
+            tuple: (caminhos alterados, True se as pastas devem ser varridas
+                novamente porque eventos foram perdidos)
+        """
+        prontos, _, _ = select.select([self._fd], [], [], timeout)
+        if not prontos:
+            return set(), False
+
+        caminhos = set()
+        reexaminar = False
+        while True:
+            try:
+                dados = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+
+            posicao = 0
+            while posicao < len(dados):
+                wd, mascara, _, tamanho = _CABECALHO_EVENTO.unpack_from(dados, posicao)
+                posicao += _CABECALHO_EVENTO.size
+                nome = dados[posicao:posicao + tamanho].rstrip(b"\0")
+                posicao += tamanho
+
+                if mascara & IN_Q_OVERFLOW:
+                    # A fila do kernel transbordou: eventos foram perdidos
+                    reexaminar = True
+                elif mascara & IN_IGNORED:
+                    self._diretorios.pop(wd, None)
+                elif wd in self._diretorios and nome:
+                    caminhos.add(os.path.join(self._diretorios[wd], os.fsdecode(nome)))
+
+        return caminhos, reexaminar
+
+    def fechar(self):
+        """
+        Encerra o observador
+        """
+        os.close(self._fd)
+
+
+class ObservadorPolling:
+    """
+    Observador que apenas pede uma nova varredura a cada intervalo
+    """
+
+    def __init__(self, intervalo, parado):
+        """
+        Inicializa o observador
+
+        Args:
+            intervalo (float): Intervalo entre as varreduras em segundos
+            parado (threading.Event): Sinal de parada do Vigia
+        """
+        self.intervalo = intervalo
+        self._parado = parado
+        self._ultima = 0.0
+
+    def observar(self, diretorio):
+        """
+        As pastas são varridas por inteiro; não há nada a registrar
+
+        Args:
+            diretorio (str): Diretório observado
+
+        Returns:
+            bool: Sempre True
+        """
+        return True
+
+    def aguardar(self, timeout):
+        """
+        Aguarda até o momento da próxima varredura (ou o fim do timeout)
+
+        Args:
+            timeout (float): Tempo máximo de espera em segundos
+
+        Returns:
+            tuple: (conjunto vazio, True quando é hora de varrer as pastas)
+        """
+        restante = self._ultima + self.intervalo - time.monotonic()
+        if restante > 0:
+            self._parado.wait(min(restante, timeout))
+            if self._ultima + self.intervalo > time.monotonic():
+                return set(), False
+
+        self._ultima = time.monotonic()
+        return set(), True
+
+    def fechar(self):
+        """
+        Não há recursos a liberar
+        """
+
+
+class Vigia:
+    """
+    Processa os arquivos que chegam às pastas vigiadas
+
+    Um arquivo é enviado ao motor quando o seu tamanho e a sua data de
+    modificação não mudam por ``estabilidade`` segundos. Os arquivos prontos
+    entram em uma fila limitada a ``max_fila`` itens, e no máximo ``max_fila``
+    tarefas ficam no agendador ao mesmo tempo; enquanto a fila está cheia, os
+    demais aguardam como candidatos. O estado de cada arquivo fica no diário
+    do diretório de saída da regra, de modo que reiniciar o Vigia não refaz
+    os arquivos já concluídos.
+    """
+
+    def __init__(self, regras, conversor, compressor, agendador, estabilidade=ESTABILIDADE_PADRAO,
+                 intervalo=INTERVALO_PADRAO, max_fila=MAX_FILA_PADRAO, usar_inotify=True,
+                 ao_resultado=None, ao_progresso=None):
+        """
+        Inicializa o Vigia
+
+        Args:
+            regras (list): Regras (RegraPasta) de cada pasta vigiada
+            conversor (Conversor): Motor das regras de conversão
+            compressor (Compressor): Motor das regras de compressão
+            agendador (Agendador): Agendador onde os arquivos são processados
+            estabilidade (float): Segundos sem mudanças para um arquivo ser
+                considerado completo
+            intervalo (float): Intervalo entre as varreduras sem inotify
+            max_fila (int): Número máximo de arquivos prontos aguardando ou
+                em processamento
+            usar_inotify (bool): Usa o inotify quando disponível
+            ao_resultado (function): Chamada com o evento de cada arquivo
+                processado ou ignorado
+            ao_progresso (function): Chamada com os eventos de progresso
+        """
+        if not regras:
+            raise ValueError("Nenhuma pasta para vigiar")
+
+        self.regras = sorted(regras, key=lambda regra: len(regra.entrada), reverse=True)
+        self.conversor = conversor
+        self.compressor = compressor
+        self.agendador = agendador
+        self.estabilidade = estabilidade
+        self.intervalo = intervalo
+        self.ao_resultado = ao_resultado
+        self.ao_progresso = ao_progresso
+
+        for regra in self.regras:
+            if not os.path.isdir(regra.entrada):
+                raise FileNotFoundError(f"Pasta não encontrada: {regra.entrada}")
+            regra.extensoes = self._extensoes_aceitas(regra)
+
+        # Diretórios de saída não são vigiados (as saídas não são reprocessadas)
+        self._saidas = {regra.saida for regra in self.regras}
+
+        self._parado = threading.Event()
+        self._fila = queue.Queue(maxsize=max(1, int(max_fila)))
+        self._vagas = threading.BoundedSemaphore(max(1, int(max_fila)))
+
+        # Arquivos observados: caminho -> (regra, impressão digital, desde)
+        self._candidatos = {}
+        # Impressão digital dos arquivos já enviados ao motor (só dos que ainda
+        # existem: os removidos são esquecidos, ver _esquecer)
+        self._enviados = {}
+
+        self._tarefas = set()
+        self._lock = threading.Lock()
+        self._diarios = {}
+
+        libc = _carregar_libc() if usar_inotify else None
+        self._observador = ObservadorInotify(libc) if libc is not None else ObservadorPolling(intervalo, self._parado)
+
+    @property
+    def usa_inotify(self):
+        """
+        Indica se as mudanças são informadas pelo inotify
+
+        Returns:
+            bool: True com inotify, False com varreduras periódicas
+        """
+        return isinstance(self._observador, ObservadorInotify)
+
+    def _motor(self, regra):
+        """
+        Retorna o motor que processa os arquivos de uma regra
+
+        Args:
+            regra (RegraPasta): Regra da pasta
+
+        Returns:
+            Conversor ou Compressor: Motor da regra
+        """
+        return self.conversor if regra.operacao == OPERACAO_CONVERTER else self.compressor
+
+    def _extensoes_aceitas(self, regra):
+        """
+        Calcula as extensões que a regra consegue processar
+
+        Args:
+            regra (RegraPasta): Regra da pasta
+
+        Returns:
+            set: Extensões aceitas
+        """
+        motor = self._motor(regra)
+        if regra.operacao == OPERACAO_CONVERTER:
+            tipos = {tipo for tipo, formatos in motor.formatos_conversao.items() if regra.formato in formatos}
+            if regra.opcoes.get("extracao_audio"):
+                tipos.add("vídeo")
+        else:
+            tipos = set(motor.extensao_para_tipo.values())
+        return {ext for ext, tipo in motor.extensao_para_tipo.items() if tipo in tipos}
+
+    def _regra_do_caminho(self, caminho):
+        """
+        Encontra a regra da pasta que contém um caminho
+
+        Args:
+            caminho (str): Caminho absoluto
+
+        Returns:
+            RegraPasta: Regra da pasta mais interna que contém o caminho, ou
+                None se o caminho não deve ser processado
+        """
+        for saida in self._saidas:
+            if caminho == saida or caminho.startswith(saida + os.sep):
+                return None
+
+        for regra in self.regras:
+            if caminho.startswith(regra.entrada + os.sep):
+                if not regra.recursivo and os.path.dirname(caminho) != regra.entrada:
+                    return None
+                return regra
+        return None
+
+    def _diario(self, regra):
+        """
+        Retorna o diário do diretório de saída da regra
+
+        Args:
+            regra (RegraPasta): Regra da pasta
+
+        Returns:
+            DiarioLote: Diário compartilhado pelas regras com a mesma saída
+        """
+        with self._lock:
+            if regra.saida not in self._diarios:
+                self._diarios[regra.saida] = DiarioLote(regra.saida)
+            return self._diarios[regra.saida]
+
+    def _percorrer(self, regra, diretorio, observar=False, vistos=None):
+        """
+        Considera os arquivos de um diretório e, se a regra for recursiva, das
+        subpastas
+
+        Args:
+            regra (RegraPasta): Regra da pasta
+            diretorio (str): Diretório percorrido
+            observar (bool): Registra também os diretórios no observador
+            vistos (set): Recebe os caminhos dos arquivos encontrados
+        """
+        pendentes = [diretorio]
+        while pendentes:
+            atual = pendentes.pop()
+            if observar:
+                self._observador.observar(atual)
+            try:
+                with os.scandir(atual) as entradas:
+                    for entrada in entradas:
+                        if entrada.name.startswith("."):
+                            continue
+                        if entrada.is_dir(follow_symlinks=False):
+                            if regra.recursivo and self._regra_do_caminho(entrada.path) is regra:
+                                pendentes.append(entrada.path)
+                        elif entrada.is_file():
+                            if vistos is not None:
+                                vistos.add(entrada.path)
+                            self._considerar(entrada.path)
+            except OSError:
+                # Diretório removido durante a varredura
+                continue
+
+    def _considerar(self, caminho):
+        """
+        Registra um arquivo novo ou alterado como candidato
+
+        Args:
+            caminho (str): Caminho do arquivo ou diretório alterado
+        """
+        # Ocultos incluem as saídas parciais gravadas pelos motores
+        if os.path.basename(caminho).startswith("."):
+            return
+
+        regra = self._regra_do_caminho(caminho)
+        if regra is None:
+            return
+
+        impressao = impressao_digital(caminho)
+        if impressao[0] is None:
+            # Removido ou movido para fora da pasta
+            self._esquecer(regra, caminho)
+            return
+
+        if os.path.isdir(caminho):
+            # Pasta criada ou movida para dentro da pasta vigiada
+            if regra.recursivo:
+                self._percorrer(regra, caminho, observar=True)
+            return
+
+        if os.path.splitext(caminho)[1].lower() not in regra.extensoes:
+            return
+
+        if self._enviados.get(caminho) == impressao:
+            return
+
+        atual = self._candidatos.get(caminho)
+        if atual is None or atual[1] != impressao:
+            self._candidatos[caminho] = (regra, impressao, time.monotonic())
+
+    def _esquecer(self, regra, caminho):
+        """
+        Esquece o envio de um arquivo que deixou a pasta vigiada (se voltar,
+        o diário evita que seja refeito)
+
+        Args:
+            regra (RegraPasta): Regra da pasta
+            caminho (str): Caminho do arquivo ou diretório removido
+        """
+        if self._enviados.pop(caminho, None) is not None:
+            return
+        if os.path.splitext(caminho)[1].lower() in regra.extensoes:
+            return
+
+        # Pode ter sido um diretório: esquece os arquivos que estavam nele
+        prefixo = caminho + os.sep
+        for enviado in [enviado for enviado in self._enviados if enviado.startswith(prefixo)]:
+            del self._enviados[enviado]
+
+    def _verificar_estaveis(self):
+        """
+        Envia à fila os candidatos que não mudaram pelo tempo de estabilidade
+        """
+        agora = time.monotonic()
+        for caminho, (regra, impressao, desde) in list(self._candidatos.items()):
+            atual = impressao_digital(caminho)
+            if atual[0] is None:
+                # Arquivo removido ou movido antes de ficar pronto
+                del self._candidatos[caminho]
+                continue
+            if atual != impressao:
+                self._candidatos[caminho] = (regra, atual, agora)
+                continue
+            if agora - desde < self.estabilidade or atual[0] == 0:
+                continue
+
+            try:
+                self._fila.put_nowait((regra, caminho, atual))
+            except queue.Full:
+                # Os demais candidatos aguardam até a fila ter espaço
+                return
+            del self._candidatos[caminho]
+            self._enviados[caminho] = atual
+
+    def _despachar(self):
+        """
+        Laço que retira os arquivos prontos da fila e os submete ao agendador
+        """
+        while not self._parado.is_set():
+            try:
+                regra, arquivo, impressao = self._fila.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            # Limita as tarefas no agendador; a fila enche enquanto isso
+            while not self._vagas.acquire(timeout=0.5):
+                if self._parado.is_set():
+                    return
+
+            relativo = os.path.relpath(arquivo, regra.entrada)
+            arquivo_saida = regra.nome_saida(arquivo, relativo, self.conversor)
+            diario = self._diario(regra)
+
+            # Arquivos concluídos antes (mesma entrada e parâmetros) são ignorados
+            if diario.concluido(arquivo, arquivo_saida, regra.operacao, regra.parametros()):
+                self._vagas.release()
+                self._notificar({
+                    "evento": "resultado", "entrada": arquivo, "saida": arquivo_saida,
+                    "status": "ignorado", "duracao": 0
+                })
+                continue
+
+            diario.registrar(arquivo, arquivo_saida, regra.operacao, regra.parametros())
+            # A tarefa é registrada antes que _processar possa retirá-la
+            motor = self._motor(regra)
+            with self._lock:
+                tarefa = self.agendador.submeter(
+                    motor.fila_execucao(arquivo), self._processar, regra, arquivo, arquivo_saida, diario
+                )
+                self._tarefas.add(tarefa)
+
+    def _processar(self, regra, arquivo, arquivo_saida, diario):
+        """
+        Processa um arquivo no agendador, registrando o estado no diário
+
+        Args:
+            regra (RegraPasta): Regra da pasta
+            arquivo (str): Arquivo de entrada
+            arquivo_saida (str): Arquivo de saída
+            diario (DiarioLote): Diário do diretório de saída
+        """
+        inicio = time.monotonic()
+        tarefa = tarefa_atual()
+        evento = {"evento": "resultado", "entrada": arquivo, "saida": arquivo_saida}
+
+        def atualizar_progresso(progresso):
+            if self.ao_progresso is not None:
+                evento_progresso = {"evento": "progresso", "entrada": arquivo, "progresso": progresso}
+                if tarefa is not None and tarefa.estatisticas:
+                    evento_progresso.update(tarefa.estatisticas)
+                self.ao_progresso(evento_progresso)
+
+        diario.marcar(arquivo_saida, ESTADO_EXECUTANDO)
+        try:
+            os.makedirs(os.path.dirname(arquivo_saida), exist_ok=True)
+            if regra.operacao == OPERACAO_CONVERTER:
+                formato = regra.formato
+                if formato == "auto":
+                    formato = os.path.splitext(arquivo_saida)[1][1:]
+                concluido = self.conversor.converter_arquivo(
+                    arquivo, arquivo_saida, formato, regra.opcoes, atualizar_progresso, tarefa=tarefa
+                )
+            else:
+                concluido = self.compressor.comprimir_arquivo(
+                    arquivo, arquivo_saida, regra.nivel, atualizar_progresso, tarefa=tarefa,
+                    opcoes=regra.opcoes
+                )
+            evento["status"] = ESTADO_CONCLUIDO if concluido else ESTADO_CANCELADO
+            if concluido and tarefa is not None and tarefa.relatorio:
+                evento.update(tarefa.relatorio)
+        except Exception as e:
+            evento["status"] = ESTADO_ERRO
+            evento["erro"] = str(e)
+        finally:
+            evento["duracao"] = round(time.monotonic() - inicio, 3)
+            diario.marcar(arquivo_saida, evento.get("status", ESTADO_CANCELADO), evento.get("erro"))
+            with self._lock:
+                self._tarefas.discard(tarefa)
+            self._vagas.release()
+
+        self._notificar(evento)
+
+    def _notificar(self, evento):
+        """
+        Repassa o resultado de um arquivo a quem acompanha o Vigia
+
+        Args:
+            evento (dict): Evento do arquivo
+        """
+        if self.ao_resultado is not None:
+            self.ao_resultado(evento)
+
+    def executar(self):
+        """
+        Vigia as pastas até que parar() seja chamado (bloqueia a thread atual)
+        """
+        despachante = threading.Thread(target=self._despachar, name="vigia-despachante", daemon=True)
+        despachante.start()
+
+        try:
+            # Registra as pastas e considera os arquivos que já estão nelas
+            for regra in self.regras:
+                self._percorrer(regra, regra.entrada, observar=True)
+
+            # Acorda com frequência suficiente para notar os arquivos estáveis
+            espera = max(0.1, min(1.0, self.estabilidade / 2))
+            while not self._parado.is_set():
+                caminhos, reexaminar = self._observador.aguardar(espera)
+                if reexaminar:
+                    vistos = set()
+                    for regra in self.regras:
+                        self._percorrer(regra, regra.entrada, vistos=vistos)
+
+                    # Esquece os arquivos enviados que não existem mais
+                    for caminho in self._enviados.keys() - vistos:
+                        del self._enviados[caminho]
+                for caminho in caminhos:
+                    self._considerar(caminho)
+                self._verificar_estaveis()
+        finally:
+            self._parado.set()
+            despachante.join()
+            self._observador.fechar()
+
+    def parar(self, cancelar=False):
+        """
+        Interrompe o Vigia
+
+        Args:
+            cancelar (bool): Cancela também os arquivos em processamento (que
+                serão refeitos na próxima execução)
+        """
+        self._parado.set()
+        if cancelar:
+            with self._lock:
+                tarefas = list(self._tarefas)
+            for tarefa in tarefas:
+                tarefa.cancelar()
+
+    def aguardar_tarefas(self):
+        """
+        Aguarda o término dos arquivos em processamento e fecha os diários
+        """
+        with self._lock:
+            tarefas = list(self._tarefas)
+        for tarefa in tarefas:
+            tarefa.aguardar()
+
+        with self._lock:
+            for diario in self._diarios.values():
+                diario.fechar()
+            self._diarios.clear()
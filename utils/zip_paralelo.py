@@ -0,0 +1,555 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Módulo que contém a compressão de membros de ZIP em processos paralelos
+
+O ZipFile comprime os membros um de cada vez, na thread que chama write(),
+de modo que o DEFLATE usa um único núcleo. Aqui cada membro é comprimido em
+um processo trabalhador (CRC, tamanho e dados em DEFLATE puro) e o processo
+principal grava as entradas já comprimidas no ZIP, na ordem em que foram
+enviadas, deixando o diretório central a cargo do próprio ZipFile. Uma janela
+limita os membros em andamento, em quantidade e em bytes; membros grandes são
+comprimidos para um arquivo temporário em vez da memória.
+
+Membros de tipos que costumam já estar comprimidos (imagens, vídeos, áudios,
+arquivos compactados e documentos) têm o início comprimido como amostra; os
+que quase não diminuem são armazenados sem compressão (ver escolher_metodo).
+
+Os arquivos de um diretório são descobertos uma única vez, com os.scandir,
+por uma thread que entrega os membros à escrita enquanto percorre a árvore
+(ver EnumeracaoMembros).
+"""
+
+import os
+import sys
+import time
+import zlib
+import shutil
+import queue
+import zipfile
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Membros descobertos e ainda não gravados mantidos pela enumeração, entregues
+# em lotes para que a fila não pese em árvores com milhões de arquivos
+LIMITE_ENUMERACAO = 65536
+LOTE_ENUMERACAO = 512
+
+# Peso de cada arquivo no progresso, em bytes (abrir e gravar a entrada custa
+# mesmo para arquivos vazios)
+CUSTO_ARQUIVO = 4096
+
+# Marca o fim da enumeração na fila
+_FIM = object()
+
+# Membros em andamento por processo trabalhador
+MEMBROS_POR_PROCESSO = 4
+
+# Bytes (não comprimidos) mantidos em memória pelos membros em andamento
+JANELA_BYTES = 256 * 1024 ** 2
+
+# Membros maiores que este limite são comprimidos para um arquivo temporário
+LIMITE_MEMBRO_MEMORIA = 32 * 1024 ** 2
+
+# Tamanho dos blocos lidos e comprimidos de cada vez
+BLOCO_LEITURA = 1024 ** 2
+
+# Abaixo deste total, iniciar os processos custa mais que o ganho
+MINIMO_PARALELO = 4 * 1024 ** 2
+
+# Versões do Python (inclusive) cujo estado interno do ZipFile foi conferido
+# para a gravação das entradas já comprimidas (ver gravacao_paralela_suportada)
+VERSOES_GRAVACAO_DIRETA = ((3, 12), (3, 13))
+
+# Atributos do ZipFile usados na gravação das entradas já comprimidas
+_ATRIBUTOS_ZIPFILE = ("fp", "filelist", "NameToInfo", "start_dir", "_didModify", "_lock", "_writecheck")
+
+# Tipos (ver Compressor.extensao_para_tipo) cujos membros são amostrados antes
+# de serem comprimidos
+TIPOS_AMOSTRADOS = ("imagem", "video", "audio", "zip", "documento")
+
+# Bytes do início do membro comprimidos como amostra (membros menores que o
+# mínimo são sempre comprimidos)
+AMOSTRA_BYTES = 128 * 1024
+MINIMO_AMOSTRA = 16 * 1024
+
+# Membros cuja amostra comprimida fica acima desta fração do original são
+# armazenados sem compressão
+RAZAO_ARMAZENAR = 0.95
+
+
+def gravacao_paralela_suportada(zipf):
+    """
+    Indica se os membros comprimidos nos processos podem ser gravados no ZIP
+
+    O ZipFile não tem uma API pública para gravar dados já comprimidos, então
+    _gravar_membro escreve o cabeçalho local e registra a entrada no estado
+    interno do ZipFile. Fora das versões conferidas (ou se esse estado mudou),
+    os membros devem ser gravados com ZipFile.write, um de cada vez.
+
+    Args:
+        zipf (zipfile.ZipFile): ZIP aberto para escrita
+
+    Returns:
+        bool: True se comprimir_membros pode ser usado com o ZIP
+    """
+    minima, maxima = VERSOES_GRAVACAO_DIRETA
+    return (
+        minima <= sys.version_info[:2] <= maxima
+        and zipf.mode == "w"
+        and all(hasattr(zipf, atributo) for atributo in _ATRIBUTOS_ZIPFILE)
+    )
+
+
+def avaliar_amostra(amostra, nivel=zlib.Z_DEFAULT_COMPRESSION):
+    """
+    Comprime uma amostra para estimar o ganho e o custo do DEFLATE
+
+    Args:
+        amostra (bytes): Início do membro
+        nivel (int): Nível de compressão do zlib
+
+    Returns:
+        tuple: (razao, segundos) com o tamanho comprimido dividido pelo
+            original e o tempo de CPU gasto na amostra
+    """
+    inicio = time.process_time()
+    compressor = zlib.compressobj(nivel, zlib.DEFLATED, -15)
+    tamanho = len(compressor.compress(amostra)) + len(compressor.flush())
+    return tamanho / len(amostra), time.process_time() - inicio
+
+
+def escolher_metodo(bloco, amostrar, nivel=zlib.Z_DEFAULT_COMPRESSION):
+    """
+    Decide se um membro é comprimido ou armazenado, pela amostra do início
+
+    Args:
+        bloco (bytes): Primeiro bloco lido do membro
+        amostrar (bool): Se o tipo do membro deve ser amostrado
+        nivel (int): Nível de compressão do zlib
+
+    Returns:
+        tuple: (metodo, avaliacao) com zipfile.ZIP_DEFLATED ou ZIP_STORED e
+            o resultado de avaliar_amostra (None sem amostra)
+    """
+    if not amostrar or len(bloco) < MINIMO_AMOSTRA:
+        return zipfile.ZIP_DEFLATED, None
+
+    avaliacao = avaliar_amostra(bloco[:AMOSTRA_BYTES], nivel)
+    metodo = zipfile.ZIP_STORED if avaliacao[0] >= RAZAO_ARMAZENAR else zipfile.ZIP_DEFLATED
+    return metodo, avaliacao
+
+
+class EconomiaArmazenamento:
+    """
+    Acumula o que a escolha de armazenar membros sem compressão economizou
+
+    O tempo de CPU economizado é estimado pelo custo da amostra, proporcional
+    ao tamanho do membro, descontado o tempo gasto com as amostras.
+    """
+
+    def __init__(self):
+        """
+        Inicializa os contadores zerados
+        """
+        self.membros_armazenados = 0
+        self.bytes_armazenados = 0
+        self.bytes_perdidos = 0.0
+        self.segundos_economizados = 0.0
+
+    def registrar(self, metodo, tamanho, avaliacao):
+        """
+        Registra a decisão tomada para um membro
+
+        Args:
+            metodo (int): Método escolhido (ver escolher_metodo)
+            tamanho (int): Tamanho original do membro
+            avaliacao (tuple): Resultado de avaliar_amostra (None sem amostra)
+        """
+        if avaliacao is None:
+            return
+
+        razao, segundos = avaliacao
+        self.segundos_economizados -= segundos
+        if metodo == zipfile.ZIP_STORED:
+            self.membros_armazenados += 1
+            self.bytes_armazenados += tamanho
+            self.bytes_perdidos += max(0.0, 1 - razao) * tamanho
+            self.segundos_economizados += segundos * tamanho / min(tamanho, AMOSTRA_BYTES)
+
+    def relatorio(self):
+        """
+        Retorna os contadores em uma forma serializável em JSON
+
+        Returns:
+            dict: Membros e bytes armazenados, bytes que o DEFLATE ainda
+                economizaria (estimativa) e segundos de CPU economizados
+        """
+        return {
+            "membros_armazenados": self.membros_armazenados,
+            "bytes_armazenados": self.bytes_armazenados,
+            "bytes_perdidos_estimados": int(self.bytes_perdidos),
+            "cpu_economizada": round(self.segundos_economizados, 3)
+        }
+
+
+class EnumeracaoMembros:
+    """
+    Percorre um diretório em uma thread, entregando os arquivos à medida que
+    são descobertos
+
+    A árvore é lida uma única vez com os.scandir (o tamanho vem da mesma
+    entrada) e os membros são consumidos iterando sobre o objeto, na ordem em
+    que foram encontrados (em lotes de LOTE_ENUMERACAO pela fila). A thread
+    fica à frente da escrita em até LIMITE_ENUMERACAO membros, e ``arquivos``
+    e ``bytes`` somam o que já foi descoberto (os totais, quando
+    ``concluida``). Como no os.walk, links para
+    diretórios não são seguidos e diretórios ilegíveis são ignorados; arquivos
+    especiais (FIFOs, sockets) e links quebrados ficam de fora.
+    """
+
+    def __init__(self, diretorio, prefixo=None, limite=LIMITE_ENUMERACAO):
+        """
+        Inicia a enumeração
+
+        Args:
+            diretorio (str): Diretório percorrido
+            prefixo (str): Prefixo dos nomes no ZIP (padrão: nome do diretório)
+            limite (int): Membros descobertos mantidos à frente da escrita
+        """
+        self.diretorio = os.path.normpath(diretorio)
+        self.prefixo = os.path.basename(self.diretorio) if prefixo is None else prefixo
+        self.arquivos = 0
+        self.bytes = 0
+        self.concluida = False
+
+        self._fila = queue.Queue(maxsize=max(1, limite // LOTE_ENUMERACAO))
+        self._parar = threading.Event()
+        self._erro = None
+        self._thread = threading.Thread(target=self._enumerar, name="zip-enumeracao", daemon=True)
+        self._thread.start()
+
+    def _enumerar(self):
+        """
+        Percorre a árvore em profundidade (executado na thread da enumeração)
+        """
+        try:
+            pilha = [(self.diretorio, self.prefixo)]
+            while pilha and not self._parar.is_set():
+                atual, prefixo = pilha.pop()
+                if prefixo:
+                    prefixo += os.sep
+                subdiretorios = []
+                lote = []
+                try:
+                    with os.scandir(atual) as entradas:
+                        for entrada in entradas:
+                            try:
+                                if entrada.is_dir():
+                                    if not entrada.is_symlink():
+                                        subdiretorios.append((entrada.path, prefixo + entrada.name))
+                                    continue
+                                if not entrada.is_file():
+                                    continue
+                                lote.append((entrada.path, prefixo + entrada.name, entrada.stat().st_size))
+                            except OSError:
+                                continue
+
+                            if len(lote) >= LOTE_ENUMERACAO:
+                                if not self._entregar(lote):
+                                    return
+                                lote = []
+                    if lote and not self._entregar(lote):
+                        return
+                except OSError as e:
+                    if atual == self.diretorio:
+                        raise
+                    print(f"Aviso: diretório ignorado ao comprimir: {str(e)}")
+
+                # Visita os subdiretórios na ordem em que foram encontrados
+                pilha.extend(reversed(subdiretorios))
+        except BaseException as e:
+            self._erro = e
+        finally:
+            self.concluida = True
+            self._colocar(_FIM)
+
+    def _entregar(self, lote):
+        """
+        Soma um lote de membros aos totais e o coloca na fila
+
+        Args:
+            lote (list): Membros (caminho, nome no ZIP, tamanho)
+
+        Returns:
+            bool: True se o lote foi colocado
+        """
+        self.arquivos += len(lote)
+        self.bytes += sum(membro[2] for membro in lote)
+        return self._colocar(lote)
+
+    def _colocar(self, item):
+        """
+        Coloca um item na fila, desistindo se a enumeração for encerrada
+
+        Args:
+            item: Lote de membros ou _FIM
+
+        Returns:
+            bool: True se o item foi colocado
+        """
+        while not self._parar.is_set():
+            try:
+                self._fila.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def aguardar(self, arquivos, bytes_minimos):
+        """
+        Aguarda até que a enumeração termine ou descubra ao menos os arquivos
+        e bytes informados (ou encha a fila)
+
+        Args:
+            arquivos (int): Quantidade mínima de arquivos
+            bytes_minimos (int): Quantidade mínima de bytes
+
+        Returns:
+            bool: True se os mínimos foram atingidos
+        """
+        while (
+            not self.concluida and not self._fila.full()
+            and (self.arquivos < arquivos or self.bytes < bytes_minimos)
+        ):
+            self._thread.join(0.01)
+        return self.arquivos >= arquivos and self.bytes >= bytes_minimos
+
+    def progresso(self, arquivos_gravados, bytes_gravados):
+        """
+        Calcula a fração concluída, pesando os arquivos pelo tamanho
+
+        Enquanto a enumeração não termina, o total é o descoberto até o
+        momento (e a fração é uma estimativa por cima).
+
+        Args:
+            arquivos_gravados (int): Arquivos já gravados
+            bytes_gravados (int): Bytes já gravados
+
+        Returns:
+            float: Fração entre 0 e 1
+        """
+        total = self.bytes + self.arquivos * CUSTO_ARQUIVO
+        if not total:
+            return 1.0
+        return min(1.0, (bytes_gravados + arquivos_gravados * CUSTO_ARQUIVO) / total)
+
+    def __iter__(self):
+        """
+        Entrega os membros descobertos como tuplas (caminho, nome no ZIP, tamanho)
+
+        Raises:
+            OSError: Se o diretório não puder ser percorrido
+        """
+        while True:
+            lote = self._fila.get()
+            if lote is _FIM:
+                if self._erro is not None:
+                    raise self._erro
+                return
+            yield from lote
+
+    def fechar(self):
+        """
+        Encerra a enumeração (ex.: após um cancelamento)
+        """
+        self._parar.set()
+        self._thread.join()
+
+
+def _deflatar_membro(caminho, nivel, arquivo_temporario=None, amostrar=False):
+    """
+    Comprime um arquivo em DEFLATE puro, como o ZipFile faria (executado nos
+    processos trabalhadores)
+
+    Com ``amostrar``, o membro que quase não diminui na amostra é apenas lido
+    para o cálculo do CRC e armazenado sem compressão.
+
+    Args:
+        caminho (str): Arquivo a ser comprimido
+        nivel (int): Nível de compressão do zlib
+        arquivo_temporario (str): Arquivo que recebe os dados comprimidos
+            (None os retorna em memória)
+        amostrar (bool): Se o início do membro é amostrado (ver escolher_metodo)
+
+    Returns:
+        tuple: (metodo, crc, tamanho, dados, avaliacao) com dados None se
+            foram gravados no arquivo temporário (ou, armazenados, se devem
+            ser copiados da origem)
+    """
+    crc = 0
+    tamanho = 0
+    partes = []
+    with open(caminho, "rb") as origem:
+        bloco = origem.read(BLOCO_LEITURA)
+        metodo, avaliacao = escolher_metodo(bloco, amostrar, nivel)
+
+        if metodo == zipfile.ZIP_STORED:
+            # Membros grandes são copiados da origem ao serem gravados
+            em_memoria = arquivo_temporario is None
+            while bloco:
+                crc = zlib.crc32(bloco, crc)
+                tamanho += len(bloco)
+                if em_memoria:
+                    partes.append(bloco)
+                bloco = origem.read(BLOCO_LEITURA)
+            return metodo, crc, tamanho, b"".join(partes) if em_memoria else None, avaliacao
+
+        compressor = zlib.compressobj(nivel, zlib.DEFLATED, -15)
+        destino = open(arquivo_temporario, "wb") if arquivo_temporario else None
+        try:
+            while bloco:
+                crc = zlib.crc32(bloco, crc)
+                tamanho += len(bloco)
+                comprimido = compressor.compress(bloco)
+                if destino is not None:
+                    destino.write(comprimido)
+                else:
+                    partes.append(comprimido)
+                bloco = origem.read(BLOCO_LEITURA)
+
+            final = compressor.flush()
+            if destino is not None:
+                destino.write(final)
+                return metodo, crc, tamanho, None, avaliacao
+            partes.append(final)
+            return metodo, crc, tamanho, b"".join(partes), avaliacao
+        finally:
+            if destino is not None:
+                destino.close()
+
+
+def _gravar_membro(zipf, caminho, nome, metodo, crc, tamanho, dados, arquivo_temporario):
+    """
+    Grava no ZIP uma entrada já comprimida em DEFLATE (ou armazenada)
+
+    O cabeçalho local é escrito com o CRC e os tamanhos conhecidos, e a
+    entrada é registrada no ZipFile, que a inclui no diretório central (com
+    ZIP64 quando necessário) ao ser fechado. Usa o estado interno do ZipFile
+    (ver gravacao_paralela_suportada).
+
+    Args:
+        zipf (zipfile.ZipFile): ZIP aberto para escrita
+        caminho (str): Arquivo de origem (data e permissões da entrada)
+        nome (str): Nome da entrada no ZIP
+        metodo (int): zipfile.ZIP_DEFLATED ou zipfile.ZIP_STORED
+        crc (int): CRC-32 dos dados originais
+        tamanho (int): Tamanho original em bytes
+        dados (bytes): Dados da entrada (None se estão no arquivo temporário
+            ou, armazenados, na origem)
+        arquivo_temporario (str): Arquivo com os dados comprimidos
+    """
+    fonte = None
+    if dados is None:
+        fonte = caminho if metodo == zipfile.ZIP_STORED else arquivo_temporario
+
+    info = zipfile.ZipInfo.from_file(caminho, nome)
+    info.compress_type = metodo
+    info.CRC = crc
+    info.file_size = tamanho
+    info.compress_size = len(dados) if dados is not None else os.path.getsize(fonte)
+
+    with zipf._lock:
+        # As mesmas verificações do ZipFile.write (nome repetido, ZIP64)
+        zipf._writecheck(info)
+        info.header_offset = zipf.fp.tell()
+        zipf.fp.write(info.FileHeader())
+        if dados is not None:
+            zipf.fp.write(dados)
+        else:
+            with open(fonte, "rb") as origem:
+                shutil.copyfileobj(origem, zipf.fp, BLOCO_LEITURA)
+
+        zipf.filelist.append(info)
+        zipf.NameToInfo[info.filename] = info
+        zipf.start_dir = zipf.fp.tell()
+        zipf._didModify = True
+
+    if dados is None and fonte == arquivo_temporario:
+        os.remove(arquivo_temporario)
+
+
+def comprimir_membros(zipf, membros, diretorio_temporario, processos=None, nivel=zlib.Z_DEFAULT_COMPRESSION,
+                      cancelado=None, ao_gravar=None, extensoes_amostradas=(), economia=None):
+    """
+    Comprime membros em processos paralelos e os grava no ZIP, em ordem
+
+    Só deve ser usada se gravacao_paralela_suportada(zipf) for verdadeira.
+
+    Args:
+        zipf (zipfile.ZipFile): ZIP aberto para escrita
+        membros (iterable): Tuplas (caminho, nome no ZIP, tamanho)
+        diretorio_temporario (str): Diretório dos membros grandes comprimidos
+            fora da memória
+        processos (int): Número de processos (padrão: núcleos da máquina)
+        nivel (int): Nível de compressão do zlib
+        cancelado (threading.Event): Sinal de cancelamento
+        ao_gravar (function): Chamada com (caminho, tamanho) após gravar cada membro
+        extensoes_amostradas (set): Extensões (ex.: ".jpg") dos membros
+            amostrados antes da compressão (ver escolher_metodo)
+        economia (EconomiaArmazenamento): Acumula o que foi economizado
+            armazenando membros sem compressão
+
+    Returns:
+        bool: True se todos os membros foram gravados, False se foi cancelado
+    """
+    processos = max(1, processos or os.cpu_count() or 1)
+    janela_membros = processos * MEMBROS_POR_PROCESSO
+
+    # Membros enviados e ainda não gravados: (caminho, nome, temporário, custo, futuro)
+    pendentes = deque()
+    em_memoria = 0
+
+    def gravar_proximo():
+        caminho, nome, temporario, custo, futuro = pendentes.popleft()
+        metodo, crc, tamanho, dados, avaliacao = futuro.result()
+        _gravar_membro(zipf, caminho, nome, metodo, crc, tamanho, dados, temporario)
+        if economia is not None:
+            economia.registrar(metodo, tamanho, avaliacao)
+        if ao_gravar:
+            ao_gravar(caminho, tamanho)
+        return custo
+
+    contexto = multiprocessing.get_context("spawn")
+    executor = ProcessPoolExecutor(max_workers=processos, mp_context=contexto)
+    try:
+        for indice, (caminho, nome, tamanho) in enumerate(membros):
+            temporario = None
+            if tamanho > LIMITE_MEMBRO_MEMORIA:
+                temporario = os.path.join(diretorio_temporario, f"membro_{indice:08d}")
+
+            # Os membros grandes vão para o disco e ocupam pouca memória
+            custo = min(tamanho, LIMITE_MEMBRO_MEMORIA) if temporario is None else BLOCO_LEITURA
+            while pendentes and (len(pendentes) >= janela_membros or em_memoria + custo > JANELA_BYTES):
+                em_memoria -= gravar_proximo()
+
+            if cancelado is not None and cancelado.is_set():
+                return False
+
+            amostrar = os.path.splitext(caminho)[1].lower() in extensoes_amostradas
+            futuro = executor.submit(_deflatar_membro, caminho, nivel, temporario, amostrar)
+            pendentes.append((caminho, nome, temporario, custo, futuro))
+            em_memoria += custo
+
+        while pendentes:
+            if cancelado is not None and cancelado.is_set():
+                return False
+            em_memoria -= gravar_proximo()
+
+        return True
+    finally:
+        # Descarta o que não chegou a ser gravado (cancelamento ou erro)
+        executor.shutdown(wait=True, cancel_futures=True)